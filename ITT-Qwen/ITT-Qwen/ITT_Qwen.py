@@ -1,23 +1,21 @@
+import time
+STARTUP_ORIGIN = time.perf_counter()
+
 import sys
 from PySide6.QtWidgets import QApplication, QMessageBox
-from config import COLORS
+from theme import apply_theme
+from instrumentation import StartupTimer
 from main_application import ImageToTextChatApp
 
 def main():
     try:
+        startup_timer = StartupTimer(STARTUP_ORIGIN)
+        startup_timer.mark('imports')
         app = QApplication(sys.argv)
+        apply_theme(app)
         
-        app.setStyleSheet(f"""
-            QToolTip {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text']};
-                border: 1px solid {COLORS['border']};
-                padding: 5px;
-                border-radius: 4px;
-            }}
-        """)
-        
-        window = ImageToTextChatApp()
+        startup_timer.mark('application')
+        window = ImageToTextChatApp(startup_timer)
         window.show()
         sys.exit(app.exec())
     except Exception as e:
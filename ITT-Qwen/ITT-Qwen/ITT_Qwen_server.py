@@ -0,0 +1,476 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import sys
+import threading
+from collections import OrderedDict
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from config import DEFAULT_MODEL, GENERATION_PROFILES, SYSTEM_PROMPT
+from image_ops import fit_crop, image_digest, prepare_image_payload
+from inference import backend_flights, build_messages, request_key, stream_chat
+from profiles import profile_options, profile_system_prompt
+from structured_output import parse_structured, resolve_schema, structured_system_prompt
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_BATCH_SIZE = 32
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Request:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    @property
+    def content_type(self):
+        return self.headers.get('content-type', '')
+
+    def json(self):
+        try:
+            return json.loads(self.body or b'{}')
+        except ValueError:
+            raise HttpError(400, "Request body is not valid JSON")
+
+    def form(self):
+        if self.content_type.startswith('application/json'):
+            fields = self.json()
+            if not isinstance(fields, dict):
+                raise HttpError(400, "Request body must be a JSON object")
+            return fields, {}
+        if not self.content_type.startswith('multipart/form-data'):
+            raise HttpError(400, "Expected multipart/form-data or application/json")
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.content_type.encode('latin-1') + b'\r\n\r\n' + self.body)
+        fields, files = {}, {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if not name:
+                continue
+            payload = part.get_payload(decode=True) or b''
+            if part.get_filename() is not None:
+                files[name] = payload
+            else:
+                fields[name] = payload.decode('utf-8', errors='replace')
+        return fields, files
+
+class ImageStore:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        digest = image_digest(data)
+        with self._lock:
+            if digest in self._images:
+                self._images.move_to_end(digest)
+                return digest
+            self._images[digest] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self.total_bytes -= len(evicted)
+        return digest
+
+    def count(self):
+        with self._lock:
+            return len(self._images)
+
+    def get(self, digest):
+        with self._lock:
+            data = self._images.get(digest)
+            if data is None:
+                raise HttpError(404, f"Unknown image digest: {digest}")
+            self._images.move_to_end(digest)
+            return data
+
+class AskJob:
+    def __init__(self, question, image_data=None, image_digest=None, crop=None, model=DEFAULT_MODEL,
+                 schema=None, schema_name=None, profile=None):
+        self.question = question
+        self.image_data = image_data
+        self.image_digest = image_digest
+        self.crop = crop
+        self.model = model
+        self.schema = schema
+        self.schema_name = schema_name
+        self.options = profile_options(profile) if profile else None
+        self.system_prompt = profile_system_prompt(profile) if profile else SYSTEM_PROMPT
+        self.events = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def emit(self, event, data):
+        self.loop.call_soon_threadsafe(self.events.put_nowait, (event, data))
+
+    def key(self):
+        return request_key(self.model, self.image_digest, self.crop, self.question, self.schema,
+                           self.options, self.system_prompt)
+
+    def run(self):
+        result = backend_flights.run(
+            self.key(),
+            self.execute,
+            on_chunk=lambda piece: self.emit('chunk', {'content': piece}),
+            is_cancelled=self.is_cancelled,
+            cancelled=lambda chunks: (''.join(chunks), {})
+        )
+        if result is None:
+            return '', {}
+        return result
+
+    def execute(self, publish, all_cancelled):
+        images = None
+        if self.image_data is not None:
+            images = [prepare_image_payload(self.image_data, self.crop)]
+        history = [{'text': self.question, 'is_user': True}]
+        if self.schema is None:
+            messages = build_messages(history, images, self.system_prompt)
+        else:
+            messages = build_messages(history, images, structured_system_prompt(self.schema))
+        return stream_chat(self.model, messages, on_chunk=publish, is_cancelled=all_cancelled,
+                           options=self.options, response_format=self.schema)
+
+    def describe(self, result):
+        described = {'answer': result['content'], 'stats': result['stats'],
+                     'image_digest': result['image_digest'],
+                     'truncated': (result['stats'] or {}).get('done_reason') == 'length'}
+        if self.schema is not None:
+            data, errors = parse_structured(result['content'], self.schema)
+            described.update(schema=self.schema_name, data=data, valid=not errors, errors=errors)
+        return described
+
+    async def result(self):
+        while True:
+            event, data = await self.events.get()
+            if event == 'done':
+                return data
+            elif event == 'error':
+                raise HttpError(500, data['error'])
+
+class InferencePool:
+    def __init__(self, workers=2, queue_size=16):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.active = 0
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def free_slots(self):
+        return self.queue.maxsize - self.queue.qsize()
+
+    def submit(self, job):
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HttpError(503, "Server is busy, try again later")
+        return job
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                self.queue.task_done()
+                continue
+            self.active += 1
+            try:
+                content, stats = await asyncio.to_thread(job.run)
+                job.emit('done', {'content': content, 'stats': stats, 'image_digest': job.image_digest})
+            except Exception as e:
+                job.emit('error', {'error': f"Model processing failed: {str(e)}"})
+            finally:
+                self.active -= 1
+                self.queue.task_done()
+
+class ApiServer:
+    def __init__(self, pool, store, model=DEFAULT_MODEL):
+        self.pool = pool
+        self.store = store
+        self.model = model
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await self.read_request(reader)
+            await self.dispatch(request, writer)
+        except HttpError as e:
+            await self.write_json(writer, e.status, {'error': e.message})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except Exception as e:
+            await self.write_json(writer, 500, {'error': f"Unexpected error: {str(e)}"})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HttpError(411, "Chunked uploads are not supported; send Content-Length")
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body exceeds {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), path.split('?', 1)[0], headers, body)
+
+    async def dispatch(self, request, writer):
+        routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/v1/stats'): self.stats,
+            ('POST', '/v1/images'): self.upload_image,
+            ('POST', '/v1/ask'): self.ask,
+            ('POST', '/v1/batch'): self.batch,
+        }
+        handler = routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in routes):
+                raise HttpError(405, f"{request.method} is not allowed on {request.path}")
+            raise HttpError(404, f"No route for {request.path}")
+        await handler(request, writer)
+
+    async def health(self, request, writer):
+        await self.write_json(writer, 200, {
+            'status': 'ok',
+            'model': self.model,
+            'workers': self.pool.workers,
+            'active': self.pool.active,
+            'queued': self.pool.queue.qsize(),
+            'stored_images': self.store.count(),
+            'coalescing': backend_flights.stats(),
+        })
+
+    async def stats(self, request, writer):
+        stats = backend_flights.stats()
+        stats['saved_backend_calls'] = stats['shared']
+        await self.write_json(writer, 200, stats)
+
+    async def upload_image(self, request, writer):
+        if request.content_type.startswith('multipart/form-data'):
+            _, files = request.form()
+            data = files.get('image')
+        else:
+            data = request.body
+        if not data:
+            raise HttpError(400, "No image provided")
+        digest = self.store.put(data)
+        await self.write_json(writer, 200, {'digest': digest, 'bytes': len(data)})
+
+    def text_field(self, fields, name):
+        value = fields.get(name)
+        if value is not None and not isinstance(value, str):
+            raise HttpError(400, f"Field '{name}' must be a string")
+        return value or ''
+
+    def build_job(self, fields, files):
+        question = self.text_field(fields, 'question').strip()
+        if not question:
+            raise HttpError(400, "Field 'question' is required")
+        data = files.get('image')
+        image_base64 = self.text_field(fields, 'image_base64')
+        if data is None and image_base64:
+            try:
+                data = base64.b64decode(image_base64, validate=True)
+            except (binascii.Error, ValueError):
+                raise HttpError(400, "Field 'image_base64' is not valid base64")
+        digest = None
+        if data is not None:
+            digest = self.store.put(data)
+        elif self.text_field(fields, 'image_digest'):
+            digest = fields['image_digest']
+            data = self.store.get(digest)
+        crop = self.parse_crop(fields.get('crop'))
+        if crop is not None and data is not None:
+            # Checked here so a bad region is a 400 now rather than a failed job on a worker later.
+            try:
+                crop = fit_crop(data, crop)
+            except ValueError as e:
+                raise HttpError(400, f"Field 'crop': {e}")
+        schema_name, schema = self.parse_schema(fields.get('schema'))
+        return AskJob(question, data, digest, crop, self.text_field(fields, 'model') or self.model,
+                      schema, schema_name, self.parse_profile(fields.get('profile')))
+
+    def parse_profile(self, name):
+        if name in (None, ''):
+            return None
+        if not isinstance(name, str) or name not in GENERATION_PROFILES:
+            raise HttpError(400, f"Unknown profile '{name}'; expected one of {', '.join(GENERATION_PROFILES)}")
+        return GENERATION_PROFILES[name]
+
+    def parse_schema(self, schema):
+        if schema in (None, ''):
+            return None, None
+        try:
+            return resolve_schema(schema)
+        except ValueError as e:
+            raise HttpError(400, f"Field 'schema': {e}")
+
+    def parse_crop(self, crop):
+        if crop in (None, ''):
+            return None
+        if isinstance(crop, str):
+            crop = crop.split(',')
+        try:
+            x, y, width, height = (int(float(value)) for value in crop)
+        except (TypeError, ValueError):
+            raise HttpError(400, "Field 'crop' must be x,y,width,height in image pixels")
+        if width <= 0 or height <= 0:
+            raise HttpError(400, "Crop width and height must be positive")
+        return x, y, width, height
+
+    async def ask(self, request, writer):
+        fields, files = request.form()
+        job = self.pool.submit(self.build_job(fields, files))
+        stream = str(fields.get('stream', 'true')).lower() not in ('0', 'false', 'no')
+        if not stream:
+            try:
+                result = await job.result()
+            except asyncio.CancelledError:
+                job.cancel()
+                raise
+            await self.write_json(writer, 200, job.describe(result))
+            return
+
+        writer.write(self.response_head(200, 'text/event-stream', extra={'Cache-Control': 'no-cache'}))
+        try:
+            await writer.drain()
+            while True:
+                event, data = await job.events.get()
+                if event == 'done':
+                    data = job.describe(data)
+                writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                await writer.drain()
+                if event in ('done', 'error'):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            job.cancel()
+            raise
+
+    async def batch(self, request, writer):
+        payload = request.json()
+        items = payload.get('requests') if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items:
+            raise HttpError(400, "Expected {\"requests\": [...]}")
+        if len(items) > MAX_BATCH_SIZE:
+            raise HttpError(413, f"A batch may contain at most {MAX_BATCH_SIZE} requests")
+        if len(items) > self.pool.free_slots():
+            raise HttpError(503, "Server is busy, try a smaller batch later")
+        jobs = []
+        for item in items:
+            try:
+                if not isinstance(item, dict):
+                    raise HttpError(400, "Each batch entry must be an object")
+                jobs.append(self.build_job(item, {}))
+            except HttpError as e:
+                jobs.append(e)
+        for job in jobs:
+            if isinstance(job, AskJob):
+                self.pool.submit(job)
+
+        async def collect(job):
+            if isinstance(job, HttpError):
+                return {'error': job.message}
+            try:
+                result = await job.result()
+                return job.describe(result)
+            except HttpError as e:
+                return {'error': e.message}
+
+        results = await asyncio.gather(*(collect(job) for job in jobs))
+        await self.write_json(writer, 200, {'results': results})
+
+    def response_head(self, status, content_type, length=None, extra=None):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 "Connection: close"]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        for key, value in (extra or {}).items():
+            lines.append(f"{key}: {value}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def write_json(self, writer, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            writer.write(self.response_head(status, 'application/json', len(body)) + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+async def serve(host, port, workers, queue_size, model):
+    pool = InferencePool(workers, queue_size)
+    pool.start()
+    api = ApiServer(pool, ImageStore(), model)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    address = server.sockets[0].getsockname()
+    print(f"ITT-Qwen API listening on http://{address[0]}:{address[1]} "
+          f"(model {model}, {workers} workers, queue {queue_size})", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await pool.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless ITT-Qwen HTTP API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Concurrent backend requests')
+    parser.add_argument('--queue', type=int, default=16,
+                        help='Requests allowed to wait for a worker before returning 503')
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.model))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = """### Analysis
+
+The image shows a **synthetic test pattern** with a smooth gradient and a grid of blocks.
+
+*   The top-left corner is darker than the bottom-right corner.
+*   Several high-contrast edges run across the frame.
+*   No text is visible in the selected region.
+
+```python
+def describe(image):
+    return {"pattern": "gradient", "blocks": 16}
+```
+
+If you need more detail, select a smaller area and ask again."""
+
+UNCERTAIN_RESPONSE = "I'm not sure. The text in this area is too blurry to read."
+
+MODEL_SPEEDUPS = {'qwen2.5vl:3b': 2.5}
+
+def make_response_text(token_count):
+    words = DEFAULT_RESPONSE.split(' ')
+    if token_count <= len(words):
+        return ' '.join(words[:token_count])
+    repeats = token_count // len(words) + 1
+    return '\n\n'.join([DEFAULT_RESPONSE] * repeats)
+
+def make_structured_value(schema):
+    kind = schema.get('type', 'object')
+    if isinstance(kind, list):
+        kind = next((name for name in kind if name != 'null'), 'null')
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if kind == 'object':
+        return {name: make_structured_value(prop) for name, prop in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [make_structured_value(schema.get('items', {'type': 'string'}))]
+    return {'string': 'ABC-123', 'number': 42.5, 'integer': 42, 'boolean': True}.get(kind)
+
+class FakeOllamaServer:
+    def __init__(self, host='127.0.0.1', port=0, tokens_per_second=40.0,
+                 prefill_delay=0.25, prefill_per_megabyte=0.05, response_text=None,
+                 prompt_cache_size=4, model_speedups=None, uncertain_models=()):
+        self.tokens_per_second = tokens_per_second
+        self.model_speedups = dict(MODEL_SPEEDUPS if model_speedups is None else model_speedups)
+        self.uncertain_models = set(uncertain_models)
+        self.prefill_delay = prefill_delay
+        self.prefill_per_megabyte = prefill_per_megabyte
+        self.response_text = response_text or DEFAULT_RESPONSE
+        self.request_count = 0
+        self.prompt_cache_size = prompt_cache_size
+        self.prompt_cache_hits = 0
+        self._prompt_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/api/version':
+                    self._send_json({'version': '0.0.0-fake'})
+                elif self.path == '/api/tags':
+                    self._send_json({'models': [{'name': 'qwen2.5vl:7b'}, {'name': 'qwen2.5vl:3b'}]})
+                else:
+                    self._send_json({'error': 'not found'}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                if self.path != '/api/chat':
+                    self._send_json({'error': 'not found'}, status=404)
+                    return
+                try:
+                    request = json.loads(body or b'{}')
+                except ValueError:
+                    self._send_json({'error': 'invalid JSON'}, status=400)
+                    return
+                with server._lock:
+                    server.request_count += 1
+                server._handle_chat(self, request, len(body))
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def _handle_chat(self, handler, request, body_size):
+        model = request.get('model', 'qwen2.5vl:7b')
+        stream = request.get('stream', True)
+        options = request.get('options') or {}
+        messages = request.get('messages', [])
+        prompt_chars = sum(len(m.get('content', '')) for m in messages)
+        images = [image for m in messages for image in m.get('images') or []]
+        image_bytes = sum(len(image) for image in images)
+        cached = self._check_prompt_cache(images)
+
+        text = UNCERTAIN_RESPONSE if model in self.uncertain_models else self.response_text
+        response_format = request.get('format')
+        if isinstance(response_format, dict):
+            text = json.dumps(make_structured_value(response_format))
+        elif response_format == 'json':
+            text = json.dumps({'answer': 'fake'})
+        tokens = [token + ' ' for token in text.split(' ')]
+        tokens[-1] = tokens[-1].rstrip(' ')
+        num_predict = options.get('num_predict')
+        done_reason = 'stop'
+        if num_predict is not None and 0 <= num_predict < len(tokens):
+            tokens = tokens[:num_predict]
+            done_reason = 'length'
+
+        speedup = self.model_speedups.get(model, 1.0)
+        start = time.perf_counter()
+        if cached:
+            prefill = self.prefill_delay * 0.1 + self.prefill_per_megabyte * (body_size - image_bytes) / 1e6
+        else:
+            prefill = self.prefill_delay + self.prefill_per_megabyte * body_size / 1e6
+        prefill /= speedup
+        image_tokens = 0 if cached else image_bytes // 750
+        time.sleep(prefill)
+        prompt_eval_ns = int(prefill * 1e9)
+        token_interval = 1.0 / (self.tokens_per_second * speedup) if self.tokens_per_second > 0 else 0.0
+
+        def stats(eval_start):
+            eval_ns = int((time.perf_counter() - eval_start) * 1e9)
+            return {
+                'done': True,
+                'done_reason': done_reason,
+                'total_duration': int((time.perf_counter() - start) * 1e9),
+                'load_duration': 0,
+                'prompt_eval_count': max(1, prompt_chars // 4) + image_tokens,
+                'prompt_eval_duration': prompt_eval_ns,
+                'eval_count': len(tokens),
+                'eval_duration': eval_ns,
+            }
+
+        def chunk(content, **extra):
+            payload = {
+                'model': model,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'message': {'role': 'assistant', 'content': content},
+                'done': False,
+            }
+            payload.update(extra)
+            return payload
+
+        eval_start = time.perf_counter()
+        if not stream:
+            time.sleep(token_interval * len(tokens))
+            handler._send_json(chunk(''.join(tokens), **stats(eval_start)))
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def write_line(payload):
+            data = (json.dumps(payload) + '\n').encode('utf-8')
+            handler.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+            handler.wfile.flush()
+
+        try:
+            for token in tokens:
+                time.sleep(token_interval)
+                write_line(chunk(token))
+            write_line(chunk('', **stats(eval_start)))
+            handler.wfile.write(b'0\r\n\r\n')
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _check_prompt_cache(self, images):
+        if not images or not self.prompt_cache_size:
+            return False
+        key = hashlib.sha256(''.join(images).encode('ascii', 'replace')).hexdigest()
+        with self._lock:
+            cached = key in self._prompt_cache
+            if cached:
+                self.prompt_cache_hits += 1
+            self._prompt_cache[key] = True
+            self._prompt_cache.move_to_end(key)
+            while len(self._prompt_cache) > self.prompt_cache_size:
+                self._prompt_cache.popitem(last=False)
+        return cached
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a fake Ollama /api/chat endpoint.')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--tokens-per-second', type=float, default=40.0)
+    parser.add_argument('--prefill-delay', type=float, default=0.25)
+    args = parser.parse_args()
+
+    fake = FakeOllamaServer(port=args.port, tokens_per_second=args.tokens_per_second,
+                            prefill_delay=args.prefill_delay)
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,52 @@
+import struct
+
+from PySide6.QtGui import QImage, qRgb
+
+LITERALS_PER_CLEAR = 250
+
+def web_palette():
+    colors = [qRgb(r * 51, g * 51, b * 51) for r in range(6) for g in range(6) for b in range(6)]
+    return colors + [qRgb(i * 6, i * 6, i * 6) for i in range(40)]
+
+def lzw_literals(indices):
+    # Literal codes only, cleared often enough that the code size stays at 9 bits.
+    clear, end = 256, 257
+    bits = 0
+    count = 0
+    out = bytearray()
+    for start in range(0, len(indices), LITERALS_PER_CLEAR):
+        for code in (clear, *indices[start:start + LITERALS_PER_CLEAR]):
+            bits |= code << count
+            count += 9
+            while count >= 8:
+                out.append(bits & 0xFF)
+                bits >>= 8
+                count -= 8
+    bits |= end << count
+    count += 9
+    while count > 0:
+        out.append(bits & 0xFF)
+        bits >>= 8
+        count -= 8
+    return bytes(out)
+
+def write_gif(path, frames, delay=10):
+    colors = web_palette()
+    width, height = frames[0].width(), frames[0].height()
+    data = bytearray(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xF7, 0, 0))
+    for color in colors:
+        data += bytes(((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF))
+    data += b'\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00'
+    for frame in frames:
+        indexed = frame.convertToFormat(QImage.Format.Format_Indexed8, colors)
+        pixels = b''.join(bytes(indexed.constScanLine(y))[:width] for y in range(height))
+        data += b'\x21\xF9\x04\x04' + struct.pack('<H', delay) + b'\x00\x00'
+        data += b'\x2C' + struct.pack('<HHHHB', 0, 0, width, height, 0) + b'\x08'
+        encoded = lzw_literals(pixels)
+        for start in range(0, len(encoded), 255):
+            block = encoded[start:start + 255]
+            data += bytes((len(block),)) + block
+        data += b'\x00'
+    data += b'\x3B'
+    with open(path, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,856 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import FakeOllamaServer, make_response_text
+
+IMAGE_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+
+BENCHMARKS = ['startup', 'image', 'gallery', 'markdown', 'end_to_end', 'prefill', 'routing', 'status', 'answers',
+              'search', 'selection', 'scroll', 'memory', 'frames', 'worker', 'resolution', 'theme',
+              'server']
+
+def summarize(name, samples, **extra):
+    ordered = sorted(samples)
+    p90_index = min(len(ordered) - 1, int(round(0.9 * (len(ordered) - 1))))
+    result = {
+        'name': name,
+        'unit': 'ms',
+        'samples': len(samples),
+        'mean': statistics.fmean(samples),
+        'median': statistics.median(samples),
+        'p90': ordered[p90_index],
+        'min': ordered[0],
+        'max': ordered[-1],
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+    result.update(extra)
+    return result
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+def make_synthetic_images(directory):
+    from PySide6.QtCore import Qt, QRect
+    from PySide6.QtGui import QImage, QPainter, QColor, QLinearGradient
+
+    paths = {}
+    for width, height in IMAGE_SIZES:
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        painter = QPainter(image)
+        gradient = QLinearGradient(0, 0, width, height)
+        gradient.setColorAt(0.0, QColor('#1C1F21'))
+        gradient.setColorAt(1.0, QColor('#7B99B4'))
+        painter.fillRect(image.rect(), gradient)
+        block = max(8, width // 16)
+        for i, x in enumerate(range(0, width, block)):
+            for j, y in enumerate(range(0, height, block)):
+                if (i + j) % 3 == 0:
+                    painter.fillRect(QRect(x, y, block // 2, block // 2), QColor(255, 255, 255, 90))
+        painter.setPen(QColor(Qt.GlobalColor.white))
+        painter.drawText(QRect(0, 0, width, height), Qt.AlignmentFlag.AlignCenter, f"{width}x{height}")
+        painter.end()
+        path = os.path.join(directory, f"synthetic_{width}x{height}.png")
+        image.save(path, "PNG")
+        paths[(width, height)] = path
+    return paths
+
+def make_synthetic_animation(directory, scenes=6, frames_per_scene=4, size=(320, 240)):
+    from PySide6.QtCore import Qt, QRect
+    from PySide6.QtGui import QImage, QPainter, QColor
+    from gif_writer import write_gif
+
+    frames = []
+    for scene in range(scenes):
+        for step in range(frames_per_scene):
+            image = QImage(size[0], size[1], QImage.Format.Format_RGB32)
+            image.fill(QColor(20 + scene * 35, 60, 200 - scene * 30))
+            painter = QPainter(image)
+            # A few pixels of motion inside a scene, a new layout between scenes.
+            x = (scene * 53) % (size[0] - 80) + step
+            painter.fillRect(QRect(x, 40 + scene * 25, 80, 60), QColor('#FFFFFF'))
+            painter.setPen(QColor(Qt.GlobalColor.black))
+            painter.drawText(QRect(x, 40 + scene * 25, 80, 60), Qt.AlignmentFlag.AlignCenter, f"scene {scene + 1}")
+            painter.end()
+            frames.append(image)
+    path = os.path.join(directory, 'synthetic_animation.gif')
+    write_gif(path, frames)
+    return path, len(frames)
+
+def clear_transcript(window):
+    window.clear_transcript()
+
+def select_center_area(preview):
+    label = preview.image_preview
+    rect = label.rect()
+    label.start_point = rect.center() - rect.center() / 2
+    label.end_point = rect.center() + rect.center() / 2
+
+def bench_startup(app, repeat):
+    from PySide6.QtCore import QElapsedTimer
+    from main_application import ImageToTextChatApp
+
+    import_probe = ("import time; start = time.perf_counter(); import main_application; "
+                    "print((time.perf_counter() - start) * 1000.0)")
+    import_samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', import_probe], cwd=APP_DIR,
+                                capture_output=True, text=True, check=True)
+        import_samples.append(float(output.stdout.strip().splitlines()[-1]))
+
+    def first_frame():
+        window = ImageToTextChatApp()
+        window.show()
+        timer = QElapsedTimer()
+        timer.start()
+        while not window.first_frame_painted and timer.elapsed() < 10000:
+            app.processEvents()
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+
+    return [
+        summarize("startup_import[main_application]", import_samples),
+        summarize("startup_first_frame[window]", measure(first_frame, repeat)),
+    ]
+
+def bench_image_encode(window, images, repeat):
+    from model_thread import ModelThread
+
+    results = []
+    encoder = ModelThread([], None)
+    for (width, height), path in images.items():
+        preview = window.image_preview
+        preview.handle_image_selection(path)
+
+        def full_image():
+            image_path, crop = preview.get_image_for_model()
+            encoder.image_to_base64(image_path, preview.image_preview.source_image, crop)
+
+        def cropped_image():
+            select_center_area(preview)
+            image_path, crop = preview.get_image_for_model()
+            encoder.image_to_base64(image_path, preview.image_preview.source_image, crop)
+
+        results.append(summarize(f"image_encode[{width}x{height}]", measure(full_image, repeat)))
+        results.append(summarize(f"image_crop_encode[{width}x{height}]", measure(cropped_image, repeat)))
+        preview.clear_image()
+    return results
+
+def bench_gallery(window, images, repeat):
+    from PySide6.QtCore import QThreadPool
+
+    preview = window.image_preview
+    gallery = preview.gallery
+    paths = list(images.values())
+    cold = []
+    warm = []
+    for _ in range(repeat):
+        gallery.clear()
+        for path in paths:
+            cold += measure(lambda: preview.handle_image_selection(path), 1, warmup=0)
+        gallery.add_paths(paths)
+        QThreadPool.globalInstance().waitForDone()
+        while gallery.current_index < len(paths) - 1:
+            warm += measure(gallery.show_next, 1, warmup=0)
+            QThreadPool.globalInstance().waitForDone()
+    gallery.clear()
+    preview.clear_image()
+    return [
+        summarize("gallery_select[cold]", cold),
+        summarize("gallery_next[prefetched]", warm),
+    ]
+
+def bench_markdown_render(app, repeat):
+    from ui_widgets import ChatMessage
+    from markdown_renderer import render_markdown
+
+    results = []
+    for tokens in (200, 2000, 8000):
+        text = make_response_text(tokens)
+
+        def render():
+            widget = ChatMessage(text, False, "12:00 PM")
+            widget.deleteLater()
+            app.processEvents()
+
+        results.append(summarize(f"markdown_render[{tokens} tokens]", measure(render, repeat)))
+
+        html_content = render_markdown(text)
+
+        def build():
+            widget = ChatMessage(text, False, "12:00 PM", html_content=html_content)
+            widget.deleteLater()
+            app.processEvents()
+
+        results.append(summarize(f"message_build_prerendered[{tokens} tokens]", measure(build, repeat)))
+    return results
+
+def bench_stream_render(app, repeat):
+    from ui_widgets import ChatMessage
+    from markdown_renderer import IncrementalMarkdown
+    from instrumentation import FRAME_BUDGET_MS
+
+    results = []
+    for tokens in (2000, 8000):
+        text = make_response_text(tokens)
+        deltas = [text[i:i + 16] for i in range(0, len(text), 16)]
+        early, late = [], []
+        for _ in range(repeat):
+            widget = ChatMessage("", False, "12:00 PM")
+            update_times = []
+            for delta in deltas:
+                start = time.perf_counter()
+                widget.append_text(delta)
+                update_times.append((time.perf_counter() - start) * 1000.0)
+            widget.finish_text()
+            widget.deleteLater()
+            app.processEvents()
+            window = max(1, len(update_times) // 10)
+            early += update_times[:window]
+            late += update_times[-window:]
+        results.append(summarize(f"stream_update_first10%[{tokens} tokens]", early))
+        results.append(summarize(f"stream_update_last10%[{tokens} tokens]", late))
+
+        renderer = IncrementalMarkdown()
+        rendered = [renderer.feed(delta) for delta in deltas]
+        final_block = renderer.flush()
+        gui_times = []
+        for _ in range(repeat):
+            widget = ChatMessage("", False, "12:00 PM")
+            for finished, tail in rendered:
+                start = time.perf_counter()
+                widget.append_rendered(finished, tail)
+                gui_times.append((time.perf_counter() - start) * 1000.0)
+            widget.finish_rendered(final_block)
+            widget.deleteLater()
+            app.processEvents()
+        results.append(summarize(f"stream_update_gui_only[{tokens} tokens]", gui_times,
+                                 over_frame_budget=sum(1 for t in gui_times if t > FRAME_BUDGET_MS)))
+    return results
+
+def run_turn(window, text="What is shown in this image?"):
+    from PySide6.QtCore import QEventLoop, QTimer
+
+    window.message_input.setText(text)
+    window.send_message()
+    thread = window.process_thread
+    loop = QEventLoop()
+    thread.finished.connect(loop.quit)
+    thread.error.connect(loop.quit)
+    QTimer.singleShot(120000, loop.quit)
+    loop.exec()
+    thread.wait()
+    clear_transcript(window)
+
+def bench_end_to_end(app, window, images, repeat):
+    results = []
+    for (width, height), path in images.items():
+        window.image_preview.handle_image_selection(path)
+
+        def round_trip():
+            run_turn(window)
+
+        first_turn = len(window.metrics_recorder.turns)
+        samples = measure(round_trip, repeat)
+        stages = {}
+        turns = window.metrics_recorder.turns[first_turn + 1:]
+        for turn in turns:
+            for stage, values in turn.stages.items():
+                stages.setdefault(stage, []).append(values['wall_ms'])
+        stage_means = {stage: round(statistics.fmean(values), 3) for stage, values in stages.items()}
+        results.append(summarize(f"end_to_end[{width}x{height}]", samples, stages=stage_means,
+                                 gui_stall_ms=round(max(turn.gui_stall_ms for turn in turns), 3)))
+        window.image_preview.clear_image()
+    return results
+
+def bench_prefill(app, window, fake, images, repeat):
+    from PySide6.QtCore import QElapsedTimer
+
+    def wait_for_prefill():
+        timer = QElapsedTimer()
+        timer.start()
+        while timer.elapsed() < 30000:
+            app.processEvents()
+            state = window.prefill_state
+            if state is not None and state.get('ready'):
+                return True
+        return False
+
+    previous = window.settings.value('speculative_prefill', False, type=bool)
+    fake.prompt_cache_size = 4
+    results = []
+    try:
+        for (width, height), path in images.items():
+            cold, warm = [], []
+            for enabled, samples in ((False, cold), (True, warm)):
+                window.settings.setValue('speculative_prefill', enabled)
+                for _ in range(repeat):
+                    fake._prompt_cache.clear()
+                    window.prefill_state = None
+                    window.image_preview.handle_image_selection(path)
+                    if enabled:
+                        wait_for_prefill()
+                    first_turn = len(window.metrics_recorder.turns)
+                    run_turn(window)
+                    turn = window.metrics_recorder.turns[first_turn]
+                    samples.append(turn.first_token_ms)
+                    window.image_preview.clear_image()
+            results.append(summarize(f"ttft[{width}x{height}]", cold))
+            results.append(summarize(f"ttft_prefilled[{width}x{height}]", warm))
+        results.append(summarize("prefill_saved_per_turn", [window.prefill_stats.saved_ms / max(1, window.prefill_stats.turns)],
+                                 hit_rate=window.prefill_stats.hit_rate()))
+    finally:
+        window.settings.setValue('speculative_prefill', previous)
+        fake.prompt_cache_size = 0
+    return results
+
+def bench_routing(app, window, fake, images, repeat):
+    previous = window.settings.value('model_routing', False, type=bool)
+    size = sorted(images)[len(images) // 2]
+    window.image_preview.handle_image_selection(images[size])
+    results = []
+    try:
+        for label, routing, uncertain in (('direct', False, ()), ('routed', True, ()),
+                                          ('routed_escalated', True, (window.model_router.models[0],))):
+            window.settings.setValue('model_routing', routing)
+            fake.uncertain_models = set(uncertain)
+            first_turn = len(window.metrics_recorder.turns)
+            samples = measure(lambda: run_turn(window), repeat)
+            turns = window.metrics_recorder.turns[first_turn + 1:]
+            escalated = sum(1 for turn in turns if turn.escalations)
+            results.append(summarize(f"routing_{label}[{size[0]}x{size[1]}]", samples,
+                                     models=sorted({turn.model for turn in turns}), escalated=escalated))
+    finally:
+        window.settings.setValue('model_routing', previous)
+        fake.uncertain_models = set()
+        window.image_preview.clear_image()
+    return results
+
+def bench_status_updates(app, window, repeat, updates=1000):
+    from PySide6.QtCore import QElapsedTimer
+
+    notification = window.notification
+    applied = []
+
+    def burst():
+        before = notification.applied_updates
+        for i in range(updates):
+            notification.show_message(f"Receiving response... {i} tokens", 'info')
+            notification.set_progress(i * 100 // updates)
+            if i % 10 == 0:
+                app.processEvents()
+        timer = QElapsedTimer()
+        timer.start()
+        while notification.flush_timer.isActive() and timer.elapsed() < 1000:
+            app.processEvents()
+        applied.append(notification.applied_updates - before)
+
+    samples = measure(burst, repeat)
+    notification.set_progress(None)
+    notification.show_message("Ready", 'info')
+    return [summarize(f"status_updates[{updates}]", samples, applied=applied[-1])]
+
+def bench_answer_index(images, repeat, entries=50000):
+    import random
+    from similarity_index import MultiIndexHash, MAX_DISTANCE, dhash, hamming
+    from image_ops import load_image
+
+    results = []
+    for (width, height), path in images.items():
+        image = load_image(path)
+        results.append(summarize(f"dhash[{width}x{height}]", measure(lambda: dhash(image), repeat)))
+
+    rng = random.Random(42)
+    hashes = [rng.getrandbits(64) for _ in range(entries)]
+    index = MultiIndexHash()
+    for position, value in enumerate(hashes):
+        index.add(value, position)
+    queries = [hashes[rng.randrange(entries)] ^ (1 << rng.randrange(64)) for _ in range(20)]
+
+    def indexed_lookup():
+        for query in queries:
+            index.search(query)
+
+    def linear_scan():
+        for query in queries:
+            [value for value in hashes if hamming(query, value) <= MAX_DISTANCE]
+
+    results.append(summarize(f"answer_lookup_indexed[{entries} entries x20]", measure(indexed_lookup, repeat)))
+    results.append(summarize(f"answer_lookup_linear[{entries} entries x20]", measure(linear_scan, repeat)))
+    return results
+
+def bench_message_search(repeat, messages=30000):
+    import random
+    from message_search import MessageIndex
+
+    rng = random.Random(7)
+    words = make_response_text(400).split()
+    parts = ['capacitor', 'resistor', 'connector', 'solder joint', 'heat sink', 'label']
+    defects = ['cracked', 'burnt', 'missing', 'bent', 'corroded', 'scratched']
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        index = MessageIndex(os.path.join(directory, 'messages.sqlite3'))
+        session = index.start_session()
+        insert_times = []
+        for position in range(messages):
+            if position % 2 == 0:
+                text = f"Does board {rng.randrange(5000)} have a {rng.choice(defects)} {rng.choice(parts)}?"
+            else:
+                text = ' '.join(rng.choice(words) for _ in range(60))
+            start = time.perf_counter()
+            index.add(session, position, position % 2 == 0, text, f"board_{position // 2}.jpg")
+            insert_times.append((time.perf_counter() - start) * 1000.0)
+        results.append(summarize(f"message_index_insert[{messages} messages]", insert_times))
+        for query in ('cracked capacitor', 'board 4321', 'corr'):
+            results.append(summarize(f"message_search[{query}]", measure(lambda: index.search(query), repeat),
+                                     hits=len(index.search(query))))
+        index.close()
+    return results
+
+def bench_selection_drag(app, window, images, repeat, moves=200):
+    from PySide6.QtCore import Qt, QPoint, QPointF, QEvent
+    from PySide6.QtGui import QMouseEvent
+
+    label = window.image_preview.image_preview
+    size = max(images)
+    window.image_preview.handle_image_selection(images[size])
+    label.set_selection_mode(True)
+    app.processEvents()
+    display = label.display_rect()
+
+    def mouse(kind, point, button, buttons):
+        return QMouseEvent(kind, QPointF(point), QPointF(label.mapToGlobal(point)), button, buttons,
+                           Qt.KeyboardModifier.NoModifier)
+
+    def drag():
+        start = display.topLeft() + QPoint(10, 10)
+        label.mousePressEvent(mouse(QEvent.Type.MouseButtonPress, start, Qt.MouseButton.LeftButton,
+                                    Qt.MouseButton.LeftButton))
+        app.processEvents()
+        for step in range(1, moves + 1):
+            point = start + QPoint(step * (display.width() - 20) // moves, step * (display.height() - 20) // moves)
+            label.mouseMoveEvent(mouse(QEvent.Type.MouseMove, point, Qt.MouseButton.NoButton,
+                                       Qt.MouseButton.LeftButton))
+            app.processEvents()
+        label.mouseReleaseEvent(mouse(QEvent.Type.MouseButtonRelease, point, Qt.MouseButton.LeftButton,
+                                      Qt.MouseButton.NoButton))
+        app.processEvents()
+
+    results = [summarize(f"selection_drag_per_move[{size[0]}x{size[1]}]",
+                         [sample / moves for sample in measure(drag, repeat)])]
+    interval = label.drag_timer.interval()
+    label.drag_timer.setInterval(0)
+    results.append(summarize(f"selection_repaint_per_move[{size[0]}x{size[1]}]",
+                             [sample / moves for sample in measure(drag, repeat)]))
+    label.drag_timer.setInterval(interval)
+    label.set_selection_mode(False)
+    window.image_preview.clear_image()
+    return results
+
+def bench_transcript_scroll(app, window, repeat):
+    results = []
+    response = make_response_text(300)
+    for count in (100, 400):
+        clear_transcript(window)
+        for i in range(count):
+            window.add_message("Question %d about the image?" % i if i % 2 == 0 else response, i % 2 == 0, "12:00 PM")
+        app.processEvents()
+        scroll_bar = window.chat_scroll_area.verticalScrollBar()
+
+        def scroll_through():
+            step = max(1, scroll_bar.pageStep())
+            for value in range(0, scroll_bar.maximum() + step, step):
+                scroll_bar.setValue(value)
+                window.chat_scroll_area.viewport().repaint()
+                app.processEvents()
+
+        results.append(summarize(f"transcript_scroll[{count} messages]", measure(scroll_through, repeat)))
+    clear_transcript(window)
+    return results
+
+def bench_memory_budget(app, window, images, repeat, count=400):
+    from PySide6.QtCore import QThreadPool
+    from memory_budget import MEGABYTE
+
+    memory = window.memory
+    budget = memory.budget
+    gallery = window.image_preview.gallery
+    response = make_response_text(300)
+    clear_transcript(window)
+    for i in range(count):
+        window.add_message("Question %d about the image?" % i if i % 2 == 0 else response, i % 2 == 0, "12:00 PM")
+    app.processEvents()
+    window.scroll_to_bottom()
+    app.processEvents()
+
+    def fill():
+        for widget in window.message_widgets.values():
+            widget.restore_document()
+        gallery.add_paths(list(images.values()))
+        QThreadPool.globalInstance().waitForDone()
+        gallery.activate(0)
+        QThreadPool.globalInstance().waitForDone()
+        memory.budget = budget
+
+    fill()
+    results = [summarize(f"memory_check[{count} messages]", measure(memory.enforce, repeat))]
+    evict = []
+    before = after = 0
+    for _ in range(repeat):
+        fill()
+        before = memory.total()
+        memory.budget = 1
+        start = time.perf_counter()
+        after = memory.enforce()
+        evict.append((time.perf_counter() - start) * 1000.0)
+    results.append(summarize(f"memory_evict[{count} messages]", evict,
+                             before_mb=before / MEGABYTE, after_mb=after / MEGABYTE))
+    memory.budget = budget
+    gallery.clear()
+    window.image_preview.clear_image()
+    clear_transcript(window)
+    return results
+
+def bench_frames(app, window, repeat):
+    from frames import read_frames, select_keyframes
+
+    preview = window.image_preview
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path, total = make_synthetic_animation(directory)
+        keyframes = []
+
+        def scan():
+            keyframes[:] = select_keyframes(read_frames(path))[0]
+
+        results.append(summarize(f"keyframe_scan[{total} frames]", measure(scan, repeat),
+                                 keyframes=len(keyframes)))
+        preview.handle_image_selection(path)
+        preview.keyframe_thread.wait()
+        app.processEvents()
+        for label, frames in (('keyframes', list(preview.keyframes)), ('all', list(read_frames(path)))):
+            preview.keyframes = frames
+
+            def round_trip():
+                run_turn(window, "What changes between the frames?")
+
+            results.append(summarize(f"end_to_end[{label}: {len(frames)} of {total} frames]",
+                                     measure(round_trip, repeat)))
+        preview.clear_image()
+    return results
+
+def bench_worker(app, window, images, repeat):
+    from PySide6.QtCore import QRect, QTimer
+    from worker_process import InferenceWorker
+
+    size = max(images)
+    preview = window.image_preview
+    preview.handle_image_selection(images[size])
+    preview.image_preview.set_selection_mode(True)
+    display = preview.image_preview.display_rect()
+    preview.image_preview.set_selection_rect(display.adjusted(0, 0, -display.width() // 10, 0))
+    gaps = []
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append((now - last_tick[0]) * 1000.0)
+        last_tick[0] = now
+
+    timer = QTimer()
+    timer.setInterval(1)
+    timer.timeout.connect(tick)
+    results = []
+    for label, worker in (('in_process', None), ('worker', InferenceWorker().start())):
+        window.worker = worker
+        run_turn(window)
+        samples = []
+        longest = []
+        for _ in range(repeat):
+            gaps.clear()
+            last_tick[0] = time.perf_counter()
+            timer.start()
+            samples += measure(lambda: run_turn(window), 1, warmup=0)
+            timer.stop()
+            longest.append(max(gaps))
+        results.append(summarize(f"crop_turn_event_loop_gap[{label}]", longest,
+                                 turn_ms=round(statistics.median(samples), 3)))
+        if worker is not None:
+            worker.stop()
+    window.worker = None
+    preview.image_preview.set_selection_mode(False)
+    preview.clear_image()
+    return results
+
+def bench_resolution(app, window, fake, images, repeat):
+    from resolution import MIN_SAMPLES
+
+    size = max(images)
+    window.image_preview.handle_image_selection(images[size])
+    previous = (window.settings.value('adaptive_resolution', False, type=bool), fake.prefill_per_megabyte,
+                window.resolution.target_ms)
+    # A slow host: prefill grows with the size of the request, so the native image misses the target.
+    fake.prefill_per_megabyte = 0.5
+    turns = max(10, 2 * repeat)
+    results = []
+    target = None
+    try:
+        for label, adaptive in (('native', False), ('adaptive', True)):
+            window.settings.setValue('adaptive_resolution', adaptive)
+            window.resolution.samples.clear()
+            latencies, widths = [], []
+            for _ in range(turns):
+                first_turn = len(window.metrics_recorder.turns)
+                run_turn(window)
+                turn = window.metrics_recorder.turns[first_turn]
+                latencies.append(turn.backend['prompt_eval_duration'] / 1e6)
+                widths.append(turn.resolution['width'])
+            if target is None:
+                target = round(statistics.median(latencies) / 2)
+                window.resolution.set_target(target)
+            results.append(summarize(f"prompt_eval[{label}: {size[0]}x{size[1]}]", latencies,
+                                     target_ms=target, widths=widths,
+                                     settled_median_ms=statistics.median(latencies[MIN_SAMPLES:])))
+    finally:
+        window.settings.setValue('adaptive_resolution', previous[0])
+        fake.prefill_per_megabyte = previous[1]
+        window.resolution.set_target(previous[2])
+        window.resolution.samples.clear()
+        window.image_preview.clear_image()
+    return results
+
+def bench_theme(app, window, repeat, count=200):
+    response = make_response_text(40)
+
+    def add_messages():
+        clear_transcript(window)
+        for i in range(count):
+            window.add_message("Question %d about the image?" % i if i % 2 == 0 else response, i % 2 == 0, "12:00 PM")
+        app.processEvents()
+
+    def restyle():
+        app.setStyleSheet(app.styleSheet())
+        window.repaint()
+        app.processEvents()
+
+    results = [summarize(f"add_messages[{count}]", measure(add_messages, repeat))]
+    results.append(summarize(f"restyle[{count} messages]", measure(restyle, repeat)))
+    clear_transcript(window)
+    return results
+
+def start_api_server(workers=2):
+    import asyncio
+    from ITT_Qwen_server import ApiServer, ImageStore, InferencePool
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    async def start():
+        pool = InferencePool(workers)
+        pool.start()
+        server = await asyncio.start_server(ApiServer(pool, ImageStore()).handle_connection, '127.0.0.1', 0)
+        state.update(pool=pool, server=server, url=f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+
+    def run():
+        loop.run_until_complete(start())
+        ready.set()
+        loop.run_forever()
+
+    async def shutdown():
+        state['server'].close()
+        await state['server'].wait_closed()
+        await state['pool'].stop()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    thread = threading.Thread(target=run, name='api-server', daemon=True)
+    thread.start()
+    ready.wait()
+    return state['url'], stop
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, json.dumps(payload).encode('utf-8'),
+                                     {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.read()
+
+def bench_server(images, repeat, batch_size=4):
+    import base64
+
+    with open(images[min(images)], 'rb') as f:
+        image_base64 = base64.b64encode(f.read()).decode('ascii')
+    url, stop = start_api_server()
+    counter = [0]
+
+    def ask_payload(**extra):
+        # A fresh question each time so no request is answered by coalescing with another.
+        counter[0] += 1
+        return dict(question=f"What is shown in this image? ({counter[0]})", image_base64=image_base64, **extra)
+
+    def ask_stream():
+        events = post_json(f"{url}/v1/ask", ask_payload()).decode('utf-8').split('\n\n')
+        last = [event for event in events if event.strip()][-1]
+        if not last.startswith('event: done'):
+            raise RuntimeError(f"Streamed ask did not finish: {last[:200]}")
+
+    def ask_json():
+        answer = json.loads(post_json(f"{url}/v1/ask", ask_payload(stream=False)))
+        if not answer.get('answer'):
+            raise RuntimeError(f"Ask failed: {answer}")
+
+    def batch():
+        answers = json.loads(post_json(f"{url}/v1/batch", {'requests': [ask_payload() for _ in range(batch_size)]}))
+        failed = [answer for answer in answers['results'] if 'error' in answer]
+        if failed:
+            raise RuntimeError(f"Batch entries failed: {failed}")
+
+    try:
+        return [
+            summarize("server_ask[stream]", measure(ask_stream, repeat)),
+            summarize("server_ask[json]", measure(ask_json, repeat)),
+            summarize(f"server_batch[{batch_size} requests]", measure(batch, repeat)),
+        ]
+    finally:
+        stop()
+
+def print_results(results, baseline=None):
+    baseline_by_name = {r['name']: r for r in (baseline or {}).get('results', [])}
+    header = f"{'benchmark':<38}{'median':>11}{'p90':>11}{'mean':>11}{'n':>5}"
+    if baseline_by_name:
+        header += f"{'vs base':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        line = (f"{result['name']:<38}{result['median']:>9.2f}ms{result['p90']:>9.2f}ms"
+                f"{result['mean']:>9.2f}ms{result['samples']:>5}")
+        previous = baseline_by_name.get(result['name'])
+        if previous and previous['median']:
+            change = (result['median'] - previous['median']) / previous['median'] * 100.0
+            line += f"{change:>+9.1f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline ITT-Qwen benchmarks against a fake Ollama server.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--prefill-delay', type=float, default=0.05)
+    parser.add_argument('--only', nargs='*', default=None,
+                        choices=BENCHMARKS)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON file produced by --output')
+    args = parser.parse_args()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    data_dir = tempfile.TemporaryDirectory()
+    os.environ['ITT_QWEN_MESSAGE_INDEX'] = os.path.join(data_dir.name, 'messages.sqlite3')
+    os.environ['ITT_QWEN_ANSWER_INDEX'] = os.path.join(data_dir.name, 'answer_index.sqlite3')
+    fake = FakeOllamaServer(tokens_per_second=args.tokens_per_second,
+                            prefill_delay=args.prefill_delay, prompt_cache_size=0).start()
+    os.environ['OLLAMA_HOST'] = fake.url
+
+    from PySide6.QtWidgets import QApplication, QMessageBox
+    from main_application import ImageToTextChatApp
+    from theme import apply_theme
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    apply_theme(app)
+    QMessageBox.critical = staticmethod(lambda parent, title, text, *a, **k: print(f"{title}: {text}", file=sys.stderr))
+    window = ImageToTextChatApp()
+    window.show()
+    app.processEvents()
+
+    selected = set(args.only or BENCHMARKS)
+    results = []
+    if 'startup' in selected:
+        results += bench_startup(app, args.repeat)
+    with tempfile.TemporaryDirectory() as image_dir:
+        images = make_synthetic_images(image_dir)
+        if 'image' in selected:
+            results += bench_image_encode(window, images, args.repeat)
+        if 'gallery' in selected:
+            results += bench_gallery(window, images, args.repeat)
+        if 'markdown' in selected:
+            results += bench_markdown_render(app, args.repeat)
+            results += bench_stream_render(app, args.repeat)
+        if 'end_to_end' in selected:
+            results += bench_end_to_end(app, window, images, args.repeat)
+        if 'prefill' in selected:
+            results += bench_prefill(app, window, fake, images, args.repeat)
+        if 'routing' in selected:
+            results += bench_routing(app, window, fake, images, args.repeat)
+        if 'status' in selected:
+            results += bench_status_updates(app, window, args.repeat)
+        if 'answers' in selected:
+            results += bench_answer_index(images, args.repeat)
+        if 'search' in selected:
+            results += bench_message_search(args.repeat)
+        if 'selection' in selected:
+            results += bench_selection_drag(app, window, images, args.repeat)
+        if 'scroll' in selected:
+            results += bench_transcript_scroll(app, window, args.repeat)
+        if 'memory' in selected:
+            results += bench_memory_budget(app, window, images, args.repeat)
+        if 'frames' in selected:
+            results += bench_frames(app, window, args.repeat)
+        if 'worker' in selected:
+            results += bench_worker(app, window, images, args.repeat)
+        if 'resolution' in selected:
+            results += bench_resolution(app, window, fake, images, args.repeat)
+        if 'theme' in selected:
+            results += bench_theme(app, window, args.repeat)
+        if 'server' in selected:
+            results += bench_server(images, args.repeat)
+
+    window.close()
+    fake.stop()
+    data_dir.cleanup()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'qt_platform': os.environ.get('QT_QPA_PLATFORM'),
+            'tokens_per_second': args.tokens_per_second,
+            'prefill_delay': args.prefill_delay,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
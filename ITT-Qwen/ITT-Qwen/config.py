@@ -1,3 +1,7 @@
+DEFAULT_MODEL = 'qwen2.5vl:7b'
+
+MODEL_LADDER = ['qwen2.5vl:3b', 'qwen2.5vl:7b']
+
 COLORS = {
     'background': '#1C1F21',    
     'secondary_bg': '#2A2D2E',  
@@ -15,6 +19,84 @@ COLORS = {
     'notification_info': '#2196F3'
 }
 
+CODE_HIGHLIGHT_COLORS = {
+    'Comment': '#586e75',
+    'Comment.Preproc': '#859900',
+    'Comment.Special': '#859900',
+    'Error': '#93a1a1',
+    'Generic.Deleted': '#2aa198',
+    'Generic.Emph': 'italic',
+    'Generic.Heading': '#cb4b16',
+    'Generic.Strong': 'bold',
+    'Generic.Subheading': '#cb4b16',
+    'Keyword': '#859900',
+    'Keyword.Constant': '#cb4b16',
+    'Keyword.Declaration': '#268bd2',
+    'Keyword.Reserved': '#268bd2',
+    'Keyword.Type': '#dc322f',
+    'Literal': '#2aa198',
+    'Literal.Date': '#93a1a1',
+    'Name': '#268bd2',
+    'Name.Attribute': '#93a1a1',
+    'Name.Builtin': '#B58900',
+    'Name.Builtin.Pseudo': '#268bd2',
+    'Name.Constant': '#cb4b16',
+    'Name.Entity': '#cb4b16',
+    'Name.Exception': '#cb4b16',
+    'Name.Label': '#93a1a1',
+    'Name.Namespace': '#93a1a1',
+    'Name.Other': '#93a1a1',
+    'Name.Property': '#93a1a1',
+    'Operator': '#859900',
+    'Punctuation': '#cb4b16',
+    'String.Backtick': '#586e75',
+    'String.Doc': '#93a1a1',
+    'String.Escape': '#cb4b16',
+    'String.Regex': '#dc322f',
+    'Text.Whitespace': '#93a1a1',
+}
+
+SYSTEM_PROMPT = """You are Insight AI, a specialized visual assistant. Your goal is to provide clear, accurate, and well-structured information.
+
+**Core Instructions:**
+1.  **Image Analysis:** When an image is provided, your primary function is to meticulously analyze it and answer questions based *only* on the visual information present.
+2.  **General Conversation:** If no image is provided, act as a helpful, general-purpose assistant.
+3.  **Honesty:** If you cannot determine an answer from the image, explicitly state that the information is not available in the provided visual. Do not speculate or invent details.
+
+**Formatting Rules:**
+- You MUST format all your responses using GitHub Flavored Markdown.
+- Use headings, lists, and bold text to structure your answers for maximum readability.
+- For any code snippets, use fenced code blocks with appropriate language identifiers (e.g., ```python)."""
+
+PROMPT_VARIANTS = {
+    'default': "",
+    'concise': """
+
+**Length:** Answer in one to three sentences. Skip headings and preamble unless the user asks for detail.""",
+    'detailed': """
+
+**Length:** Give a thorough answer. Cover every relevant region of the image and organise it with headings and lists.""",
+    'ocr': """
+
+**Text Extraction:** Transcribe all legible text in the image exactly as written, preserving line breaks and reading order. Put the transcription in a fenced code block. Mark unreadable characters with [?] and do not describe the image unless asked.""",
+}
+
+DEFAULT_GENERATION_PROFILE = 'Default'
+
+GENERATION_PROFILES = {
+    'Default': {'num_predict': 0, 'num_ctx': 0, 'stop': [], 'prompt_variant': 'default'},
+    'Quick Answer': {'num_predict': 160, 'num_ctx': 4096, 'stop': [], 'prompt_variant': 'concise'},
+    'Detailed': {'num_predict': 2048, 'num_ctx': 8192, 'stop': [], 'prompt_variant': 'detailed'},
+    'OCR': {'num_predict': 1024, 'num_ctx': 4096, 'stop': [], 'prompt_variant': 'ocr'},
+}
+
+STRUCTURED_SYSTEM_PROMPT = """You are Insight AI, a visual data extraction assistant.
+
+Read the provided image and answer with a single JSON value that matches the schema below. Use null for any field you cannot read from the image. Do not add commentary, Markdown or code fences.
+
+Schema:
+{schema}"""
+
 DEFAULT_TUTORIAL_MESSAGE = """### Welcome to ITT-Qwen! 👋
 
 This is your visual analysis assistant. Here's how to get started:
@@ -5,22 +5,11 @@ from PySide6.QtGui import QColor, QPainter, QPen
 from config import COLORS
 
 class TitleBarButton(QPushButton):
-    def __init__(self, icon_name, hover_color, parent=None):
+    def __init__(self, icon_name, parent=None):
         super().__init__(parent)
         self.setFixedSize(30, 30)
-        self.hover_color = hover_color
+        self.setObjectName('closeButton' if icon_name == 'close' else 'titleButton')
         self.icon_name = icon_name
-        self.setStyleSheet(f"""
-            QPushButton {{
-                border: none;
-                border-radius: 0px;
-                background-color: transparent;
-                padding: 5px;
-            }}
-            QPushButton:hover {{
-                background-color: {hover_color};
-            }}
-        """)
 
     def paintEvent(self, event):
         super().paintEvent(event)
@@ -43,6 +32,7 @@ class CustomTitleBar(QWidget):
         super().__init__(parent)
         self.parent = parent
         self.setFixedHeight(40)
+        self.setObjectName('titleBar')
         self.drag_pos = None
         self.title = title
         self.show_minimize = show_minimize
@@ -55,41 +45,28 @@ class CustomTitleBar(QWidget):
         layout.setSpacing(0)
 
         self.title_label = QLabel(self.title)
-        self.title_label.setStyleSheet(f"""
-            color: {COLORS['text']};
-            font-size: 13px;
-            font-weight: bold;
-            border: none;
-            background-color: transparent;
-        """)
+        self.title_label.setObjectName('windowTitle')
         layout.addWidget(self.title_label)
         layout.addStretch()
 
         if self.show_minimize:
-            self.minimize_btn = TitleBarButton('minimize', COLORS['secondary_bg'])
+            self.minimize_btn = TitleBarButton('minimize')
             self.minimize_btn.clicked.connect(self.parent.showMinimized)
             layout.addWidget(self.minimize_btn)
         else:
             self.minimize_btn = None
         
         if self.show_maximize:
-            self.maximize_btn = TitleBarButton('maximize', COLORS['secondary_bg'])
+            self.maximize_btn = TitleBarButton('maximize')
             self.maximize_btn.clicked.connect(self.toggle_maximize)
             layout.addWidget(self.maximize_btn)
         else:
             self.maximize_btn = None
         
-        self.close_btn = TitleBarButton('close', '#FF4444')
+        self.close_btn = TitleBarButton('close')
         self.close_btn.clicked.connect(self.parent.close)
         layout.addWidget(self.close_btn)
 
-        self.setStyleSheet(f"""
-            CustomTitleBar {{
-                background-color: {COLORS['background']};
-                border-bottom: 1px solid {COLORS['border']};
-            }}
-        """)
-
     def toggle_maximize(self):
         if self.parent.isMaximized():
             self.parent.showNormal()
@@ -117,13 +94,7 @@ class FramelessWindow(QMainWindow):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
 
         self.central_widget = QWidget()
-        self.central_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-                border: 1px solid {COLORS['border']};
-                border-radius: 8px;
-            }}
-        """)
+        self.central_widget.setObjectName('windowFrame')
         self.setCentralWidget(self.central_widget)
         
         self.layout = QVBoxLayout(self.central_widget)
@@ -134,7 +105,7 @@ class FramelessWindow(QMainWindow):
         self.layout.addWidget(self.title_bar)
         
         self.content_container = QWidget()
-        self.content_container.setStyleSheet("border: none; border-radius: 0px;")
+        self.content_container.setObjectName('content')
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
\ No newline at end of file
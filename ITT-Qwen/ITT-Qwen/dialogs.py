@@ -0,0 +1,354 @@
+import os
+import time
+
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit,
+                             QDialog, QCheckBox, QComboBox, QSpinBox, QLineEdit, QFormLayout, QLabel,
+                             QListWidget, QListWidgetItem, QMessageBox, QSplitter)
+from PySide6.QtCore import Qt, QSettings, QTimer, Signal
+
+from config import COLORS, DEFAULT_TUTORIAL_MESSAGE, PROMPT_VARIANTS, MODEL_LADDER
+from profiles import load_profiles, save_profiles, active_profile_name, parse_stop_sequences, format_stop_sequences
+from custom_window import CustomTitleBar
+from markdown_renderer import render_markdown
+from ui_widgets import MarkdownTextBrowser
+from memory_budget import DEFAULT_BUDGET_MB
+from resolution import DEFAULT_LATENCY_TARGET_MS
+
+class AboutDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Dialog)
+        self.setModal(True)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setFixedSize(450, 320)
+        
+        dialog_layout = QVBoxLayout(self)
+        dialog_layout.setContentsMargins(0, 0, 0, 0)
+
+        container_widget = QWidget()
+        container_widget.setObjectName('windowFrame')
+        dialog_layout.addWidget(container_widget)
+        
+        container_layout = QVBoxLayout(container_widget)
+        container_layout.setContentsMargins(0, 0, 0, 0)
+        container_layout.setSpacing(0)
+
+        self.title_bar = CustomTitleBar(self, title="About ITT-Qwen", show_minimize=False, show_maximize=False)
+        container_layout.addWidget(self.title_bar)
+
+        content_widget = QWidget()
+        content_widget.setObjectName('dialogContent')
+        content_layout = QVBoxLayout(content_widget)
+        content_layout.setContentsMargins(20, 20, 20, 20)
+        container_layout.addWidget(content_widget)
+
+        about_text = """
+            ### ITT-Qwen (Image To Text)
+            **Version 1.0**
+
+            Built by: **Matt Wesney**
+
+            This application leverages the power of the Qwen Vision Language Model (`qwen2.5vl:7b`) via Ollama to provide detailed analysis and answers based on the images you provide.
+        """
+
+        about_browser = MarkdownTextBrowser()
+        about_browser.setObjectName('aboutText')
+        
+        html = render_markdown(about_text)
+        doc_style = f"""
+        <style>
+            h3 {{ color: {COLORS['text_secondary']}; }}
+            a {{ color: #81A2BE; text-decoration: none; }}
+            a:hover {{ text-decoration: underline; }}
+        </style>
+        """
+        about_browser.setHtml(doc_style + html)
+        
+        content_layout.addWidget(about_browser)
+        content_layout.addStretch()
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+
+        ok_button = QPushButton("OK")
+        ok_button.setFixedWidth(100)
+        ok_button.setObjectName('dialogButton')
+        ok_button.clicked.connect(self.accept)
+        button_layout.addWidget(ok_button)
+
+        content_layout.addLayout(button_layout)
+
+class SettingsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.settings = QSettings('ImageChat', 'Settings')
+        self.profiles = load_profiles(self.settings)
+        self.editing_profile = None
+        self.init_ui()
+        
+    def init_ui(self):
+        self.setObjectName('settingsDialog')
+        self.setWindowTitle('Settings')
+        self.setMinimumWidth(400)
+        layout = QVBoxLayout(self)
+        
+        tutorial_group = QWidget()
+        tutorial_layout = QVBoxLayout(tutorial_group)
+        
+        self.show_tutorial = QCheckBox('Show Tutorial Message on Startup')
+        self.show_tutorial.setChecked(self.settings.value('show_tutorial', True, type=bool))
+        tutorial_layout.addWidget(self.show_tutorial)
+
+        self.show_metrics = QCheckBox('Show Performance Readout in Status Bar')
+        self.show_metrics.setChecked(self.settings.value('show_metrics', False, type=bool))
+        tutorial_layout.addWidget(self.show_metrics)
+
+        self.auto_suggest_areas = QCheckBox('Suggest Areas Automatically When an Image Loads')
+        self.auto_suggest_areas.setChecked(self.settings.value('auto_suggest_areas', False, type=bool))
+        tutorial_layout.addWidget(self.auto_suggest_areas)
+
+        self.speculative_prefill = QCheckBox('Prefill the Selected Image While Typing (Speculative)')
+        self.speculative_prefill.setChecked(self.settings.value('speculative_prefill', False, type=bool))
+        tutorial_layout.addWidget(self.speculative_prefill)
+
+        self.reuse_similar_answers = QCheckBox('Offer Answers From Near-Identical Images')
+        self.reuse_similar_answers.setChecked(self.settings.value('reuse_similar_answers', False, type=bool))
+        tutorial_layout.addWidget(self.reuse_similar_answers)
+
+        self.search_history = QCheckBox('Keep a Searchable History of Conversations')
+        self.search_history.setChecked(self.settings.value('search_history', True, type=bool))
+        tutorial_layout.addWidget(self.search_history)
+
+        self.model_routing = QCheckBox('Route Simple Questions to a Smaller Model First')
+        self.model_routing.setChecked(self.settings.value('model_routing', False, type=bool))
+        tutorial_layout.addWidget(self.model_routing)
+
+        self.model_ladder = QLineEdit(self.settings.value('model_ladder', ', '.join(MODEL_LADDER)))
+        self.model_ladder.setPlaceholderText('Models from smallest to largest, comma separated')
+        tutorial_layout.addWidget(self.model_ladder)
+
+        self.worker_process = QCheckBox('Encode Images and Call the Model From a Separate Process')
+        self.worker_process.setChecked(self.settings.value('worker_process', False, type=bool))
+        tutorial_layout.addWidget(self.worker_process)
+
+        memory_layout = QHBoxLayout()
+        memory_layout.addWidget(QLabel('Memory Budget for Images and Messages'))
+        self.memory_budget = QSpinBox()
+        self.memory_budget.setRange(128, 65536)
+        self.memory_budget.setSingleStep(128)
+        self.memory_budget.setSuffix(' MB')
+        self.memory_budget.setValue(self.settings.value('memory_budget_mb', DEFAULT_BUDGET_MB, type=int))
+        memory_layout.addWidget(self.memory_budget)
+        tutorial_layout.addLayout(memory_layout)
+
+        self.adaptive_resolution = QCheckBox('Shrink Images to Meet a Prefill Latency Target')
+        self.adaptive_resolution.setChecked(self.settings.value('adaptive_resolution', False, type=bool))
+        tutorial_layout.addWidget(self.adaptive_resolution)
+
+        latency_layout = QHBoxLayout()
+        latency_layout.addWidget(QLabel('Prefill Latency Target (90th percentile)'))
+        self.latency_target = QSpinBox()
+        self.latency_target.setRange(250, 120000)
+        self.latency_target.setSingleStep(250)
+        self.latency_target.setSuffix(' ms')
+        self.latency_target.setValue(self.settings.value('latency_target_ms', DEFAULT_LATENCY_TARGET_MS, type=int))
+        latency_layout.addWidget(self.latency_target)
+        tutorial_layout.addLayout(latency_layout)
+        
+        self.tutorial_text = QTextEdit()
+        self.tutorial_text.setPlaceholderText('Custom tutorial message...')
+        self.tutorial_text.setText(self.settings.value('tutorial_message', DEFAULT_TUTORIAL_MESSAGE))
+        tutorial_layout.addWidget(self.tutorial_text)
+        
+        layout.addWidget(tutorial_group)
+
+        profile_group = QWidget()
+        profile_layout = QFormLayout(profile_group)
+        profile_layout.addRow(QLabel('Generation Profiles'))
+
+        self.profile_selector = QComboBox()
+        self.profile_selector.addItems(list(self.profiles))
+        self.profile_selector.currentTextChanged.connect(self.load_profile)
+        profile_layout.addRow('Profile', self.profile_selector)
+
+        self.num_predict = QSpinBox()
+        self.num_predict.setRange(0, 32768)
+        self.num_predict.setSpecialValueText('Unlimited')
+        profile_layout.addRow('Max Output Tokens', self.num_predict)
+
+        self.num_ctx = QSpinBox()
+        self.num_ctx.setRange(0, 131072)
+        self.num_ctx.setSingleStep(1024)
+        self.num_ctx.setSpecialValueText('Model Default')
+        profile_layout.addRow('Context Window', self.num_ctx)
+
+        self.stop_sequences = QLineEdit()
+        self.stop_sequences.setPlaceholderText('Separate with |, write newlines as \\n')
+        profile_layout.addRow('Stop Sequences', self.stop_sequences)
+
+        self.prompt_variant = QComboBox()
+        self.prompt_variant.addItems(list(PROMPT_VARIANTS))
+        profile_layout.addRow('Prompt Variant', self.prompt_variant)
+
+        layout.addWidget(profile_group)
+        self.profile_selector.setCurrentText(active_profile_name(self.settings))
+        self.load_profile(self.profile_selector.currentText())
+        
+        button_layout = QHBoxLayout()
+        save_btn = QPushButton('Save')
+        save_btn.clicked.connect(self.save_settings)
+        cancel_btn = QPushButton('Cancel')
+        cancel_btn.clicked.connect(self.reject)
+        button_layout.addWidget(save_btn)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout)
+
+    def store_profile(self):
+        if self.editing_profile is None:
+            return
+        self.profiles[self.editing_profile] = {
+            'num_predict': self.num_predict.value(),
+            'num_ctx': self.num_ctx.value(),
+            'stop': parse_stop_sequences(self.stop_sequences.text()),
+            'prompt_variant': self.prompt_variant.currentText(),
+        }
+
+    def load_profile(self, name):
+        self.store_profile()
+        profile = self.profiles[name]
+        self.editing_profile = name
+        self.num_predict.setValue(profile['num_predict'])
+        self.num_ctx.setValue(profile['num_ctx'])
+        self.stop_sequences.setText(format_stop_sequences(profile['stop']))
+        self.prompt_variant.setCurrentText(profile['prompt_variant'])
+    
+    def save_settings(self):
+        self.store_profile()
+        save_profiles(self.settings, self.profiles)
+        self.settings.setValue('show_tutorial', self.show_tutorial.isChecked())
+        self.settings.setValue('show_metrics', self.show_metrics.isChecked())
+        self.settings.setValue('auto_suggest_areas', self.auto_suggest_areas.isChecked())
+        self.settings.setValue('speculative_prefill', self.speculative_prefill.isChecked())
+        self.settings.setValue('reuse_similar_answers', self.reuse_similar_answers.isChecked())
+        self.settings.setValue('search_history', self.search_history.isChecked())
+        self.settings.setValue('model_routing', self.model_routing.isChecked())
+        self.settings.setValue('model_ladder', self.model_ladder.text())
+        self.settings.setValue('memory_budget_mb', self.memory_budget.value())
+        self.settings.setValue('worker_process', self.worker_process.isChecked())
+        self.settings.setValue('adaptive_resolution', self.adaptive_resolution.isChecked())
+        self.settings.setValue('latency_target_ms', self.latency_target.value())
+        self.settings.setValue('tutorial_message', self.tutorial_text.toPlainText())
+        self.accept()
+
+class SearchDialog(QDialog):
+    message_activated = Signal(int, int)
+
+    def __init__(self, message_index, parent=None):
+        super().__init__(parent)
+        self.message_index = message_index
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setObjectName('searchDialog')
+        self.setWindowTitle('Search Conversations')
+        self.resize(640, 520)
+        layout = QVBoxLayout(self)
+
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText('Search questions and answers...')
+        self.query_input.textChanged.connect(lambda: self.search_timer.start())
+        self.query_input.returnPressed.connect(self.run_search)
+        layout.addWidget(self.query_input)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        self.results_list = QListWidget()
+        self.results_list.setWordWrap(True)
+        self.results_list.currentItemChanged.connect(self.show_preview)
+        self.results_list.itemActivated.connect(self.activate_item)
+        splitter.addWidget(self.results_list)
+
+        self.preview = MarkdownTextBrowser()
+        self.preview.setOpenExternalLinks(True)
+        splitter.addWidget(self.preview)
+        splitter.setSizes([300, 200])
+        layout.addWidget(splitter)
+
+        button_layout = QHBoxLayout()
+        clear_btn = QPushButton('Delete Search History')
+        clear_btn.clicked.connect(self.clear_history)
+        button_layout.addWidget(clear_btn)
+        button_layout.addStretch()
+        self.jump_btn = QPushButton('Show in Chat')
+        self.jump_btn.setEnabled(False)
+        self.jump_btn.clicked.connect(lambda: self.activate_item(self.results_list.currentItem()))
+        button_layout.addWidget(self.jump_btn)
+        close_btn = QPushButton('Close')
+        close_btn.clicked.connect(self.close)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def run_search(self):
+        self.search_timer.stop()
+        query = self.query_input.text()
+        self.results_list.clear()
+        self.preview.clear()
+        if not query.strip():
+            self.status_label.clear()
+            return
+        start = time.perf_counter()
+        try:
+            hits = self.message_index.search(query)
+        except Exception as e:
+            self.status_label.setText(f"Search failed: {e}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        current_session = getattr(self.parent(), 'session_id', None)
+        for hit in hits:
+            speaker = 'You' if hit['is_user'] else 'Qwen'
+            where = 'this session' if hit['session_id'] == current_session else hit['created_at'].replace('T', ' ')
+            image = f" · {os.path.basename(hit['image'])}" if hit['image'] else ''
+            item = QListWidgetItem(f"{speaker} · {where}{image}\n{' '.join(hit['snippet'].split())}")
+            item.setData(Qt.ItemDataRole.UserRole, hit)
+            self.results_list.addItem(item)
+        self.status_label.setText(f"{len(hits)} results in {elapsed_ms:.1f} ms")
+        if hits:
+            self.results_list.setCurrentRow(0)
+
+    def show_preview(self, item, previous=None):
+        if item is None:
+            self.jump_btn.setEnabled(False)
+            return
+        hit = item.data(Qt.ItemDataRole.UserRole)
+        self.jump_btn.setEnabled(hit['session_id'] == getattr(self.parent(), 'session_id', None))
+        text = self.message_index.message_text(hit['id']) or ''
+        self.preview.setHtml(render_markdown(text))
+
+    def activate_item(self, item):
+        if item is None:
+            return
+        hit = item.data(Qt.ItemDataRole.UserRole)
+        self.message_activated.emit(hit['session_id'], hit['position'])
+
+    def clear_history(self):
+        reply = QMessageBox.question(
+            self,
+            'Delete Search History',
+            'Delete the stored history of all conversations?',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.message_index.clear()
+            if self.parent() is not None:
+                self.parent().session_id = None
+            self.run_search()
@@ -0,0 +1,123 @@
+from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtGui import QImageReader
+
+from image_ops import to_working_format
+from similarity_index import dhash, hamming, grayscale_rows
+
+FRAME_EXTENSIONS = ('.gif', '.tif', '.tiff', '.webp')
+MAX_KEYFRAMES = 8
+FRAME_DEDUP_DISTANCE = 4
+FRAME_DEDUP_BRIGHTNESS = 8
+BRIGHTNESS_SAMPLE = 16
+
+def frame_count(path):
+    if not path or not path.lower().endswith(FRAME_EXTENSIONS):
+        return 1
+    return max(QImageReader(path).imageCount(), 1)
+
+def read_frames(path, start=0):
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    if reader.supportsAnimation():
+        index = 0
+        while True:
+            image = reader.read()
+            if image.isNull():
+                return
+            if index >= start:
+                yield index, to_working_format(image)
+            index += 1
+    for index in range(start, max(reader.imageCount(), 1)):
+        # A fresh reader per page: jumpToImage() fails after read() with the TIFF handler.
+        page = QImageReader(path)
+        page.setAutoTransform(True)
+        if index and not page.jumpToImage(index):
+            return
+        image = page.read()
+        if image.isNull():
+            return
+        yield index, to_working_format(image)
+
+def read_frame(path, index):
+    for _, image in read_frames(path, index):
+        return image
+    raise ValueError(f"Frame {index + 1} not found in {path}")
+
+def brightness(image):
+    sample = image.scaled(BRIGHTNESS_SAMPLE, BRIGHTNESS_SAMPLE, Qt.AspectRatioMode.IgnoreAspectRatio,
+                          Qt.TransformationMode.FastTransformation)
+    rows = grayscale_rows(sample)
+    return sum(int(value) for row in rows for value in row) / (BRIGHTNESS_SAMPLE * BRIGHTNESS_SAMPLE)
+
+def frame_signature(image):
+    return dhash(image), brightness(image)
+
+def is_repeat(signature, previous, max_distance=FRAME_DEDUP_DISTANCE):
+    # dHash only sees gradients, so flat frames that differ in tone need the brightness check too.
+    return (hamming(signature[0], previous[0]) <= max_distance and
+            abs(signature[1] - previous[1]) <= FRAME_DEDUP_BRIGHTNESS)
+
+def spread(items, limit):
+    if len(items) <= limit:
+        return list(items)
+    if limit == 1:
+        return [items[0]]
+    return [items[round(i * (len(items) - 1) / (limit - 1))] for i in range(limit)]
+
+def select_keyframes(frames, limit=MAX_KEYFRAMES, max_distance=FRAME_DEDUP_DISTANCE, is_cancelled=None):
+    keyframes = []
+    last_signature = None
+    total = 0
+    for index, image in frames:
+        if is_cancelled is not None and is_cancelled():
+            break
+        total += 1
+        signature = frame_signature(image)
+        if last_signature is not None and is_repeat(signature, last_signature, max_distance):
+            continue
+        last_signature = signature
+        keyframes.append((index, image))
+        if len(keyframes) > 2 * limit:
+            keyframes = keyframes[::2]
+    return spread(keyframes, limit), total
+
+def load_frames(path, frames):
+    missing = sorted(index for index, image in frames if image is None)
+    if not missing:
+        return frames
+    loaded = {}
+    for index, image in read_frames(path, missing[0]):
+        if index in missing:
+            loaded[index] = image
+            if len(loaded) == len(missing):
+                break
+    return [(index, image if image is not None else loaded[index]) for index, image in frames]
+
+def frame_prompt(indices, total, question):
+    labels = ', '.join(str(index + 1) for index in indices)
+    return (f"The attached images are frames {labels} of a {total}-frame animation or document, in order. "
+            f"Answer for each frame under a 'Frame N:' heading using those frame numbers, "
+            f"then summarize across frames.\n\n{question}")
+
+class KeyframeThread(QThread):
+    finished = Signal(str, list, int)
+    error = Signal(str)
+
+    def __init__(self, path, limit=MAX_KEYFRAMES):
+        super().__init__()
+        self.path = path
+        self.limit = limit
+        self._is_cancelled = False
+
+    def cancel(self):
+        self._is_cancelled = True
+
+    def run(self):
+        try:
+            keyframes, total = select_keyframes(read_frames(self.path), self.limit,
+                                                is_cancelled=lambda: self._is_cancelled)
+        except Exception as e:
+            self.error.emit(f"Frame analysis failed: {str(e)}")
+            return
+        if not self._is_cancelled:
+            self.finished.emit(self.path, keyframes, total)
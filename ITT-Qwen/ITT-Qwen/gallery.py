@@ -0,0 +1,278 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QListWidget, QListWidgetItem, QListView, QFileDialog, QAbstractItemView)
+from PySide6.QtCore import Qt, Signal, QObject, QRunnable, QThreadPool, QSize
+from PySide6.QtGui import QPixmap, QIcon
+
+from image_ops import load_image, scale_image, encode_image_payload
+from memory_budget import image_bytes
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+THUMBNAIL_SIZE = 96
+PREFETCH_AHEAD = 3
+PREVIEW_MAX_SIDE = 1024
+
+def is_image_file(path):
+    return os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS)
+
+def expand_image_paths(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path), key=str.lower):
+                candidate = os.path.join(path, name)
+                if is_image_file(candidate):
+                    images.append(candidate)
+        elif is_image_file(path):
+            images.append(path)
+    return images
+
+def file_key(path):
+    try:
+        return (path, os.path.getmtime(path))
+    except OSError:
+        return (path, None)
+
+class PrefetchCache:
+    def __init__(self, max_entries=PREFETCH_AHEAD + 2):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pending = set()
+        self.generation = 0
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        key = file_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, ticket, image, preview, payload):
+        generation, key = ticket
+        with self._lock:
+            if generation != self.generation:
+                # Loaded for a gallery that has since been cleared.
+                return
+            self._pending.discard(key)
+            self._entries[key] = (image, preview, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def claim(self, path):
+        key = file_key(path)
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return None
+            self._pending.add(key)
+            return self.generation, key
+
+    def release(self, ticket):
+        generation, key = ticket
+        with self._lock:
+            if generation == self.generation:
+                self._pending.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self.generation += 1
+
+    def size_bytes(self, exclude=None):
+        with self._lock:
+            entries = list(self._entries.values())
+        return sum((image_bytes(image) if image.cacheKey() != exclude else 0) + image_bytes(preview) + len(payload)
+                   for image, preview, payload in entries)
+
+    def evict(self, target_bytes):
+        freed = 0
+        with self._lock:
+            while self._entries and freed < target_bytes:
+                _, (image, preview, payload) = self._entries.popitem(last=False)
+                freed += image_bytes(image) + image_bytes(preview) + len(payload)
+        return freed
+
+class LoaderSignals(QObject):
+    thumbnail_ready = Signal(int, str, object)
+    prefetched = Signal(str)
+    failed = Signal(str, str)
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, generation, path, signals):
+        super().__init__()
+        self.generation = generation
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        try:
+            image = load_image(self.path, max_side=THUMBNAIL_SIZE)
+        except Exception as e:
+            self.signals.failed.emit(self.path, str(e))
+            return
+        self.signals.thumbnail_ready.emit(self.generation, self.path, image)
+
+class PrefetchTask(QRunnable):
+    def __init__(self, path, ticket, cache, signals):
+        super().__init__()
+        self.path = path
+        self.ticket = ticket
+        self.cache = cache
+        self.signals = signals
+
+    def run(self):
+        try:
+            image = load_image(self.path)
+            preview = scale_image(image, PREVIEW_MAX_SIDE)
+            payload = encode_image_payload(image, source_path=self.path)
+        except Exception as e:
+            self.cache.release(self.ticket)
+            self.signals.failed.emit(self.path, str(e))
+            return
+        self.cache.put(self.ticket, image, preview, payload)
+        self.signals.prefetched.emit(self.path)
+
+class GalleryPanel(QWidget):
+    image_activated = Signal(str)
+
+    def __init__(self, parent=None, thread_pool=None):
+        super().__init__(parent)
+        self.paths = []
+        self.current_index = -1
+        self.generation = 0
+        self.cache = PrefetchCache()
+        self.thread_pool = thread_pool or QThreadPool.globalInstance()
+        self.signals = LoaderSignals()
+        self.signals.thumbnail_ready.connect(self.set_thumbnail)
+        self.setup_ui()
+        self.setVisible(False)
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(6)
+
+        header = QHBoxLayout()
+        self.count_label = QLabel()
+        self.count_label.setObjectName('galleryCount')
+        header.addWidget(self.count_label)
+        header.addStretch()
+
+        self.prev_btn = QPushButton('Previous')
+        self.prev_btn.setObjectName('navButton')
+        self.prev_btn.clicked.connect(self.show_previous)
+        header.addWidget(self.prev_btn)
+
+        self.next_btn = QPushButton('Next')
+        self.next_btn.setObjectName('navButton')
+        self.next_btn.clicked.connect(self.show_next)
+        header.addWidget(self.next_btn)
+
+        self.clear_btn = QPushButton('Clear')
+        self.clear_btn.setObjectName('navButton')
+        self.clear_btn.clicked.connect(self.clear)
+        header.addWidget(self.clear_btn)
+        layout.addLayout(header)
+
+        self.list_widget = QListWidget()
+        self.list_widget.setViewMode(QListView.ViewMode.IconMode)
+        self.list_widget.setFlow(QListView.Flow.LeftToRight)
+        self.list_widget.setWrapping(False)
+        self.list_widget.setMovement(QListView.Movement.Static)
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.list_widget.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.list_widget.setFixedHeight(THUMBNAIL_SIZE + 30)
+        self.list_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.list_widget.setObjectName('galleryList')
+        self.list_widget.currentRowChanged.connect(self.activate)
+        layout.addWidget(self.list_widget)
+
+    def add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Image Folder")
+        if folder:
+            self.add_paths([folder])
+
+    def add_paths(self, paths):
+        new_paths = [path for path in expand_image_paths(paths) if path not in self.paths]
+        if not new_paths:
+            return 0
+        first_new = len(self.paths)
+        for path in new_paths:
+            self.paths.append(path)
+            item = QListWidgetItem(os.path.basename(path))
+            item.setToolTip(path)
+            item.setSizeHint(QSize(THUMBNAIL_SIZE + 12, THUMBNAIL_SIZE + 24))
+            self.list_widget.addItem(item)
+            self.thread_pool.start(ThumbnailTask(self.generation, path, self.signals))
+        self.setVisible(True)
+        if self.current_index < 0:
+            self.list_widget.setCurrentRow(first_new)
+        else:
+            self.prefetch_from(self.current_index + 1)
+        self.update_controls()
+        return len(new_paths)
+
+    def set_thumbnail(self, generation, path, image):
+        if generation != self.generation or path not in self.paths:
+            return
+        item = self.list_widget.item(self.paths.index(path))
+        item.setIcon(QIcon(QPixmap.fromImage(image)))
+
+    def activate(self, index):
+        if index < 0 or index >= len(self.paths):
+            return
+        self.current_index = index
+        if self.list_widget.currentRow() != index:
+            self.list_widget.setCurrentRow(index)
+            return
+        self.update_controls()
+        self.image_activated.emit(self.paths[index])
+        self.prefetch_from(index + 1)
+
+    def prefetch_from(self, start):
+        for path in self.paths[start:start + PREFETCH_AHEAD]:
+            ticket = self.cache.claim(path)
+            if ticket is not None:
+                self.thread_pool.start(PrefetchTask(path, ticket, self.cache, self.signals), 1)
+
+    def cached(self, path):
+        return self.cache.get(path)
+
+    def show_previous(self):
+        self.activate(self.current_index - 1)
+
+    def show_next(self):
+        self.activate(self.current_index + 1)
+
+    def update_controls(self):
+        total = len(self.paths)
+        position = self.current_index + 1 if self.current_index >= 0 else 0
+        self.count_label.setText(f"{position} / {total} images")
+        self.prev_btn.setEnabled(self.current_index > 0)
+        self.next_btn.setEnabled(0 <= self.current_index < total - 1)
+
+    def shutdown(self):
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+
+    def clear(self):
+        self.generation += 1
+        self.paths = []
+        self.current_index = -1
+        self.list_widget.blockSignals(True)
+        self.list_widget.clear()
+        self.list_widget.blockSignals(False)
+        self.cache.clear()
+        self.setVisible(False)
@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import importlib.util
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QRect, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader
+
+_numpy = False
+
+WORKING_FORMATS = (QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32,
+                   QImage.Format.Format_ARGB32_Premultiplied)
+
+def numpy_available():
+    return importlib.util.find_spec('numpy') is not None
+
+def load_numpy():
+    # numpy costs ~150 ms to import, so it is only loaded once pixels are actually touched.
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def decode_image(data):
+    image = QImage.fromData(QByteArray(data))
+    if image.isNull():
+        raise ValueError("Invalid image data")
+    return to_working_format(image)
+
+def load_image(path, max_side=None):
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    if max_side:
+        size = reader.size()
+        if size.isValid() and max(size.width(), size.height()) > max_side:
+            reader.setScaledSize(size.scaled(QSize(max_side, max_side), Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+    return to_working_format(image)
+
+def to_working_format(image):
+    if image.format() in WORKING_FORMATS:
+        return image
+    if image.hasAlphaChannel():
+        return image.convertToFormat(QImage.Format.Format_ARGB32)
+    return image.convertToFormat(QImage.Format.Format_RGB32)
+
+def image_view(image):
+    np = load_numpy()
+    if np is None:
+        raise RuntimeError("numpy is required for pixel views")
+    if image.format() not in WORKING_FORMATS:
+        raise ValueError("Image must be in a 32-bit working format")
+    height, stride = image.height(), image.bytesPerLine()
+    buffer = np.frombuffer(image.constBits(), dtype=np.uint8, count=stride * height)
+    return buffer.reshape(height, stride)[:, :image.width() * 4].reshape(height, image.width(), 4)
+
+def pixel_digest(image):
+    digest = hashlib.sha256(f"{image.width()}x{image.height()}:{image.format()}".encode('utf-8'))
+    bits = memoryview(image.constBits())
+    row_bytes = image.width() * image.depth() // 8
+    stride = image.bytesPerLine()
+    if row_bytes == stride:
+        digest.update(bits[:stride * image.height()])
+    else:
+        for row in range(image.height()):
+            digest.update(bits[row * stride:row * stride + row_bytes])
+    return digest.hexdigest()
+
+def clamp_rect(rect, width, height):
+    return QRect(rect).intersected(QRect(0, 0, width, height))
+
+def crop_image(image, rect):
+    crop_rect = clamp_rect(rect, image.width(), image.height())
+    if crop_rect.isEmpty():
+        raise ValueError("Crop region lies outside the image")
+    return image.copy(crop_rect)
+
+def scale_image(image, max_side):
+    if max(image.width(), image.height()) <= max_side:
+        return image
+    return image.scaled(max_side, max_side, Qt.AspectRatioMode.KeepAspectRatio,
+                        Qt.TransformationMode.SmoothTransformation)
+
+def tile_rects(width, height, tile_size, overlap=0):
+    step = max(1, tile_size - overlap)
+    rects = []
+    for y in range(0, max(1, height - overlap), step):
+        for x in range(0, max(1, width - overlap), step):
+            rects.append(clamp_rect(QRect(x, y, tile_size, tile_size), width, height))
+    return rects
+
+def tile_views(image, tile_size, overlap=0):
+    view = image_view(image)
+    return [(rect, view[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1])
+            for rect in tile_rects(image.width(), image.height(), tile_size, overlap)]
+
+def encode_png(image):
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(buffer, "PNG"):
+        raise ValueError("Failed to encode image")
+    return bytes(buffer.data())
+
+def to_base64(data):
+    return base64.b64encode(data).decode('utf-8')
+
+def encode_image_payload(image=None, crop=None, source_path=None, max_side=None):
+    if crop is None and max_side is None and source_path:
+        with open(source_path, 'rb') as image_file:
+            return to_base64(image_file.read())
+    if image is None:
+        image = load_image(source_path, max_side if crop is None else None)
+    if crop is not None:
+        image = crop_image(image, crop)
+    if max_side is not None:
+        image = scale_image(image, max_side)
+    return to_base64(encode_png(image))
+
+def image_size(data):
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    size = QImageReader(buffer).size()
+    if size.isValid():
+        return size
+    return decode_image(data).size()
+
+def fit_crop(data, crop):
+    size = image_size(data)
+    rect = clamp_rect(QRect(*(int(value) for value in crop)), size.width(), size.height())
+    if rect.isEmpty():
+        raise ValueError("Crop region lies outside the image")
+    return rect.x(), rect.y(), rect.width(), rect.height()
+
+def prepare_image_payload(data, crop=None):
+    if crop is None:
+        return to_base64(data)
+    x, y, width, height = crop
+    cropped = crop_image(decode_image(data), QRect(int(x), int(y), int(width), int(height)))
+    return to_base64(encode_png(cropped))
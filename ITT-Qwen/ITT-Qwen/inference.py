@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+from config import SYSTEM_PROMPT
+from single_flight import SingleFlight
+
+backend_flights = SingleFlight()
+
+RESPONSE_STAT_KEYS = ('done_reason', 'total_duration', 'load_duration', 'prompt_eval_count',
+                      'prompt_eval_duration', 'eval_count', 'eval_duration')
+
+def request_key(*parts):
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def build_messages(message_history, images=None, system_prompt=SYSTEM_PROMPT):
+    ollama_messages = [{
+        'role': 'system',
+        'content': system_prompt
+    }]
+    for msg in message_history:
+        ollama_messages.append({
+            'role': 'user' if msg['is_user'] else 'assistant',
+            'content': msg['text']
+        })
+    if images and message_history and message_history[-1]['is_user']:
+        ollama_messages[-1]['images'] = list(images)
+    return ollama_messages
+
+def stream_chat(model, messages, on_chunk=None, is_cancelled=None, options=None, response_format=None):
+    import ollama
+
+    request = {'model': model, 'messages': messages, 'stream': True}
+    if options:
+        request['options'] = options
+    if response_format is not None:
+        request['format'] = response_format
+    content = []
+    stats = {}
+    for chunk in ollama.chat(**request):
+        if is_cancelled is not None and is_cancelled():
+            break
+        piece = chunk['message']['content']
+        if piece:
+            content.append(piece)
+            if on_chunk is not None:
+                on_chunk(piece)
+        if chunk.get('done'):
+            stats = {key: chunk.get(key) for key in RESPONSE_STAT_KEYS}
+    return ''.join(content), stats
+
+def prefill_chat(model, messages, options=None):
+    import ollama
+
+    options = dict(options or {})
+    options['num_predict'] = 0
+    response = ollama.chat(model=model, messages=messages, stream=False, options=options)
+    return {key: response.get(key) for key in RESPONSE_STAT_KEYS}
+
+def coalesced_stream_chat(model, messages, on_chunk=None, is_cancelled=None, options=None, key=None,
+                          response_format=None):
+    if key is None:
+        key = request_key(model, messages, options, response_format)
+    return backend_flights.run(
+        key,
+        lambda publish, all_cancelled: stream_chat(model, messages, publish, all_cancelled, options,
+                                                   response_format),
+        on_chunk=on_chunk,
+        is_cancelled=is_cancelled,
+        cancelled=lambda chunks: (''.join(chunks), {})
+    )
@@ -0,0 +1,231 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+FRAME_BUDGET_MS = 1000.0 / 60
+
+BACKEND_STAT_KEYS = (
+    'done_reason',
+    'total_duration',
+    'load_duration',
+    'prompt_eval_count',
+    'prompt_eval_duration',
+    'eval_count',
+    'eval_duration',
+)
+
+class TurnMetrics:
+    def __init__(self, model=None):
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.model = model
+        self.stages = {}
+        self.backend = {}
+        self.first_token_ms = None
+        self.prefill = None
+        self.profile = None
+        self.escalations = []
+        self.gui_stall_ms = 0.0
+        self.gui_stalls_over_budget = 0
+        self.worker_encode_ms = None
+        self.resolution = None
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name,
+                           time.perf_counter() - wall_start,
+                           time.thread_time() - cpu_start)
+
+    @contextmanager
+    def gui_stage(self, name):
+        start = time.perf_counter()
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            self.record_gui_stall((time.perf_counter() - start) * 1000.0)
+
+    def record_gui_stall(self, stall_ms):
+        with self._lock:
+            self.gui_stall_ms = max(self.gui_stall_ms, stall_ms)
+            if stall_ms > FRAME_BUDGET_MS:
+                self.gui_stalls_over_budget += 1
+
+    def add_stage(self, name, wall_s, cpu_s):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0})
+            entry['wall_ms'] += wall_s * 1000.0
+            entry['cpu_ms'] += cpu_s * 1000.0
+
+    def mark_first_token(self):
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self._origin) * 1000.0
+
+    def record_backend(self, response):
+        for key in BACKEND_STAT_KEYS:
+            try:
+                value = response.get(key)
+            except Exception:
+                value = None
+            if value is not None:
+                self.backend[key] = value
+
+    def tokens_per_second(self):
+        count = self.backend.get('eval_count')
+        duration = self.backend.get('eval_duration')
+        if not count or not duration:
+            return None
+        return count / (duration / 1e9)
+
+    def truncated(self):
+        return self.backend.get('done_reason') == 'length'
+
+    def ttft_ms(self):
+        if self.first_token_ms is not None:
+            return self.first_token_ms
+        if 'prompt_eval_duration' not in self.backend:
+            return None
+        return (self.backend.get('load_duration', 0) + self.backend['prompt_eval_duration']) / 1e6
+
+    def total_ms(self):
+        return sum(stage['wall_ms'] for stage in self.stages.values())
+
+    def summary(self):
+        parts = []
+        tps = self.tokens_per_second()
+        if tps is not None:
+            parts.append(f"{tps:.1f} tok/s")
+        ttft = self.ttft_ms()
+        if ttft is not None:
+            parts.append(f"TTFT {ttft:.0f} ms")
+        parts.append(f"total {self.total_ms():.0f} ms")
+        if self.truncated():
+            parts.append(f"truncated at {self.backend.get('eval_count')} tokens")
+        if self.prefill and self.prefill.get('hit'):
+            parts.append(f"prefill saved {self.prefill['saved_ms']:.0f} ms")
+        if self.escalations:
+            parts.append(f"escalated from {self.escalations[0]['from']}")
+        if self.gui_stall_ms > FRAME_BUDGET_MS:
+            parts.append(f"UI stall {self.gui_stall_ms:.0f} ms")
+        return " | ".join(parts)
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'model': self.model,
+            'profile': self.profile,
+            'truncated': self.truncated(),
+            'escalations': list(self.escalations),
+            'gui_stall_ms': round(self.gui_stall_ms, 3),
+            'gui_stalls_over_budget': self.gui_stalls_over_budget,
+            'worker_encode_ms': self.worker_encode_ms,
+            'resolution': self.resolution,
+            'stages': {name: {k: round(v, 3) for k, v in values.items()}
+                       for name, values in self.stages.items()},
+            'backend': dict(self.backend),
+            'tokens_per_second': self.tokens_per_second(),
+            'ttft_ms': self.ttft_ms(),
+            'first_token_ms': self.first_token_ms,
+            'total_ms': round(self.total_ms(), 3),
+            'prefill': self.prefill,
+        }
+
+class PrefillStats:
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.turns = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+
+    def record_turn(self, turn):
+        info = turn.prefill
+        if info is None:
+            return
+        self.turns += 1
+        prefill_count = info.get('prompt_eval_count')
+        turn_count = turn.backend.get('prompt_eval_count')
+        hit = info['ready'] and (prefill_count is None or turn_count is None or turn_count < prefill_count)
+        saved_ms = (info.get('prompt_eval_ms') or 0.0) if hit else 0.0
+        if hit:
+            self.hits += 1
+            self.saved_ms += saved_ms
+        info['hit'] = hit
+        info['saved_ms'] = round(saved_ms, 3)
+
+    def hit_rate(self):
+        return self.hits / self.turns if self.turns else None
+
+    def summary(self):
+        return f"prefill {self.hits}/{self.turns} hits, saved {self.saved_ms:.0f} ms"
+
+    def to_dict(self):
+        return {
+            'event': 'prefill',
+            'started': self.started,
+            'completed': self.completed,
+            'turns': self.turns,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate(),
+            'saved_ms': round(self.saved_ms, 3),
+        }
+
+class MetricsRecorder:
+    def __init__(self, log_path=None, max_turns=500):
+        self.log_path = log_path or os.environ.get('ITT_QWEN_METRICS_LOG')
+        self.max_turns = max_turns
+        self.turns = []
+
+    def add(self, turn):
+        self.turns.append(turn)
+        if len(self.turns) > self.max_turns:
+            del self.turns[:len(self.turns) - self.max_turns]
+        self.log(turn)
+
+    def log(self, record):
+        if self.log_path:
+            try:
+                self._append_jsonl(self.log_path, [record])
+            except OSError as e:
+                print(f"Error writing metrics log {self.log_path}: {e}")
+
+    def export_jsonl(self, path):
+        self._append_jsonl(path, self.turns, mode='w')
+        return len(self.turns)
+
+    def _append_jsonl(self, path, records, mode='a'):
+        with open(path, mode, encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record.to_dict()) + '\n')
+
+class StartupTimer:
+    def __init__(self, origin=None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = (time.perf_counter() - self.origin) * 1000.0
+        return self.marks[name]
+
+    def time_to_first_frame_ms(self):
+        return self.marks.get('first_frame')
+
+    def report(self):
+        return ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.marks.items())
+
+    def to_dict(self):
+        return {
+            'event': 'startup',
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'marks_ms': {name: round(ms, 3) for name, ms in self.marks.items()},
+        }
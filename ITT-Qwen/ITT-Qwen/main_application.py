@@ -1,60 +1,112 @@
+import json
 import os
-import tempfile
+import sys
 from datetime import datetime
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QMessageBox, QScrollArea,
-                             QLineEdit, QSizePolicy, QDialog, QMenuBar)
+                             QMessageBox, QScrollArea, QFileDialog,
+                             QLineEdit, QSizePolicy, QDialog, QMenuBar, QComboBox)
 from PySide6.QtCore import QSettings, QTimer
-from PySide6.QtGui import QAction
+from PySide6.QtGui import QAction, QImageReader
 
-from config import COLORS, DEFAULT_TUTORIAL_MESSAGE
+from config import DEFAULT_MODEL, DEFAULT_TUTORIAL_MESSAGE, MODEL_LADDER
 from custom_window import FramelessWindow
-from ui_widgets import SettingsDialog, ImagePreviewWidget, NotificationWidget, ChatMessage, AboutDialog
-from model_thread import ModelThread
+from ui_widgets import ImagePreviewWidget, NotificationWidget, ChatMessage
+from model_thread import ModelThread, PrefillThread
+from instrumentation import TurnMetrics, MetricsRecorder, StartupTimer, PrefillStats
+from model_router import ModelRouter, parse_model_ladder
+from similarity_index import AnswerIndex, dhash
+from message_search import MessageIndex
+from profiling import TurnProfiler
+from memory_budget import MemoryAccountant, DEFAULT_BUDGET_MB, MEGABYTE, image_bytes, pixmap_bytes
+from resolution import ResolutionController, DEFAULT_LATENCY_TARGET_MS, RESOLUTION_STEPS, scaled_size
+from image_ops import clamp_rect
+from inference import request_key
+from profiles import load_profiles, active_profile_name, profile_options, profile_system_prompt
+from structured_output import (BUILTIN_SCHEMAS, StructuredRecord, StructuredRecordLog, load_schema,
+                               parse_structured, structured_system_prompt)
+
+PREFILL_DEBOUNCE_MS = 400
+MEMORY_CHECK_MS = 2000
+LOAD_SCHEMA_ITEM = '__load_schema__'
+AUTO_RESOLUTION = 'auto'
+NATIVE_RESOLUTION = 0
 
 class ImageToTextChatApp(FramelessWindow):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
+        self.startup_timer = startup_timer or StartupTimer()
+        self.first_frame_painted = False
         self.message_history = []
         self.current_image_path = None
         self.process_thread = None
         self.settings = QSettings('ImageChat', 'Settings')
         self.chat_scroll_area = None
-        self.temp_files = []
+        self.metrics_recorder = MetricsRecorder()
+        self.current_metrics = None
+        self.streaming_message = None
+        self.streaming_text = []
+        self.prefill_thread = None
+        self.prefill_state = None
+        self.prefill_stats = PrefillStats()
+        self.prefill_timer = QTimer(self)
+        self.prefill_timer.setSingleShot(True)
+        self.prefill_timer.setInterval(PREFILL_DEBOUNCE_MS)
+        self.prefill_timer.timeout.connect(self.start_prefill)
+        self.structured_records = StructuredRecordLog()
+        self.custom_schemas = {}
+        self.current_structured = None
+        self.profiles = load_profiles(self.settings)
+        self.model_router = self.create_model_router()
+        self.resolution = ResolutionController(self.latency_target_ms())
+        self.current_request = None
+        self.answer_index = AnswerIndex()
+        self.message_index = MessageIndex()
+        self.session_id = None
+        self.message_widgets = {}
+        self.search_dialog = None
+        self.profiler = TurnProfiler()
+        self.profile_session = None
+        self.retained_requests = []
+        self.worker = None
         self.initUI()
-        self.show_tutorial_if_enabled()
+        self.memory = self.create_memory_accountant()
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(MEMORY_CHECK_MS)
+        self.memory_timer.timeout.connect(self.memory.enforce)
+        self.memory_timer.start()
+        self.update_worker()
+        self.startup_timer.mark('window_built')
     
     def create_menu_bar(self):
         menubar = QMenuBar(self)
-        menubar.setStyleSheet(f"""
-            QMenuBar {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 2px;
-            }}
-            QMenuBar::item:selected {{
-                background-color: {COLORS['accent']};
-            }}
-            QMenu {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text']};
-                border: 1px solid {COLORS['border']};
-            }}
-            QMenu::item:selected {{
-                background-color: {COLORS['accent']};
-            }}
-        """)
+        menubar.setObjectName('menuBar')
         
         file_menu = menubar.addMenu('File')
         
+        open_folder_action = QAction('Open Image Folder...', self)
+        open_folder_action.triggered.connect(lambda: self.image_preview.gallery.add_folder())
+        file_menu.addAction(open_folder_action)
+
         settings_action = QAction('Settings', self)
         settings_action.triggered.connect(self.show_settings)
         file_menu.addAction(settings_action)
         
+        search_action = QAction('Search Conversations...', self)
+        search_action.setShortcut('Ctrl+F')
+        search_action.triggered.connect(self.show_search)
+        file_menu.addAction(search_action)
+
         clear_history_action = QAction('Clear History', self)
         clear_history_action.triggered.connect(self.clear_history)
         file_menu.addAction(clear_history_action)
+
+        export_metrics_action = QAction('Export Metrics...', self)
+        export_metrics_action.triggered.connect(self.export_metrics)
+        file_menu.addAction(export_metrics_action)
+
+        export_records_action = QAction('Export Structured Records...', self)
+        export_records_action.triggered.connect(self.export_structured_records)
+        file_menu.addAction(export_records_action)
         
         file_menu.addSeparator()
         
@@ -67,6 +119,12 @@ class ImageToTextChatApp(FramelessWindow):
         show_tutorial_action = QAction('Show Tutorial', self)
         show_tutorial_action.triggered.connect(lambda: self.show_tutorial_message(force=True))
         help_menu.addAction(show_tutorial_action)
+
+        profile_action = QAction('Profile Turns', self)
+        profile_action.setCheckable(True)
+        profile_action.setChecked(self.profiler.enabled)
+        profile_action.toggled.connect(self.set_profiling)
+        help_menu.addAction(profile_action)
         
         about_action = QAction('About', self)
         about_action.triggered.connect(self.show_about)
@@ -82,152 +140,85 @@ class ImageToTextChatApp(FramelessWindow):
         self.layout.addWidget(self.menubar)
         self.layout.addWidget(self.content_container, stretch=1)
         self.layout.addWidget(self.notification)
-
-        self.content_container.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-                border: none;
-            }}
-        """)
     
         main_layout = QVBoxLayout(self.content_container)
         main_layout.setSpacing(0)
         main_layout.setContentsMargins(20, 20, 20, 20)
     
         content_widget = QWidget()
-        content_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-            }}
-        """)
         content_layout = QHBoxLayout(content_widget)
         content_layout.setSpacing(20)
         main_layout.addWidget(content_widget)
     
         chat_container = QWidget()
-        chat_container.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-            }}
-        """)
         chat_layout = QVBoxLayout(chat_container)
         chat_layout.setContentsMargins(0, 0, 0, 0)
     
         self.chat_scroll_area = QScrollArea()
         self.chat_scroll_area.setWidgetResizable(True)
-        self.chat_scroll_area.setStyleSheet(f"""
-            QScrollArea {{
-                border: none;
-                border-radius: 8px;
-                background-color: {COLORS['secondary_bg']};
-            }}
-            QScrollBar:vertical {{
-                border: none;
-                background-color: {COLORS['secondary_bg']};
-                width: 14px;
-                margin: 0px 0px 0px 0px;
-            }}
-            QScrollBar::handle:vertical {{
-                background-color: {COLORS['accent']};
-                border-radius: 7px;
-                min-height: 30px;
-            }}
-            QScrollBar::handle:vertical:hover {{
-                background-color: {COLORS['accent_hover']};
-            }}
-            QScrollBar::handle:vertical:pressed {{
-                background-color: {COLORS['border']};
-            }}
-            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-                background: none;
-            }}
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
-                height: 0px;
-                width: 0px;
-            }}
-        """)
+        self.chat_scroll_area.setObjectName('chatScrollArea')
     
         self.chat_widget = QWidget()
-        self.chat_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['secondary_bg']};
-            }}
-        """)
+        self.chat_widget.setObjectName('chatWidget')
         self.chat_layout = QVBoxLayout(self.chat_widget)
         self.chat_layout.addStretch()
         self.chat_scroll_area.setWidget(self.chat_widget)
         chat_layout.addWidget(self.chat_scroll_area)
     
         input_container = QWidget()
-        input_container.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-            }}
-        """)
         input_container.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         input_layout = QVBoxLayout(input_container)
         input_layout.setContentsMargins(0, 10, 0, 0)
     
         message_row = QHBoxLayout()
+
+        self.output_mode_combo = QComboBox()
+        self.output_mode_combo.setToolTip('Answer as free-form chat or as JSON matching a schema')
+        self.output_mode_combo.addItem('Chat', None)
+        for name in BUILTIN_SCHEMAS:
+            self.output_mode_combo.addItem(f"JSON: {name}", name)
+        self.output_mode_combo.addItem('Load Schema...', LOAD_SCHEMA_ITEM)
+        self.output_mode_combo.setObjectName('optionCombo')
+        self.output_mode_combo.activated.connect(self.handle_output_mode_changed)
+        self.last_output_mode_index = 0
+        message_row.addWidget(self.output_mode_combo)
+
+        self.profile_combo = QComboBox()
+        self.profile_combo.setToolTip('Generation profile: output length, context size and prompt style')
+        self.profile_combo.addItems(list(self.profiles))
+        self.profile_combo.setCurrentText(active_profile_name(self.settings))
+        self.profile_combo.setObjectName('optionCombo')
+        self.profile_combo.currentTextChanged.connect(self.handle_profile_changed)
+        message_row.addWidget(self.profile_combo)
+
+        self.resolution_combo = QComboBox()
+        self.resolution_combo.setToolTip('Largest image side sent with the next message. '
+                                         'Auto picks the largest size that meets the latency target')
+        self.resolution_combo.addItem('Auto', AUTO_RESOLUTION)
+        self.resolution_combo.addItem('Native', NATIVE_RESOLUTION)
+        for step in RESOLUTION_STEPS:
+            self.resolution_combo.addItem(f"{step} px", step)
+        self.resolution_combo.setObjectName('optionCombo')
+        message_row.addWidget(self.resolution_combo)
     
         self.message_input = QLineEdit()
         self.message_input.setPlaceholderText('Type your message...')
-        self.message_input.setStyleSheet(f"""
-            QLineEdit {{
-                border: 1px solid {COLORS['border']};
-                border-radius: 8px;
-                padding: 12px 15px;
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text']};
-                font-size: 14px;
-            }}
-            QLineEdit:focus {{
-                border-color: {COLORS['accent']};
-            }}
-        """)
+        self.message_input.setObjectName('messageInput')
         self.message_input.returnPressed.connect(self.send_message)
         message_row.addWidget(self.message_input)
     
         button_container = QWidget()
-        button_container.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-            }}
-        """)
         button_layout = QHBoxLayout(button_container)
         button_layout.setContentsMargins(0, 0, 0, 0)
         button_layout.setSpacing(8)
     
-        button_style = f"""
-            QPushButton {{
-                background-color: {COLORS['accent']};
-                color: {COLORS['text']};
-                border: none;
-                border-radius: 8px;
-                padding: 12px 20px;
-                font-size: 13px;
-                font-weight: bold;
-                min-width: 80px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['accent_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {COLORS['accent']};
-            }}
-            QPushButton:disabled {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text_secondary']};
-            }}
-        """
-    
         self.send_btn = QPushButton('Send')
-        self.send_btn.setStyleSheet(button_style)
+        self.send_btn.setObjectName('primaryButton')
         self.send_btn.clicked.connect(self.send_message)
         button_layout.addWidget(self.send_btn)
     
         self.cancel_btn = QPushButton('Cancel')
-        self.cancel_btn.setStyleSheet(button_style)
+        self.cancel_btn.setObjectName('primaryButton')
         self.cancel_btn.clicked.connect(self.cancel_processing)
         self.cancel_btn.hide()
         button_layout.addWidget(self.cancel_btn)
@@ -240,22 +231,218 @@ class ImageToTextChatApp(FramelessWindow):
         content_layout.addWidget(chat_container, stretch=7)
     
         self.image_preview = ImagePreviewWidget()
-        self.image_preview.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-            }}
-        """)
+        self.image_preview.profiler = self.profiler
         self.image_preview.image_selected.connect(self.handle_image_selection)
+        self.image_preview.selection_changed.connect(self.schedule_prefill)
+        self.image_preview.proposals_ready.connect(self.handle_region_proposals)
+        self.image_preview.keyframes_ready.connect(self.handle_keyframes)
+        self.image_preview.keyframes_failed.connect(lambda message: self.show_notification(message, 'error'))
         content_layout.addWidget(self.image_preview, stretch=3)
     
+        self.notification.set_metrics_visible(self.settings.value('show_metrics', False, type=bool))
         self.notification.show_message("Ready", 'info')
     
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_frame_painted:
+            self.first_frame_painted = True
+            self.startup_timer.mark('first_frame')
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        self.show_tutorial_if_enabled()
+        self.startup_timer.mark('tutorial_rendered')
+        self.metrics_recorder.log(self.startup_timer)
+        if os.environ.get('ITT_QWEN_STARTUP_TRACE'):
+            print(f"Startup: {self.startup_timer.report()}", file=sys.stderr)
+        first_frame = self.startup_timer.time_to_first_frame_ms()
+        if first_frame is not None:
+            self.notification.show_metrics(f"first frame {first_frame:.0f} ms")
+
+    def show_search(self):
+        if self.search_dialog is None:
+            from dialogs import SearchDialog
+            self.search_dialog = SearchDialog(self.message_index, self)
+            self.search_dialog.message_activated.connect(self.jump_to_message)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.activateWindow()
+
+    def jump_to_message(self, session_id, position):
+        widget = self.message_widgets.get(position) if session_id == self.session_id else None
+        if widget is None:
+            self.show_notification("That message is from an earlier session", 'info')
+            return
+        self.chat_scroll_area.ensureWidgetVisible(widget, 0, 40)
+        widget.flash()
+
+    def search_history_enabled(self):
+        return self.settings.value('search_history', True, type=bool)
+
+    def index_message(self, position, text, is_user):
+        if not self.search_history_enabled():
+            return
+        try:
+            if self.session_id is None:
+                self.session_id = self.message_index.start_session()
+            image = self.image_preview.current_image_path if is_user else None
+            self.message_index.add(self.session_id, position, is_user, text, image)
+        except Exception as e:
+            print(f"Error updating message index: {e}")
+
+    def set_profiling(self, enabled):
+        self.profiler.set_enabled(enabled)
+        if enabled:
+            self.show_notification(f"Profiling turns to {self.profiler.directory}", 'info')
+        else:
+            self.show_notification(f"Profiling off ({self.profiler.written} profiles written)", 'info')
+
+    def begin_profile(self):
+        self.profile_session = self.profiler.begin('turn')
+
+    def end_profile(self):
+        session, self.profile_session = self.profile_session, None
+        if session is None:
+            return
+        if self.current_metrics is not None:
+            session.note(f"metrics: {self.current_metrics.summary()}")
+        self.profiler.end(session)
+
     def show_settings(self):
+        from dialogs import SettingsDialog
         dialog = SettingsDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.profiles = load_profiles(self.settings)
+            self.model_router = self.create_model_router()
+            self.notification.set_metrics_visible(self.settings.value('show_metrics', False, type=bool))
+            self.memory.set_budget(self.memory_budget_bytes())
+            self.resolution.set_target(self.latency_target_ms())
+            self.update_worker()
             self.show_notification("Settings saved", 'success')
+
+    def export_metrics(self):
+        if not self.metrics_recorder.turns:
+            self.show_notification("No metrics recorded yet", 'info')
+            return
+        file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Metrics",
+            "itt_qwen_metrics.jsonl",
+            "JSON Lines (*.jsonl);;All Files (*)"
+        )
+        if file_name:
+            try:
+                count = self.metrics_recorder.export_jsonl(file_name)
+                self.show_notification(f"Exported {count} turns to {os.path.basename(file_name)}", 'success')
+            except OSError as e:
+                self.handle_error(f"Failed to export metrics: {str(e)}")
+
+    def export_structured_records(self):
+        if not self.structured_records.records:
+            self.show_notification("No structured records yet", 'info')
+            return
+        file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Structured Records",
+            "itt_qwen_records.jsonl",
+            "JSON Lines (*.jsonl);;All Files (*)"
+        )
+        if file_name:
+            try:
+                count = self.structured_records.export_jsonl(file_name)
+                self.show_notification(f"Exported {count} records to {os.path.basename(file_name)}", 'success')
+            except OSError as e:
+                self.handle_error(f"Failed to export records: {str(e)}")
+
+    def handle_output_mode_changed(self, index):
+        if self.output_mode_combo.itemData(index) != LOAD_SCHEMA_ITEM:
+            self.last_output_mode_index = index
+            return
+        file_name, _ = QFileDialog.getOpenFileName(
+            self,
+            "Load JSON Schema",
+            "",
+            "JSON Schema (*.json);;All Files (*)"
+        )
+        if not file_name:
+            self.output_mode_combo.setCurrentIndex(self.last_output_mode_index)
+            return
+        try:
+            schema = load_schema(file_name)
+        except (OSError, ValueError) as e:
+            self.output_mode_combo.setCurrentIndex(self.last_output_mode_index)
+            self.handle_error(f"Failed to load schema: {str(e)}")
+            return
+        name = schema.get('title') or os.path.splitext(os.path.basename(file_name))[0]
+        self.custom_schemas[name] = schema
+        self.output_mode_combo.insertItem(index, f"JSON: {name}", name)
+        self.output_mode_combo.setCurrentIndex(index)
+        self.last_output_mode_index = index
+
+    def create_model_router(self):
+        ladder = parse_model_ladder(self.settings.value('model_ladder', ', '.join(MODEL_LADDER)))
+        return ModelRouter(ladder or MODEL_LADDER)
+
+    def routing_enabled(self):
+        return self.settings.value('model_routing', False, type=bool)
+
+    def handle_profile_changed(self, name):
+        self.settings.setValue('active_profile', name)
+        self.schedule_prefill()
+
+    def current_profile(self):
+        name = self.profile_combo.currentText()
+        return name, self.profiles[name]
+
+    def current_output_schema(self):
+        name = self.output_mode_combo.currentData()
+        if name is None or name == LOAD_SCHEMA_ITEM:
+            return None
+        schema = self.custom_schemas.get(name) or BUILTIN_SCHEMAS.get(name)
+        return name, schema
+
+    def add_structured_result(self, response):
+        structured = self.current_structured
+        data, errors = parse_structured(response, structured['schema'])
+        output_tokens = None
+        if self.current_metrics is not None:
+            output_tokens = self.current_metrics.backend.get('eval_count')
+        self.structured_records.add(StructuredRecord(
+            structured['name'],
+            data,
+            errors,
+            image=structured['image'],
+            question=structured['question'],
+            model=self.process_thread.model,
+            output_tokens=output_tokens
+        ))
+        display = json.dumps(data, indent=2, ensure_ascii=False) if data is not None else response
+        if errors:
+            error_lines = "\n".join(f"- {error}" for error in errors)
+            display += f"\n\nDoes not match schema '{structured['name']}':\n{error_lines}"
+        else:
+            display += f"\n\nValid '{structured['name']}' record"
+        timestamp = datetime.now().strftime('%I:%M %p')
+        message_widget = ChatMessage(display, False, timestamp, plain_text=True)
+        self.chat_layout.insertWidget(self.chat_layout.count() - 1, message_widget)
+        self.record_message(response, False, timestamp, message_widget)
+        QTimer.singleShot(50, self.scroll_to_bottom)
+        return message_widget
+
+    def finish_turn_metrics(self):
+        if self.current_metrics is None:
+            return
+        self.prefill_stats.record_turn(self.current_metrics)
+        self.record_resolution_latency(self.current_metrics)
+        self.metrics_recorder.add(self.current_metrics)
+        summary = self.current_metrics.summary()
+        if self.current_metrics.prefill is not None:
+            summary += f" | {self.prefill_stats.summary()}"
+        self.notification.show_metrics(summary)
+        self.current_metrics = None
     
     def show_about(self):
+        from dialogs import AboutDialog
         dialog = AboutDialog(self)
         dialog.exec()
     
@@ -266,7 +453,8 @@ class ImageToTextChatApp(FramelessWindow):
     def show_tutorial_message(self, force=False):
         if force or self.settings.value('show_tutorial', True, type=bool):
             tutorial_text = self.settings.value('tutorial_message', DEFAULT_TUTORIAL_MESSAGE)
-            self.add_message(tutorial_text, False, "")
+            # Shown only: the tutorial is not part of the conversation, the search index or the model's context.
+            self.add_message(tutorial_text, False, "", record=False)
     
     def handle_image_selection(self, file_path):
         self.current_image_path = file_path if file_path else None
@@ -274,37 +462,333 @@ class ImageToTextChatApp(FramelessWindow):
             self.show_notification(f"Selected image: {os.path.basename(file_path)}", 'success')
         else:
             self.show_notification("Image cleared", 'info')
+        self.schedule_prefill()
+        self.memory.enforce()
+
+    def update_worker(self):
+        if self.settings.value('worker_process', False, type=bool):
+            if self.worker is None:
+                from worker_process import InferenceWorker
+                self.worker = InferenceWorker().start()
+        elif self.worker is not None:
+            self.cancel_processing()
+            self.worker.stop()
+            self.worker = None
+
+    def adaptive_resolution_enabled(self):
+        return self.settings.value('adaptive_resolution', False, type=bool)
+
+    def latency_target_ms(self):
+        return self.settings.value('latency_target_ms', DEFAULT_LATENCY_TARGET_MS, type=int)
+
+    def choose_resolution(self, question=''):
+        image_path, crop_rect = self.image_preview.get_image_for_model()
+        if not image_path:
+            return None
+        source = self.image_preview.image_preview.source_image
+        size = source.size() if source is not None else QImageReader(image_path).size()
+        if crop_rect is not None:
+            size = clamp_rect(crop_rect, size.width(), size.height()).size()
+        if size.isEmpty():
+            return None
+        frames = self.image_preview.frames_for_model()
+        count = len(frames) if frames else 1
+        choice = self.resolution_combo.currentData()
+        if choice == AUTO_RESOLUTION:
+            mode = 'auto'
+            max_side = None
+            if self.adaptive_resolution_enabled():
+                model = self.model_router.first_model(question) if self.routing_enabled() else DEFAULT_MODEL
+                max_side = self.resolution.choose(model, size, count)
+        else:
+            mode = 'manual'
+            max_side = choice or None
+        sent = scaled_size(size, max_side)
+        if sent == size:
+            max_side = None
+        return {'mode': mode, 'max_side': max_side, 'width': sent.width(), 'height': sent.height(),
+                'source_width': size.width(), 'source_height': size.height(),
+                'pixels': sent.width() * sent.height() * count}
+
+    def record_resolution_latency(self, metrics):
+        duration = metrics.backend.get('prompt_eval_duration')
+        if metrics.resolution is None or not duration:
+            return
+        if metrics.prefill is not None and metrics.prefill.get('hit'):
+            return
+        self.resolution.record(metrics.model, metrics.resolution['pixels'], duration / 1e6)
+
+    def resolution_caption(self, resolution):
+        caption = f"{resolution['width']}×{resolution['height']} px"
+        if resolution['max_side'] is not None:
+            origin = 'auto' if resolution['mode'] == 'auto' else 'scaled'
+            caption += f", {origin} from {resolution['source_width']}×{resolution['source_height']}"
+        return caption
+
+    def memory_budget_bytes(self):
+        return self.settings.value('memory_budget_mb', DEFAULT_BUDGET_MB, type=int) * MEGABYTE
+
+    def create_memory_accountant(self):
+        memory = MemoryAccountant(self.memory_budget_bytes(), self)
+        memory.register('payloads', self.payload_bytes, self.evict_payloads, rebuild_cost=0)
+        memory.register('prefetched images', self.prefetch_bytes, self.image_preview.gallery.cache.evict,
+                        rebuild_cost=1)
+        memory.register('earlier images', self.retained_image_bytes, self.evict_retained_images, rebuild_cost=2)
+        memory.register('messages', self.document_bytes, self.evict_documents, rebuild_cost=3)
+        memory.register('current image', self.current_image_bytes)
+        memory.usage_changed.connect(self.show_memory_usage)
+        return memory
+
+    def show_memory_usage(self, total, budget):
+        self.notification.show_memory(self.memory.summary(), self.memory.breakdown())
+
+    def current_image_key(self):
+        image = self.image_preview.image_preview.source_image
+        return image.cacheKey() if image is not None else None
+
+    def shown_image_keys(self):
+        keys = {image.cacheKey() for _, image in self.image_preview.keyframes}
+        keys.add(self.current_image_key())
+        return keys
+
+    def current_image_bytes(self):
+        return (image_bytes(self.image_preview.image_preview.source_image) +
+                pixmap_bytes(self.image_preview.image_preview.pixmap()) + self.image_preview.keyframe_bytes())
+
+    def prefetch_bytes(self):
+        return self.image_preview.gallery.cache.size_bytes(exclude=self.current_image_key())
+
+    def retain_request(self, request):
+        if not any(held is request for held in self.retained_requests):
+            self.retained_requests.append(request)
+
+    def held_requests(self):
+        requests = {id(request): request for request in self.retained_requests}
+        if self.current_request is not None:
+            requests[id(self.current_request)] = self.current_request
+        return list(requests.values())
+
+    def held_payloads(self):
+        payloads = [self.image_preview.current_payload]
+        if self.prefill_state is not None:
+            payloads.append(self.prefill_state.get('payload'))
+        if self.process_thread is not None:
+            payloads.append(self.process_thread.payload)
+        payloads += [request['payload'] for request in self.held_requests()]
+        return {id(payload): len(payload) for payload in payloads if payload}
+
+    def payload_bytes(self):
+        return sum(self.held_payloads().values())
+
+    def evict_payloads(self, target_bytes):
+        held = self.payload_bytes()
+        self.image_preview.current_payload = None
+        if self.prefill_state is not None:
+            self.prefill_state.pop('payload', None)
+        if self.process_thread is not None and not self.process_thread.isRunning():
+            self.process_thread.payload = None
+        for request in self.held_requests():
+            request['payload'] = None
+        return held - self.payload_bytes()
+
+    def retained_images(self):
+        images = [request['image'] for request in self.held_requests()]
+        for request in self.held_requests():
+            images += [image for _, image in request['frames'] or []]
+        if self.process_thread is not None:
+            images.append(self.process_thread.image)
+        shown = self.shown_image_keys()
+        return {image.cacheKey(): image for image in images if image is not None and image.cacheKey() not in shown}
+
+    def retained_image_bytes(self):
+        return sum(image_bytes(image) for image in self.retained_images().values())
+
+    def evict_retained_images(self, target_bytes):
+        # Oldest first; retries reload the file from image_path, and missing frames by index.
+        shown = self.shown_image_keys()
+        freed_keys = set()
+        freed = 0
+
+        def release(image):
+            nonlocal freed
+            if image is None or image.cacheKey() in shown:
+                return image
+            if image.cacheKey() not in freed_keys:
+                freed_keys.add(image.cacheKey())
+                freed += image_bytes(image)
+            return None
+
+        for request in self.held_requests():
+            if freed >= target_bytes:
+                break
+            if request['frames']:
+                request['frames'] = [(index, release(image)) for index, image in request['frames']]
+            request['image'] = release(request['image'])
+        thread = self.process_thread
+        if thread is not None and not thread.isRunning() and thread.image is not None:
+            if thread.image.cacheKey() in freed_keys:
+                thread.image = None
+        return freed
+
+    def document_bytes(self):
+        return sum(widget.document_bytes() for widget in self.message_widgets.values())
+
+    def evict_documents(self, target_bytes):
+        # Only bubbles scrolled out of view; they re-render from their text when painted again.
+        freed = 0
+        for position in sorted(self.message_widgets):
+            if freed >= target_bytes:
+                break
+            widget = self.message_widgets[position]
+            if widget.visibleRegion().isEmpty():
+                freed += widget.evict_document()
+        return freed
+
+    def prefill_enabled(self):
+        return self.settings.value('speculative_prefill', False, type=bool)
+
+    def current_prefill_key(self):
+        image_path, crop_rect = self.image_preview.get_image_for_model()
+        if not image_path or self.image_preview.frame_total > 1:
+            return None
+        crop = None
+        if crop_rect is not None:
+            crop = (crop_rect.x(), crop_rect.y(), crop_rect.width(), crop_rect.height())
+        resolution = self.choose_resolution()
+        max_side = resolution['max_side'] if resolution is not None else None
+        return (image_path, crop, len(self.message_history), self.current_profile(), max_side)
+
+    def schedule_prefill(self):
+        if self.prefill_enabled() and self.current_output_schema() is None:
+            self.prefill_timer.start()
+
+    def start_prefill(self):
+        key = self.current_prefill_key()
+        if key is None:
+            self.prefill_state = None
+            return
+        if self.prefill_state is not None and self.prefill_state['key'] == key:
+            return
+        busy = self.process_thread and self.process_thread.isRunning()
+        if busy or (self.prefill_thread and self.prefill_thread.isRunning()):
+            self.prefill_timer.start()
+            return
+        image_path, crop_rect = self.image_preview.get_image_for_model()
+        _, profile = self.current_profile()
+        # The question is not known yet, so a routed turn warms the first model of the ladder.
+        model = self.model_router.models[0] if self.routing_enabled() else None
+        self.prefill_state = {'key': key, 'ready': False, 'model': model}
+        self.prefill_thread = PrefillThread(
+            key,
+            list(self.message_history),
+            image_path,
+            image=self.image_preview.image_preview.source_image,
+            crop=crop_rect,
+            payload=self.image_preview.current_payload if crop_rect is None and key[-1] is None else None,
+            system_prompt=profile_system_prompt(profile),
+            options=profile_options(profile),
+            model=model,
+            max_side=key[-1]
+        )
+        self.prefill_thread.finished.connect(self.handle_prefill)
+        self.prefill_thread.error.connect(self.handle_prefill_error)
+        self.prefill_stats.started += 1
+        self.prefill_thread.start()
+
+    def handle_prefill(self, result):
+        self.prefill_stats.completed += 1
+        if self.prefill_state is None or self.prefill_state['key'] != result['key']:
+            return
+        stats = result['stats']
+        duration = stats.get('prompt_eval_duration')
+        self.prefill_state.update(
+            ready=True,
+            payload=result['payload'],
+            prompt_eval_count=stats.get('prompt_eval_count'),
+            prompt_eval_ms=duration / 1e6 if duration else None
+        )
+
+    def handle_prefill_error(self, error_message):
+        self.prefill_state = None
+        print(error_message)
+
+    def take_prefill(self, key):
+        state, self.prefill_state = self.prefill_state, None
+        if state is None or state['key'] != key:
+            return {'ready': False}
+        return state
     
+    def handle_keyframes(self, keyframes, total):
+        self.show_notification(f"{keyframes} distinct frames out of {total} - they are sent together", 'info')
+
+    def handle_region_proposals(self, count):
+        if count:
+            self.show_notification(f"Suggested {count} areas - click one to select it", 'info')
+        else:
+            self.show_notification("No distinct areas found", 'info')
+
     def show_notification(self, message, message_type='info'):
         self.notification.show_message(message, message_type)
     
-    def add_message(self, text, is_user=True, timestamp=None):
+    def add_message(self, text, is_user=True, timestamp=None, html_content=None, record=True):
         if timestamp is None:
             timestamp = datetime.now().strftime('%I:%M %p')
 
-        message_widget = ChatMessage(text, is_user, timestamp)
+        message_widget = ChatMessage(text, is_user, timestamp, html_content=html_content)
         self.chat_layout.insertWidget(self.chat_layout.count() - 1, message_widget)
+        if record:
+            self.record_message(text, is_user, timestamp, message_widget)
+    
+        QTimer.singleShot(50, self.scroll_to_bottom)
+        return message_widget
+
+    def record_message(self, text, is_user, timestamp, widget=None):
+        position = len(self.message_history)
+        if widget is not None:
+            self.message_widgets[position] = widget
+        self.index_message(position, text, is_user)
         self.message_history.append({
             'text': text,
             'is_user': is_user,
             'timestamp': timestamp
         })
     
-        QTimer.singleShot(50, self.scroll_to_bottom)
-    
     def scroll_to_bottom(self):
         if self.chat_scroll_area:
             vsb = self.chat_scroll_area.verticalScrollBar()
             vsb.setValue(vsb.maximum())
-    
-    def cleanup_temp_files(self):
-        for temp_file in self.temp_files:
-            try:
-                os.remove(temp_file)
-            except OSError as e:
-                print(f"Error removing temp file {temp_file}: {e}")
-        self.temp_files.clear()
 
+    def is_scrolled_to_bottom(self):
+        vsb = self.chat_scroll_area.verticalScrollBar()
+        return vsb.value() >= vsb.maximum() - 20
+
+    def begin_streaming_message(self):
+        timestamp = datetime.now().strftime('%I:%M %p')
+        self.streaming_message = ChatMessage("", False, timestamp)
+        self.streaming_text = []
+        self.chat_layout.insertWidget(self.chat_layout.count() - 1, self.streaming_message)
+
+    def finish_streaming_message(self, final_html, complete=False, record=True):
+        message = self.streaming_message
+        text = ''.join(self.streaming_text)
+        self.streaming_message = None
+        self.streaming_text = []
+        if complete and final_html is not None:
+            message.replace_rendered(final_html)
+        else:
+            message.finish_rendered(final_html or '')
+        message.source_text = text
+        if record:
+            self.record_message(text, False, message.timestamp, message)
+        return message
+
+    def discard_streaming_message(self):
+        if self.streaming_message is not None:
+            self.chat_layout.removeWidget(self.streaming_message)
+            self.streaming_message.deleteLater()
+            self.streaming_message = None
+            self.streaming_text = []
+    
     def clear_history(self):
         reply = QMessageBox.question(
             self,
@@ -315,32 +799,49 @@ class ImageToTextChatApp(FramelessWindow):
         )
     
         if reply == QMessageBox.StandardButton.Yes:
-            while self.chat_layout.count() > 1:
-                item = self.chat_layout.takeAt(0)
-                if item.widget():
-                    item.widget().deleteLater()
-        
-            self.message_history.clear()
+            self.clear_transcript()
         
             if self.current_image_path:
                 self.image_preview.clear_image()
             
-            self.cleanup_temp_files()
             self.show_notification("Chat history cleared", 'info')
     
+    def clear_transcript(self):
+        while self.chat_layout.count() > 1:
+            item = self.chat_layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        self.message_history.clear()
+        self.message_widgets.clear()
+        self.retained_requests.clear()
+        self.session_id = None
+
     def cancel_processing(self):
         if self.process_thread and self.process_thread.isRunning():
             self.process_thread.cancel()
             self.process_thread.wait()
+            if self.streaming_message is not None:
+                # The partial answer stays on screen but out of the history, the search index and answer reuse.
+                message = self.finish_streaming_message(self.process_thread.flush_stream(), record=False)
+                message.set_caption("cancelled")
+            self.end_profile()
             self.show_notification("Processing cancelled", 'info')
+            self.current_metrics = None
             self.reset_ui_after_processing()
     
     def reset_ui_after_processing(self):
+        self.notification.set_progress(None)
         self.message_input.setEnabled(True)
         self.send_btn.setEnabled(True)
         self.send_btn.show()
         self.cancel_btn.hide()
     
+    def set_processing_ui(self, message):
+        self.show_notification(message, 'info')
+        self.message_input.setEnabled(False)
+        self.send_btn.hide()
+        self.cancel_btn.show()
+
     def send_message(self):
         message = self.message_input.text().strip()
         if not message:
@@ -351,35 +852,247 @@ class ImageToTextChatApp(FramelessWindow):
             return
         
         try:
+            self.begin_profile()
+            resolution = self.choose_resolution(message)
+            max_side = resolution['max_side'] if resolution is not None else None
+            prefill = None
+            if self.prefill_enabled():
+                self.prefill_timer.stop()
+                key = self.current_prefill_key()
+                if key is not None and key[-1] == max_side:
+                    prefill = self.take_prefill(key)
+                routed = self.model_router.first_model(message) if self.routing_enabled() else None
+                if prefill is not None and 'model' in prefill and prefill['model'] != routed:
+                    # Routed past the warmed model: the prefill neither helps nor counts as a miss.
+                    prefill = None
+
             self.add_message(message, True)
             self.message_input.clear()
+            self.set_processing_ui("Processing your request...")
+
+            metrics = TurnMetrics(DEFAULT_MODEL)
+            with metrics.stage('image_prep'):
+                image_path_for_model, crop_rect = self.image_preview.get_image_for_model()
+                frames = self.image_preview.frames_for_model()
+            request = {
+                'question': message,
+                'history_end': len(self.message_history),
+                'image_path': image_path_for_model,
+                'image': self.image_preview.image_preview.source_image,
+                'crop': crop_rect,
+                'payload': self.image_preview.current_payload if crop_rect is None and max_side is None else None,
+                'profile': self.current_profile(),
+                'output_schema': self.current_output_schema(),
+                'image_hash': None,
+                'frames': frames,
+                'frame_total': self.image_preview.frame_total,
+                'resolution': resolution,
+            }
+            self.resolution_combo.setCurrentIndex(0)
+            single_frame = frames is None or len(frames) == 1
+            if (self.answer_reuse_enabled() and single_frame and request['output_schema'] is None and
+                    request['image'] is not None):
+                request['image_hash'] = dhash(request['image'], crop_rect)
+                request['answer_context'] = self.answer_context(request)
+                match = self.answer_index.lookup(request['image_hash'], message, request['answer_context'])
+                if match is not None:
+                    self.show_reused_answer(request, match)
+                    return
+            self.start_request(request, metrics=metrics, prefill=prefill)
             
-            self.show_notification("Processing your request...", 'info')
-            self.message_input.setEnabled(False)
-            self.send_btn.hide()
-            self.cancel_btn.show()
-
-            image_path_for_model, is_temp = self.image_preview.get_image_for_model()
-            if is_temp:
-                self.temp_files.append(image_path_for_model)
-            
-            self.process_thread = ModelThread(self.message_history, image_path_for_model)
-            self.process_thread.finished.connect(self.handle_response)
-            self.process_thread.error.connect(self.handle_error)
-            self.process_thread.start()
-            
         except Exception as e:
             self.handle_error(f"Failed to send message: {str(e)}")
+
+    def start_request(self, request, model=None, metrics=None, prefill=None):
+        profile_name, profile = request['profile']
+        self.current_metrics = metrics if metrics is not None else TurnMetrics(model or DEFAULT_MODEL)
+        self.current_metrics.profile = profile_name
+        self.current_metrics.resolution = request['resolution']
+        payload = request['payload']
+        if prefill is not None:
+            payload = prefill.pop('payload', None) or payload
+            prefill.pop('key', None)
+            self.current_metrics.prefill = prefill
+
+        history = self.message_history[:request['history_end']]
+        thread_options = {'system_prompt': profile_system_prompt(profile), 'options': profile_options(profile)}
+        self.current_structured = None
+        if request['output_schema'] is not None:
+            name, schema = request['output_schema']
+            history = history[-1:]
+            thread_options.update(response_format=schema, system_prompt=structured_system_prompt(schema))
+            self.current_structured = {'name': name, 'schema': schema, 'question': request['question'],
+                                       'image': request['image_path']}
+        elif model is None and self.routing_enabled():
+            thread_options['router'] = self.model_router
+
+        self.current_request = request
+        self.process_thread = ModelThread(
+            history,
+            request['image_path'],
+            self.current_metrics,
+            image=request['image'],
+            crop=request['crop'],
+            payload=payload,
+            model=model,
+            profile_session=self.profile_session,
+            frames=request['frames'],
+            frame_total=request['frame_total'],
+            worker=self.worker,
+            max_side=request['resolution']['max_side'] if request['resolution'] is not None else None,
+            **thread_options
+        )
+        self.process_thread.finished.connect(self.handle_response)
+        self.process_thread.partial.connect(self.handle_partial_response)
+        self.process_thread.escalated.connect(self.handle_escalation)
+        self.process_thread.progress.connect(self.handle_progress)
+        self.process_thread.error.connect(self.handle_error)
+        self.process_thread.start()
+
+    def answer_reuse_enabled(self):
+        return self.settings.value('reuse_similar_answers', False, type=bool)
+
+    def answer_context(self, request):
+        # A stored answer only fits the same profile and the same conversation leading up to the question.
+        profile_name, profile = request['profile']
+        history = [(entry['is_user'], entry['text']) for entry in self.message_history[:request['history_end'] - 1]]
+        return request_key(profile_name, profile_system_prompt(profile), profile_options(profile), history)
+
+    def show_reused_answer(self, request, match):
+        message_widget = self.add_message(match['answer'], False)
+        message_widget.set_caption(f"answered before for a near-identical image ({match['distance']} bits apart)")
+        entry = self.message_history[-1]
+        self.retain_request(request)
+        message_widget.add_action("Ask the model anyway",
+                                  lambda: self.ask_model_anyway(request, message_widget, entry))
+        self.end_profile()
+        self.reset_ui_after_processing()
+        self.show_notification("Reused an answer from a near-identical image", 'success')
+
+    def ask_model_anyway(self, request, message_widget, entry):
+        if self.process_thread and self.process_thread.isRunning():
+            self.show_notification("Please wait for the current processing to complete", 'error')
+            return
+        if self.message_history and self.message_history[-1] is entry:
+            self.message_history.pop()
+            self.message_widgets.pop(len(self.message_history), None)
+            self.chat_layout.removeWidget(message_widget)
+            message_widget.deleteLater()
+        try:
+            self.set_processing_ui("Processing your request...")
+            self.begin_profile()
+            self.start_request(request)
+        except Exception as e:
+            self.handle_error(f"Failed to send message: {str(e)}")
+
+    def remember_answer(self, request, response, model):
+        if request is None or request.get('image_hash') is None or not self.answer_reuse_enabled():
+            return
+        try:
+            self.answer_index.add(request['image_hash'], request['question'], response,
+                                  request['image_path'], model, request['answer_context'])
+        except Exception as e:
+            print(f"Error updating answer index: {e}")
+
+    def handle_escalation(self, model, reason):
+        self.discard_streaming_message()
+        self.show_notification(f"Asking {model} because {reason}...", 'info')
+
+    def retry_with_model(self, request, model):
+        if self.process_thread and self.process_thread.isRunning():
+            self.show_notification("Please wait for the current processing to complete", 'error')
+            return
+        try:
+            self.set_processing_ui(f"Retrying with {model}...")
+            self.begin_profile()
+            self.start_request(request, model=model)
+        except Exception as e:
+            self.handle_error(f"Failed to retry: {str(e)}")
+
+    def decorate_response(self, message_widget, request, model):
+        captions = []
+        if self.routing_enabled() or model != DEFAULT_MODEL:
+            captions.append(model)
+        frames = request['frames'] if request is not None else None
+        if frames and len(frames) > 1:
+            captions.append(f"{len(frames)} of {request['frame_total']} frames")
+            message_widget.link_frames([index for index, _ in frames])
+            message_widget.frame_requested.connect(
+                lambda index: self.image_preview.seek_frame(request['image_path'], index))
+        if request is not None and request['resolution'] is not None:
+            captions.append(self.resolution_caption(request['resolution']))
+        if captions:
+            message_widget.set_caption(' · '.join(captions))
+        larger = self.model_router.next_model(model)
+        if larger is not None and request is not None:
+            self.retain_request(request)
+            message_widget.add_action(f"Retry with {larger}",
+                                      lambda: self.retry_with_model(request, larger))
     
+    def handle_progress(self, value):
+        if self.process_thread is None or self.process_thread.is_cancelled():
+            return
+        self.notification.set_progress(value)
+
+    def handle_partial_response(self, delta, finished, tail):
+        if self.process_thread is None or self.process_thread.is_cancelled():
+            return
+        if self.current_structured is not None:
+            return
+        try:
+            follow = self.is_scrolled_to_bottom()
+            if self.streaming_message is None:
+                self.begin_streaming_message()
+            self.streaming_text.append(delta)
+            self.show_notification(f"Receiving response... {len(self.streaming_text)} tokens", 'info')
+            if self.current_metrics is not None:
+                with self.current_metrics.gui_stage('stream_render'):
+                    self.streaming_message.append_rendered(finished, tail)
+            else:
+                self.streaming_message.append_rendered(finished, tail)
+            if follow:
+                QTimer.singleShot(0, self.scroll_to_bottom)
+        except Exception as e:
+            self.handle_error(f"Failed to render response: {str(e)}")
+
     def handle_response(self, response):
         try:
-            self.add_message(response, False)
+            response_html = self.process_thread.response_html
+            if self.current_structured is not None:
+                add_response = lambda: self.add_structured_result(response)
+            elif self.streaming_message is not None:
+                add_response = lambda: self.finish_streaming_message(response_html, complete=True)
+            else:
+                add_response = lambda: self.add_message(response, False, html_content=response_html)
+            if self.current_metrics is not None:
+                with self.current_metrics.gui_stage('render'):
+                    message_widget = add_response()
+            else:
+                message_widget = add_response()
+            self.decorate_response(message_widget, self.current_request, self.process_thread.model)
+            if self.current_structured is None:
+                self.remember_answer(self.current_request, response, self.process_thread.model)
+            self.current_structured = None
+            truncated_profile = None
+            if self.current_metrics is not None and self.current_metrics.truncated():
+                truncated_profile = self.current_metrics.profile
             self.reset_ui_after_processing()
-            self.show_notification("Response received", 'success')
+            self.end_profile()
+            self.finish_turn_metrics()
+            if truncated_profile is not None:
+                self.show_notification(f"Response truncated by the '{truncated_profile}' output limit", 'info')
+            else:
+                self.show_notification("Response received", 'success')
+            self.schedule_prefill()
+            self.memory.enforce()
         except Exception as e:
             self.handle_error(f"Failed to handle response: {str(e)}")
     
     def handle_error(self, error_message):
+        self.end_profile()
+        self.current_metrics = None
+        self.current_structured = None
+        self.discard_streaming_message()
         self.reset_ui_after_processing()
         self.show_notification(f"Error: {error_message}", 'error')
         QMessageBox.critical(self, "Error", error_message)
@@ -388,5 +1101,13 @@ class ImageToTextChatApp(FramelessWindow):
         if self.process_thread and self.process_thread.isRunning():
             self.process_thread.cancel()
             self.process_thread.wait()
-        self.cleanup_temp_files()
+        if self.prefill_thread and self.prefill_thread.isRunning():
+            self.prefill_thread.wait()
+        if self.prefill_stats.started:
+            self.metrics_recorder.log(self.prefill_stats)
+        self.answer_index.close()
+        self.message_index.close()
+        if self.worker is not None:
+            self.worker.stop()
+        self.image_preview.gallery.shutdown()
         event.accept()
\ No newline at end of file
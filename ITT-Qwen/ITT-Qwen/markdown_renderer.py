@@ -0,0 +1,262 @@
+import html
+import re
+import textwrap
+import threading
+from functools import lru_cache
+
+from config import COLORS, CODE_HIGHLIGHT_COLORS
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite', 'extra']
+MARKDOWN_EXTENSION_CONFIGS = {'codehilite': {'css_class': 'highlight', 'guess_lang': False}}
+
+# Lexer guessing runs every Pygments lexer's analyse_text; only show it a bounded sample.
+GUESS_LEXER_SAMPLE_CHARS = 2000
+# Past this size a block is shown as plain preformatted text instead of being lexed.
+MAX_HIGHLIGHT_CHARS = 60000
+# Past this size an unfinished tail is only rendered again once it has grown by a quarter, so one long
+# paragraph or list costs linear rather than quadratic time to stream.
+TAIL_RENDER_CHARS = 4000
+TAIL_RENDER_GROWTH = 1.25
+
+DOCUMENT_CSS = f"""
+    body {{
+        color: {COLORS['text']};
+        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
+        font-size: 14px;
+        line-height: 1.6;
+    }}
+    p {{
+        margin-bottom: 10px;
+    }}
+    h1, h2, h3, h4, h5, h6 {{
+        color: {COLORS['text']};
+        margin: 10px 0;
+    }}
+    h3 {{
+        font-size: 16px;
+    }}
+    strong, b {{
+        font-weight: bold;
+    }}
+    em, i {{
+        font-style: italic;
+    }}
+    ul, ol {{
+        margin: 10px 0;
+        padding-left: 20px;
+    }}
+    li {{
+        margin: 3px 0;
+    }}
+    a {{
+        color: #81A2BE;
+        text-decoration: none;
+    }}
+    a:hover {{
+        text-decoration: underline;
+    }}
+    pre {{
+        background-color: {COLORS['background']};
+        padding: 10px;
+        border-radius: 5px;
+        border: 1px solid {COLORS['border']};
+        font-family: Consolas, "Courier New", monospace;
+        margin: 10px 0;
+    }}
+    code {{
+        font-family: Consolas, "Courier New", monospace;
+    }}
+    blockquote {{
+        border-left: 3px solid {COLORS['accent']};
+        margin: 10px 0;
+        padding-left: 10px;
+        color: {COLORS['text_secondary']};
+    }}
+"""
+
+LIST_ITEM_RE = re.compile(r'^\s{0,3}(?:[*+-]|\d+[.)])\s')
+FENCE_RE = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+
+_markdown = None
+_local = threading.local()
+
+def _load_markdown():
+    # markdown pulls in Pygments through codehilite; keep both off the startup path.
+    global _markdown
+    if _markdown is None:
+        import markdown
+        _markdown = markdown
+    return _markdown
+
+def _converter():
+    md = getattr(_local, 'converter', None)
+    if md is None:
+        markdown = _load_markdown()
+        md = markdown.Markdown(
+            extensions=MARKDOWN_EXTENSIONS + [_cached_code_extension()],
+            extension_configs=MARKDOWN_EXTENSION_CONFIGS
+        )
+        _local.converter = md
+    return md
+
+def render_markdown(text):
+    cleaned_text = textwrap.dedent(text).strip()
+    md = _converter()
+    try:
+        return md.convert(cleaned_text)
+    finally:
+        md.reset()
+
+@lru_cache(maxsize=1)
+def document_stylesheet():
+    try:
+        from pygments.formatters import HtmlFormatter
+    except ImportError:
+        return DOCUMENT_CSS
+    pygments_css = HtmlFormatter(style=_highlight_style()).get_style_defs('.highlight')
+    return pygments_css + DOCUMENT_CSS
+
+@lru_cache(maxsize=1)
+def _highlight_style():
+    from pygments.style import Style
+    from pygments.token import string_to_tokentype
+
+    styles = {string_to_tokentype(name): value for name, value in CODE_HIGHLIGHT_COLORS.items()}
+    return type('ITTQwenStyle', (Style,), {
+        'background_color': COLORS['background'],
+        'highlight_color': COLORS['accent'],
+        'styles': styles,
+    })
+
+@lru_cache(maxsize=1)
+def _formatter():
+    from pygments.formatters import HtmlFormatter
+    return HtmlFormatter(cssclass='highlight', nobackground=True)
+
+def _lexer_for(code, lang):
+    from pygments.lexers import get_lexer_by_name, guess_lexer
+    from pygments.lexers.special import TextLexer
+    from pygments.util import ClassNotFound
+
+    if lang:
+        try:
+            return get_lexer_by_name(lang)
+        except ClassNotFound:
+            return TextLexer()
+    try:
+        return guess_lexer(code[:GUESS_LEXER_SAMPLE_CHARS])
+    except ClassNotFound:
+        return TextLexer()
+
+@lru_cache(maxsize=512)
+def highlight_code(code, lang=None):
+    if len(code) > MAX_HIGHLIGHT_CHARS:
+        return f'<div class="highlight"><pre>{html.escape(code)}</pre></div>'
+    from pygments import highlight
+    return highlight(code, _lexer_for(code, lang), _formatter())
+
+def _cached_code_extension():
+    from markdown.extensions import Extension
+    from markdown.extensions.fenced_code import FencedBlockPreprocessor
+    from markdown.preprocessors import Preprocessor
+
+    class CachedFencedCodePreprocessor(Preprocessor):
+        def run(self, lines):
+            text = "\n".join(lines)
+            index = 0
+            while True:
+                m = FencedBlockPreprocessor.FENCED_BLOCK_RE.search(text, index)
+                if not m:
+                    break
+                if m.group('attrs'):
+                    # Leave attribute-list fences to the stock fenced_code extension.
+                    index = m.end()
+                    continue
+                code = highlight_code(m.group('code'), m.group('lang') or None)
+                placeholder = self.md.htmlStash.store(code)
+                text = f"{text[:m.start()]}\n{placeholder}\n{text[m.end():]}"
+                index = m.start() + len(placeholder) + 2
+            return text.split("\n")
+
+    class CachedFencedCodeExtension(Extension):
+        def extendMarkdown(self, md):
+            # Runs just before fenced_code (priority 25) so known blocks never reach CodeHilite.
+            md.preprocessors.register(CachedFencedCodePreprocessor(md), 'cached_fenced_code', 26)
+
+    return CachedFencedCodeExtension()
+
+class IncrementalMarkdown:
+    """Splits a growing Markdown text into finished blocks and an unfinished tail.
+
+    Finished blocks (paragraphs, lists, closed code fences) are rendered once;
+    only the tail is rendered again, and a tail longer than TAIL_RENDER_CHARS
+    only every TAIL_RENDER_GROWTH times its size (``feed`` returns ``None``
+    for a tail that is unchanged). The blocks are a streaming preview: the
+    whole text should still be rendered once at the end.
+    """
+
+    SCAN_START = (0, None, False, False, None)
+
+    def __init__(self):
+        self.pending = ''
+        self.rendered_length = 0
+        self.scan = self.SCAN_START
+
+    def feed(self, delta):
+        self.pending += delta
+        finished = []
+        while True:
+            end = self._find_block_end()
+            if end is None:
+                break
+            block, self.pending = self.pending[:end], self.pending[end:]
+            self.scan = self.SCAN_START
+            if block.strip():
+                finished.append(render_markdown(block))
+        length = len(self.pending)
+        if not finished and length > TAIL_RENDER_CHARS and length < self.rendered_length * TAIL_RENDER_GROWTH:
+            return finished, None
+        self.rendered_length = length
+        tail = render_markdown(self.pending) if self.pending.strip() else ''
+        return finished, tail
+
+    def flush(self):
+        block, self.pending = self.pending, ''
+        self.rendered_length = 0
+        self.scan = self.SCAN_START
+        return render_markdown(block) if block.strip() else ''
+
+    def _find_block_end(self):
+        # Resumes after the last complete line seen, so a long block is not rescanned on every chunk.
+        pos, fence, has_content, is_list, blank_end = self.scan
+        for line in self.pending[pos:].splitlines(keepends=True):
+            if not line.endswith('\n'):
+                break
+            stripped = line.strip()
+            line_end = pos + len(line)
+            if fence:
+                if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                    return line_end
+            elif blank_end is not None:
+                if stripped:
+                    continues_block = line[0] in ' \t' or (is_list and LIST_ITEM_RE.match(line))
+                    if not continues_block:
+                        return blank_end
+                    blank_end = None
+            else:
+                fence_match = FENCE_RE.match(line)
+                if fence_match:
+                    if has_content:
+                        return pos
+                    fence = fence_match.group(1)
+                    has_content = True
+                elif not stripped:
+                    if has_content:
+                        blank_end = line_end
+                else:
+                    if not has_content:
+                        is_list = bool(LIST_ITEM_RE.match(line))
+                    has_content = True
+            pos = line_end
+        self.scan = (pos, fence, has_content, is_list, blank_end)
+        return None
@@ -0,0 +1,81 @@
+from PySide6.QtCore import QObject, Signal
+
+DEFAULT_BUDGET_MB = 1024
+MEGABYTE = 1024 * 1024
+
+def image_bytes(image):
+    return image.sizeInBytes() if image is not None and not image.isNull() else 0
+
+def pixmap_bytes(pixmap):
+    if pixmap is None or pixmap.isNull():
+        return 0
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+def format_bytes(size):
+    if size >= MEGABYTE * 1024:
+        return f"{size / (MEGABYTE * 1024):.1f} GB"
+    if size >= MEGABYTE * 10:
+        return f"{size / MEGABYTE:.0f} MB"
+    return f"{size / MEGABYTE:.1f} MB"
+
+class MemoryPool:
+    def __init__(self, name, size, evict=None, rebuild_cost=0):
+        self.name = name
+        self.size = size
+        self.evict = evict
+        self.rebuild_cost = rebuild_cost
+
+class MemoryAccountant(QObject):
+    usage_changed = Signal(int, int)
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * MEGABYTE, parent=None):
+        super().__init__(parent)
+        self.budget = budget_bytes
+        self.pools = []
+        self.evicted = {}
+        self.last_usage = {}
+
+    def register(self, name, size, evict=None, rebuild_cost=0):
+        self.pools.append(MemoryPool(name, size, evict, rebuild_cost))
+
+    def set_budget(self, budget_bytes):
+        self.budget = budget_bytes
+        self.enforce()
+
+    def usage(self):
+        usage = {}
+        for pool in self.pools:
+            try:
+                usage[pool.name] = pool.size()
+            except Exception as e:
+                print(f"Error measuring memory pool {pool.name}: {e}")
+                usage[pool.name] = 0
+        self.last_usage = usage
+        return usage
+
+    def total(self):
+        return sum(self.usage().values())
+
+    def enforce(self):
+        total = self.total()
+        if total > self.budget:
+            for pool in sorted(self.pools, key=lambda pool: pool.rebuild_cost):
+                if pool.evict is None:
+                    continue
+                freed = pool.evict(total - self.budget)
+                if freed:
+                    self.evicted[pool.name] = self.evicted.get(pool.name, 0) + freed
+                    total -= freed
+                if total <= self.budget:
+                    break
+            total = self.total()
+        self.usage_changed.emit(total, self.budget)
+        return total
+
+    def summary(self):
+        return f"Memory {format_bytes(sum(self.last_usage.values()))} / {format_bytes(self.budget)}"
+
+    def breakdown(self):
+        lines = [f"{name}: {format_bytes(size)}" for name, size in self.last_usage.items()]
+        lines += [f"evicted {name}: {format_bytes(size)}" for name, size in self.evicted.items()]
+        return '\n'.join(lines)
@@ -0,0 +1,143 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from PySide6.QtCore import QStandardPaths
+
+SEARCH_LIMIT = 50
+SNIPPET_TOKENS = 16
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def default_index_path():
+    path = os.environ.get('ITT_QWEN_MESSAGE_INDEX')
+    if path:
+        return path
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericDataLocation)
+    return os.path.join(base or os.path.expanduser('~'), 'ImageChat', 'messages.sqlite3')
+
+def fts_query(text):
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if not text[-1:].isspace():
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def fts5_available(connection):
+    try:
+        connection.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(text)")
+        connection.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+class MessageIndex:
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        self.connection = None
+        self.has_fts = False
+
+    def open(self):
+        if self.connection is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.has_fts = fts5_available(self.connection)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY,
+                    started_at TEXT NOT NULL
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    session_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    is_user INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    image TEXT,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            if self.has_fts:
+                self.connection.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                        text, content='messages', content_rowid='id', tokenize='porter unicode61'
+                    )
+                """)
+
+    def start_session(self):
+        self.open()
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO sessions (started_at) VALUES (?)",
+                                             (datetime.now().isoformat(timespec='seconds'),))
+        return cursor.lastrowid
+
+    def add(self, session_id, position, is_user, text, image=None):
+        self.open()
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO messages (session_id, position, is_user, text, image, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, position, int(is_user), text, image, datetime.now().isoformat(timespec='seconds'))
+            )
+            if self.has_fts:
+                self.connection.execute("INSERT INTO messages_fts (rowid, text) VALUES (?, ?)",
+                                        (cursor.lastrowid, text))
+        return cursor.lastrowid
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        self.open()
+        if self.has_fts:
+            query = fts_query(text)
+            if query is None:
+                return []
+            rows = self.connection.execute(f"""
+                SELECT m.id, m.session_id, m.position, m.is_user, m.image, m.created_at,
+                       snippet(messages_fts, 0, '', '', '...', {SNIPPET_TOKENS})
+                FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY bm25(messages_fts), m.id DESC
+                LIMIT ?
+            """, (query, limit)).fetchall()
+        else:
+            tokens = TOKEN_RE.findall(text)
+            if not tokens:
+                return []
+            clauses = ' AND '.join(['text LIKE ?'] * len(tokens))
+            rows = self.connection.execute(f"""
+                SELECT id, session_id, position, is_user, image, created_at, substr(text, 1, 160)
+                FROM messages WHERE {clauses} ORDER BY id DESC LIMIT ?
+            """, [f'%{token}%' for token in tokens] + [limit]).fetchall()
+        return [{'id': row[0], 'session_id': row[1], 'position': row[2], 'is_user': bool(row[3]),
+                 'image': row[4], 'created_at': row[5], 'snippet': row[6]} for row in rows]
+
+    def message_text(self, message_id):
+        self.open()
+        row = self.connection.execute("SELECT text FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row[0] if row else None
+
+    def clear(self):
+        self.open()
+        with self.connection:
+            self.connection.execute("DELETE FROM messages")
+            self.connection.execute("DELETE FROM sessions")
+            if self.has_fts:
+                self.connection.execute("INSERT INTO messages_fts (messages_fts) VALUES ('delete-all')")
+
+    def __len__(self):
+        self.open()
+        return self.connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
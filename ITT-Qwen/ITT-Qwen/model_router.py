@@ -0,0 +1,59 @@
+import re
+import threading
+
+from config import MODEL_LADDER
+
+HEDGE_RE = re.compile(
+    r"\b(i(?:'m| am) not (?:sure|certain)|(?:cannot|can't|unable to) (?:determine|tell|see|read|identify)"
+    r"|not (?:clearly )?(?:visible|legible|readable)|hard to (?:tell|say|read)"
+    r"|difficult to (?:tell|say|read|determine)|unclear|too (?:blurry|small) to)\b",
+    re.IGNORECASE
+)
+COMPLEX_RE = re.compile(
+    r"\b(explain|in detail|step by step|transcribe|read all|every|count|compare|analy[sz]e|why)\b",
+    re.IGNORECASE
+)
+MIN_ANSWER_CHARS = 12
+COMPLEX_QUESTION_CHARS = 240
+
+def parse_model_ladder(text):
+    return [name.strip() for name in text.split(',') if name.strip()]
+
+class ModelRouter:
+    def __init__(self, models=None):
+        self.models = list(models or MODEL_LADDER)
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.escalations = 0
+
+    def largest(self):
+        return self.models[-1]
+
+    def next_model(self, model):
+        if model not in self.models:
+            return None
+        index = self.models.index(model)
+        return self.models[index + 1] if index + 1 < len(self.models) else None
+
+    def first_model(self, question):
+        if len(question) > COMPLEX_QUESTION_CHARS or COMPLEX_RE.search(question):
+            return self.largest()
+        return self.models[0]
+
+    def escalation_reason(self, answer):
+        text = answer.strip()
+        if len(text) < MIN_ANSWER_CHARS:
+            return "the answer was too short"
+        if HEDGE_RE.search(text):
+            return "the answer was uncertain"
+        return None
+
+    def record(self, model, escalated=False):
+        with self._lock:
+            self.requests[model] = self.requests.get(model, 0) + 1
+            if escalated:
+                self.escalations += 1
+
+    def stats(self):
+        with self._lock:
+            return {'models': list(self.models), 'requests': dict(self.requests), 'escalations': self.escalations}
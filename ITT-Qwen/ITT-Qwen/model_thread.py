@@ -1,76 +1,222 @@
-import base64
-import ollama
 from PySide6.QtCore import QThread, Signal
 
+from config import DEFAULT_MODEL, SYSTEM_PROMPT
+from instrumentation import TurnMetrics
+from inference import build_messages, coalesced_stream_chat, prefill_chat
+from image_ops import encode_image_payload
+from frames import load_frames, frame_prompt
+from markdown_renderer import IncrementalMarkdown, render_markdown
+
 class ModelThread(QThread):
     finished = Signal(str)
+    partial = Signal(str, list, object)
     error = Signal(str)
     progress = Signal(int)
+    escalated = Signal(str, str)
     
-    def __init__(self, message_history, image_path=None):
+    def __init__(self, message_history, image_path=None, metrics=None, image=None, crop=None, payload=None,
+                 response_format=None, system_prompt=SYSTEM_PROMPT, options=None, model=None, router=None,
+                 profile_session=None, frames=None, frame_total=None, worker=None, max_side=None):
         super().__init__()
         self.message_history = message_history
         self.image_path = image_path
+        self.image = image
+        self.max_side = max_side
+        self.frames = frames
+        self.frame_total = frame_total
+        self.worker = worker
+        self.stream_tail = ''
+        self.crop = crop
+        self.payload = payload
+        self.response_format = response_format
+        self.system_prompt = system_prompt
+        self.options = options
+        self.router = router
+        self.profile_session = profile_session
+        self.model = model or DEFAULT_MODEL
+        self.metrics = metrics if metrics is not None else TurnMetrics(self.model)
+        self.token_limit = (options or {}).get('num_predict') or 0
+        self.chunk_count = 0
+        self.render_html = response_format is None
+        self.stream_renderer = IncrementalMarkdown()
+        self.response_html = None
         self._is_cancelled = False
     
     def cancel(self):
         self._is_cancelled = True
+
+    def is_cancelled(self):
+        return self._is_cancelled
     
-    def image_to_base64(self, image_path):
+    def image_to_base64(self, image_path=None, image=None, crop=None):
         try:
-            with open(image_path, 'rb') as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            return encode_image_payload(image, crop, image_path, self.max_side)
         except Exception as e:
             raise Exception(f"Failed to process image: {str(e)}")
     
+    def worker_sources(self):
+        # Pixels already in memory go through shared memory; anything on disk is read by the worker.
+        if self.frames:
+            sources = [{'image': frame} if frame is not None else {'path': self.image_path, 'frame': index}
+                       for index, frame in self.frames]
+        elif self.crop is not None and self.image is not None:
+            sources = [{'image': self.image}]
+        else:
+            sources = [{'path': self.image_path}]
+        for source in sources:
+            source.update(crop=self.crop, max_side=self.max_side)
+        return sources
+
     def run(self):
+        if self.profile_session is None:
+            self.process()
+            return
+        with self.profile_session.thread('ModelThread'):
+            self.process()
+
+    def process(self):
         try:
             if self._is_cancelled:
                 return
 
-            system_prompt = """You are Insight AI, a specialized visual assistant. Your goal is to provide clear, accurate, and well-structured information.
-
-**Core Instructions:**
-1.  **Image Analysis:** When an image is provided, your primary function is to meticulously analyze it and answer questions based *only* on the visual information present.
-2.  **General Conversation:** If no image is provided, act as a helpful, general-purpose assistant.
-3.  **Honesty:** If you cannot determine an answer from the image, explicitly state that the information is not available in the provided visual. Do not speculate or invent details.
-
-**Formatting Rules:**
-- You MUST format all your responses using GitHub Flavored Markdown.
-- Use headings, lists, and bold text to structure your answers for maximum readability.
-- For any code snippets, use fenced code blocks with appropriate language identifiers (e.g., ```python)."""
-            
-            ollama_messages = [{
-                'role': 'system',
-                'content': system_prompt
-            }]
-
-            for msg in self.message_history:
-                if self._is_cancelled:
+            self.progress.emit(-1)
+            images = None
+            has_image = self.image_path or self.image is not None
+            if has_image and self.message_history and self.message_history[-1]['is_user']:
+                try:
+                    with self.metrics.stage('image_encode'):
+                        if self.worker is not None:
+                            images = self.worker_sources()
+                        elif self.frames:
+                            frames = load_frames(self.image_path, self.frames)
+                            images = [self.image_to_base64(image=frame, crop=self.crop) for _, frame in frames]
+                        elif self.payload is not None:
+                            images = [self.payload]
+                        else:
+                            images = [self.image_to_base64(self.image_path, self.image, self.crop)]
+                except Exception as e:
+                    self.error.emit(f"Image processing failed: {str(e)}")
                     return
-                    
-                message = {
-                    'role': 'user' if msg['is_user'] else 'assistant',
-                    'content': msg['text']
-                }
-                if msg['is_user'] and msg == self.message_history[-1] and self.image_path:
-                    try:
-                        message['images'] = [self.image_to_base64(self.image_path)]
-                    except Exception as e:
-                        self.error.emit(f"Image processing failed: {str(e)}")
-                        return
-                ollama_messages.append(message)
+            ollama_messages = build_messages(self.message_history,
+                                             images if self.worker is None else None, self.system_prompt)
+            if self.frames and images and len(self.frames) > 1:
+                ollama_messages[-1]['content'] = frame_prompt([index for index, _ in self.frames], self.frame_total,
+                                                              ollama_messages[-1]['content'])
             
             try:
-                res = ollama.chat(
-                    model='qwen2.5vl:7b',
-                    messages=ollama_messages
-                )
+                if self.router is not None:
+                    self.model = self.router.first_model(self.message_history[-1]['text'])
+                with self.metrics.stage('inference'):
+                    while True:
+                        if self.worker is not None:
+                            content, stats, self.response_html = self.worker.chat(
+                                self.model,
+                                ollama_messages,
+                                images or [],
+                                on_chunk=self.handle_rendered_chunk,
+                                is_cancelled=self.is_cancelled,
+                                options=self.options,
+                                response_format=self.response_format,
+                                render=self.render_html,
+                                on_encoded=self.record_worker_encode
+                            )
+                        else:
+                            content, stats = coalesced_stream_chat(
+                                self.model,
+                                ollama_messages,
+                                on_chunk=self.handle_chunk,
+                                is_cancelled=self.is_cancelled,
+                                options=self.options,
+                                response_format=self.response_format
+                            )
+                        if self._is_cancelled:
+                            return
+                        next_model = self.router.next_model(self.model) if self.router else None
+                        reason = self.router.escalation_reason(content) if next_model else None
+                        if self.router is not None:
+                            self.router.record(self.model, reason is not None)
+                        if reason is None:
+                            break
+                        self.metrics.escalations.append({'from': self.model, 'to': next_model, 'reason': reason})
+                        self.escalated.emit(next_model, reason)
+                        self.model = next_model
+                        self.chunk_count = 0
+                        self.stream_renderer = IncrementalMarkdown()
+                        self.stream_tail = ''
+                        self.progress.emit(-1)
+                self.metrics.model = self.model
+                self.metrics.record_backend(stats)
+                if self.render_html and self.worker is None:
+                    with self.metrics.stage('markdown'):
+                        self.response_html = self.render_response(content)
                 if not self._is_cancelled:
-                    self.finished.emit(res['message']['content'])
+                    self.progress.emit(100)
+                    self.finished.emit(content)
             except Exception as e:
                 if not self._is_cancelled:
                     self.error.emit(f"Model processing failed: {str(e)}")
         except Exception as e:
             if not self._is_cancelled:
-                self.error.emit(f"Unexpected error: {str(e)}")
\ No newline at end of file
+                self.error.emit(f"Unexpected error: {str(e)}")
+
+    def render_response(self, content):
+        try:
+            # The streamed blocks were rendered apart; reference links, footnotes and abbreviations need the whole text.
+            return render_markdown(content)
+        except ImportError:
+            return None
+
+    def count_chunk(self):
+        self.metrics.mark_first_token()
+        self.chunk_count += 1
+        if self.token_limit > 0:
+            self.progress.emit(min(99, self.chunk_count * 100 // self.token_limit))
+
+    def handle_chunk(self, piece):
+        self.count_chunk()
+        finished, tail = self.stream_renderer.feed(piece) if self.render_html else ([], '')
+        self.partial.emit(piece, finished, tail)
+
+    def handle_rendered_chunk(self, piece, finished, tail):
+        if tail is not None:
+            self.stream_tail = tail
+        self.count_chunk()
+        self.partial.emit(piece, finished, tail)
+
+    def record_worker_encode(self, encode_ms):
+        self.metrics.worker_encode_ms = encode_ms
+
+    def flush_stream(self):
+        if self.worker is not None:
+            return self.stream_tail
+        return self.stream_renderer.flush()
+
+class PrefillThread(QThread):
+    finished = Signal(dict)
+    error = Signal(str)
+
+    def __init__(self, key, message_history, image_path=None, image=None, crop=None, payload=None,
+                 system_prompt=SYSTEM_PROMPT, options=None, model=None, max_side=None):
+        super().__init__()
+        self.key = key
+        self.max_side = max_side
+        self.message_history = message_history
+        self.image_path = image_path
+        self.image = image
+        self.crop = crop
+        self.payload = payload
+        self.system_prompt = system_prompt
+        self.options = options
+        self.model = model or DEFAULT_MODEL
+
+    def run(self):
+        try:
+            payload = self.payload
+            if payload is None:
+                payload = encode_image_payload(self.image, self.crop, self.image_path, self.max_side)
+            history = self.message_history + [{'text': '', 'is_user': True}]
+            messages = build_messages(history, [payload], self.system_prompt)
+            stats = prefill_chat(self.model, messages, self.options)
+            self.finished.emit({'key': self.key, 'payload': payload, 'stats': stats})
+        except Exception as e:
+            self.error.emit(f"Prefill failed: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,46 @@
+import json
+
+from config import SYSTEM_PROMPT, PROMPT_VARIANTS, GENERATION_PROFILES, DEFAULT_GENERATION_PROFILE
+
+PROFILE_KEYS = ('num_predict', 'num_ctx', 'stop', 'prompt_variant')
+
+def load_profiles(settings):
+    profiles = {}
+    for name, defaults in GENERATION_PROFILES.items():
+        profile = dict(defaults)
+        stored = settings.value(f'profiles/{name}', '')
+        if stored:
+            try:
+                overrides = json.loads(stored)
+            except ValueError:
+                overrides = {}
+            profile.update({key: overrides[key] for key in PROFILE_KEYS if key in overrides})
+        profiles[name] = profile
+    return profiles
+
+def save_profiles(settings, profiles):
+    for name, profile in profiles.items():
+        settings.setValue(f'profiles/{name}', json.dumps({key: profile[key] for key in PROFILE_KEYS}))
+
+def active_profile_name(settings):
+    name = settings.value('active_profile', DEFAULT_GENERATION_PROFILE)
+    return name if name in GENERATION_PROFILES else DEFAULT_GENERATION_PROFILE
+
+def profile_options(profile):
+    options = {}
+    if profile.get('num_predict', 0) > 0:
+        options['num_predict'] = profile['num_predict']
+    if profile.get('num_ctx', 0) > 0:
+        options['num_ctx'] = profile['num_ctx']
+    if profile.get('stop'):
+        options['stop'] = list(profile['stop'])
+    return options or None
+
+def profile_system_prompt(profile):
+    return SYSTEM_PROMPT + PROMPT_VARIANTS.get(profile.get('prompt_variant'), '')
+
+def parse_stop_sequences(text):
+    return [part.replace('\\n', '\n') for part in text.split('|') if part]
+
+def format_stop_sequences(stop):
+    return '|'.join(part.replace('\n', '\\n') for part in stop)
@@ -0,0 +1,133 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from PySide6.QtCore import QStandardPaths
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+TRACEMALLOC_FRAMES = 5
+
+def default_profile_dir():
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericDataLocation)
+    return os.path.join(base or os.path.expanduser('~'), 'ImageChat', 'profiling')
+
+class ProfileSession:
+    def __init__(self, directory, label):
+        self.directory = directory
+        self.label = label
+        self.notes = []
+        self.profiler = cProfile.Profile()
+        self.thread_profilers = []
+        self._lock = threading.Lock()
+        self._owns_tracemalloc = False
+        self._start_snapshot = None
+        self._started = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._start_snapshot = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    @contextmanager
+    def thread(self, name):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+ allows a single active profiler per interpreter.
+            self.note(f"{name}: not profiled ({e})")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self.thread_profilers.append((name, profiler))
+
+    def note(self, text):
+        with self._lock:
+            self.notes.append(text)
+
+    def finish(self):
+        self.profiler.disable()
+        wall_ms = (time.perf_counter() - self._started) * 1000.0
+        end_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{self.label}")
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            thread_profilers = list(self.thread_profilers)
+            notes = list(self.notes)
+        for _, profiler in thread_profilers:
+            stats.add(profiler)
+        stats.dump_stats(stem + '.prof')
+
+        report = io.StringIO()
+        report.write(f"{self.label}: {wall_ms:.1f} ms wall\n")
+        report.write(f"threads: main{''.join(', ' + name for name, _ in thread_profilers)}\n")
+        for note in notes:
+            report.write(f"{note}\n")
+        report.write(f"\ntraced memory: {current / 1e6:.2f} MB now, {peak / 1e6:.2f} MB peak\n")
+        report.write(f"top {TOP_ALLOCATIONS} allocation changes:\n")
+        for stat in end_snapshot.compare_to(self._start_snapshot, 'lineno')[:TOP_ALLOCATIONS]:
+            report.write(f"  {stat}\n")
+        report.write(f"\ntop {TOP_FUNCTIONS} functions by cumulative time:\n")
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(stem + '.txt', 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        return stem + '.prof'
+
+class TurnProfiler:
+    def __init__(self, directory=None):
+        directory = directory or os.environ.get('ITT_QWEN_PROFILE_DIR')
+        self.enabled = bool(directory)
+        self.directory = directory or default_profile_dir()
+        self.active = None
+        self.written = 0
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+
+    def begin(self, label):
+        if not self.enabled or self.active is not None:
+            return None
+        self.active = ProfileSession(self.directory, label).start()
+        return self.active
+
+    def end(self, session):
+        if session is None or session is not self.active:
+            return None
+        self.active = None
+        try:
+            path = session.finish()
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+            return None
+        self.written += 1
+        return path
+
+    @contextmanager
+    def capture(self, label):
+        session = self.begin(label)
+        try:
+            yield session
+        finally:
+            self.end(session)
@@ -0,0 +1,115 @@
+from collections import deque
+
+from PySide6.QtCore import QThread, Signal, QRect
+from PySide6.QtGui import QImage
+
+from image_ops import load_numpy, numpy_available, scale_image
+
+ANALYSIS_MAX_SIDE = 320
+CELL_SIZE = 8
+MIN_REGION_CELLS = 3
+MAX_REGION_FRACTION = 0.85
+REGION_PADDING = 0.04
+
+def proposals_available():
+    return numpy_available()
+
+def grayscale_array(image):
+    np = load_numpy()
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    width, height, stride = gray.width(), gray.height(), gray.bytesPerLine()
+    buffer = np.frombuffer(gray.constBits(), dtype=np.uint8, count=stride * height)
+    return buffer.reshape(height, stride)[:, :width].astype(np.float32)
+
+def edge_density_grid(gray):
+    np = load_numpy()
+    dx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    dy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    magnitude = dx + dy
+    threshold = max(24.0, float(np.percentile(magnitude, 85)))
+    edges = (magnitude > threshold).astype(np.float32)
+    rows = edges.shape[0] // CELL_SIZE
+    cols = edges.shape[1] // CELL_SIZE
+    edges = edges[:rows * CELL_SIZE, :cols * CELL_SIZE]
+    return edges.reshape(rows, CELL_SIZE, cols, CELL_SIZE).mean(axis=(1, 3))
+
+def dilate(mask):
+    grown = mask.copy()
+    grown[1:, :] |= mask[:-1, :]
+    grown[:-1, :] |= mask[1:, :]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+def connected_components(mask):
+    np = load_numpy()
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    components = []
+    for start_row, start_col in zip(*np.nonzero(mask)):
+        if seen[start_row, start_col]:
+            continue
+        cells = []
+        queue = deque([(start_row, start_col)])
+        seen[start_row, start_col] = True
+        while queue:
+            row, col = queue.popleft()
+            cells.append((row, col))
+            for next_row, next_col in ((row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)):
+                if (0 <= next_row < rows and 0 <= next_col < cols
+                        and mask[next_row, next_col] and not seen[next_row, next_col]):
+                    seen[next_row, next_col] = True
+                    queue.append((next_row, next_col))
+        components.append(cells)
+    return components
+
+def propose_regions(image, max_regions=5):
+    if image.isNull() or load_numpy() is None:
+        return []
+    small = scale_image(image, ANALYSIS_MAX_SIDE)
+    gray = grayscale_array(small)
+    if gray.shape[0] < CELL_SIZE * 2 or gray.shape[1] < CELL_SIZE * 2:
+        return []
+    density = edge_density_grid(gray)
+    active = density > max(0.08, float(density.mean()) * 1.5)
+    total_cells = density.size
+
+    scored = []
+    for cells in connected_components(dilate(active)):
+        if len(cells) < MIN_REGION_CELLS or len(cells) > total_cells * MAX_REGION_FRACTION:
+            continue
+        rows = [row for row, _ in cells]
+        cols = [col for _, col in cells]
+        score = float(sum(density[row, col] for row, col in cells))
+        scored.append((score, min(rows), min(cols), max(rows) + 1, max(cols) + 1))
+    scored.sort(reverse=True)
+
+    factor_x = image.width() / small.width()
+    factor_y = image.height() / small.height()
+    bounds = QRect(0, 0, image.width(), image.height())
+    regions = []
+    for _, top, left, bottom, right in scored[:max_regions]:
+        x = left * CELL_SIZE * factor_x
+        y = top * CELL_SIZE * factor_y
+        width = (right - left) * CELL_SIZE * factor_x
+        height = (bottom - top) * CELL_SIZE * factor_y
+        pad_x = width * REGION_PADDING
+        pad_y = height * REGION_PADDING
+        region = QRect(int(x - pad_x), int(y - pad_y), int(width + 2 * pad_x), int(height + 2 * pad_y))
+        regions.append(region.intersected(bounds))
+    return regions
+
+class RegionProposalThread(QThread):
+    finished = Signal(list)
+    error = Signal(str)
+
+    def __init__(self, image, max_regions=5):
+        super().__init__()
+        self.image = image
+        self.max_regions = max_regions
+
+    def run(self):
+        try:
+            self.finished.emit(propose_regions(self.image, self.max_regions))
+        except Exception as e:
+            self.error.emit(f"Region proposal failed: {str(e)}")
@@ -0,0 +1,70 @@
+import math
+import threading
+from collections import deque
+
+from PySide6.QtCore import QSize, Qt
+
+DEFAULT_LATENCY_TARGET_MS = 3000
+RESOLUTION_STEPS = (1792, 1344, 896, 672, 448)
+LATENCY_SAMPLES = 50
+MIN_SAMPLES = 3
+TARGET_QUANTILE = 0.9
+
+def scaled_size(size, max_side):
+    if max_side is None or max(size.width(), size.height()) <= max_side:
+        return QSize(size)
+    return size.scaled(QSize(max_side, max_side), Qt.AspectRatioMode.KeepAspectRatio)
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def fit_latency(samples):
+    count = len(samples)
+    mean_x = sum(x for x, _ in samples) / count
+    mean_y = sum(y for _, y in samples) / count
+    spread = sum((x - mean_x) ** 2 for x, _ in samples)
+    if spread == 0:
+        # Every sample has the same size: assume latency scales with pixels until other sizes are seen.
+        return 0.0, mean_y / mean_x if mean_x else 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / spread
+    return mean_y - slope * mean_x, slope
+
+class ResolutionController:
+    def __init__(self, target_ms=DEFAULT_LATENCY_TARGET_MS, steps=RESOLUTION_STEPS):
+        self.target_ms = target_ms
+        self.steps = steps
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def set_target(self, target_ms):
+        self.target_ms = target_ms
+
+    def record(self, model, pixels, prompt_eval_ms):
+        if pixels <= 0 or prompt_eval_ms is None:
+            return
+        with self._lock:
+            self.samples.setdefault(model, deque(maxlen=LATENCY_SAMPLES)).append((pixels, prompt_eval_ms))
+
+    def model(self, model):
+        with self._lock:
+            samples = list(self.samples.get(model, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        intercept, slope = fit_latency(samples)
+        if slope <= 0:
+            return None
+        margin = max(0.0, quantile([y - intercept - slope * x for x, y in samples], TARGET_QUANTILE))
+        return intercept, slope, margin
+
+    def choose(self, model, size, frames=1):
+        fit = self.model(model)
+        if fit is None:
+            return None
+        intercept, slope, margin = fit
+        candidates = [None] + [step for step in self.steps if step < max(size.width(), size.height())]
+        for max_side in candidates:
+            scaled = scaled_size(size, max_side)
+            if intercept + slope * scaled.width() * scaled.height() * frames + margin <= self.target_ms:
+                return max_side
+        return candidates[-1]
@@ -0,0 +1,175 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from PySide6.QtCore import Qt, QStandardPaths
+from PySide6.QtGui import QImage
+
+from image_ops import crop_image, load_numpy
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+SAMPLE_SCALE = 8
+MAX_DISTANCE = 6
+
+def default_index_path():
+    path = os.environ.get('ITT_QWEN_ANSWER_INDEX')
+    if path:
+        return path
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericDataLocation)
+    return os.path.join(base or os.path.expanduser('~'), 'ImageChat', 'answer_index.sqlite3')
+
+def grayscale_rows(image):
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    width, height, stride = gray.width(), gray.height(), gray.bytesPerLine()
+    bits = bytes(gray.constBits())[:stride * height]
+    np = load_numpy()
+    if np is not None:
+        return np.frombuffer(bits, dtype=np.uint8).reshape(height, stride)[:, :width]
+    return [bits[row * stride:row * stride + width] for row in range(height)]
+
+def dhash(image, crop=None):
+    if crop is not None:
+        image = crop_image(image, crop)
+    width, height = HASH_SIZE + 1, HASH_SIZE
+    np = load_numpy()
+    if np is not None:
+        sample = image.scaled(width * SAMPLE_SCALE, height * SAMPLE_SCALE,
+                              Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.FastTransformation)
+        pixels = grayscale_rows(sample).astype(np.float32)
+        cells = pixels.reshape(height, SAMPLE_SCALE, width, SAMPLE_SCALE).mean(axis=(1, 3))
+        bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    else:
+        sample = image.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio,
+                              Qt.TransformationMode.SmoothTransformation)
+        bits = [row[x + 1] > row[x] for row in grayscale_rows(sample) for x in range(HASH_SIZE)]
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def normalize_question(question):
+    return re.sub(r'[^a-z0-9]+', ' ', question.lower()).strip()
+
+class MultiIndexHash:
+    # Two hashes within max_distance bits agree exactly on at least one of max_distance + 1 chunks.
+    def __init__(self, max_distance=MAX_DISTANCE, bits=HASH_BITS):
+        self.max_distance = max_distance
+        count = max_distance + 1
+        self.chunks = []
+        shift = 0
+        for index in range(count):
+            width = bits // count + (1 if index < bits % count else 0)
+            self.chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [{} for _ in self.chunks]
+        self.entries = []
+
+    def add(self, key, value):
+        position = len(self.entries)
+        self.entries.append((key, value))
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((key >> shift) & mask, []).append(position)
+
+    def search(self, key, max_distance=None):
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            candidates = range(len(self.entries))
+        else:
+            candidates = set()
+            for table, (shift, mask) in zip(self.tables, self.chunks):
+                candidates.update(table.get((key >> shift) & mask, ()))
+        matches = []
+        for position in candidates:
+            entry_key, value = self.entries[position]
+            distance = hamming(key, entry_key)
+            if distance <= max_distance:
+                matches.append((distance, value))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def __len__(self):
+        return len(self.entries)
+
+class AnswerIndex:
+    def __init__(self, path=None, max_distance=MAX_DISTANCE):
+        self.path = path or default_index_path()
+        self.max_distance = max_distance
+        self.hashes = None
+        self.connection = None
+        self.lookups = 0
+        self.hits = 0
+
+    def open(self):
+        if self.connection is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                question_key TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                image TEXT,
+                model TEXT,
+                created_at TEXT NOT NULL,
+                context TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(answers)")]
+        if 'context' not in columns:
+            # Answers stored before the context was recorded keep '' and so never match a lookup.
+            with self.connection:
+                self.connection.execute("ALTER TABLE answers ADD COLUMN context TEXT NOT NULL DEFAULT ''")
+        self.hashes = MultiIndexHash(self.max_distance)
+        for row in self.connection.execute("SELECT id, hash, question_key, context FROM answers"):
+            self.hashes.add(int(row[1], 16), (row[0], (row[2], row[3])))
+
+    def add(self, image_hash, question, answer, image=None, model=None, context=''):
+        self.open()
+        question_key = normalize_question(question)
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO answers (hash, question, question_key, answer, image, model, created_at, context) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (f"{image_hash:016x}", question, question_key, answer, image, model,
+                 datetime.now().isoformat(timespec='seconds'), context)
+            )
+        self.hashes.add(image_hash, (cursor.lastrowid, (question_key, context)))
+
+    def lookup(self, image_hash, question, context=''):
+        self.open()
+        self.lookups += 1
+        question_key = (normalize_question(question), context)
+        matches = [(distance, -row_id) for distance, (row_id, key) in self.hashes.search(image_hash)
+                   if key == question_key]
+        for distance, row_id in sorted(matches):
+            row_id = -row_id
+            row = self.connection.execute(
+                "SELECT question, answer, image, model, created_at FROM answers WHERE id = ?", (row_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            self.hits += 1
+            return {'distance': distance, 'question': row[0], 'answer': row[1], 'image': row[2],
+                    'model': row[3], 'created_at': row[4]}
+        return None
+
+    def __len__(self):
+        self.open()
+        return len(self.hashes)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.hashes = None
@@ -0,0 +1,106 @@
+import threading
+
+class _Flight:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.cancel_checks = []
+
+    def publish(self, piece):
+        with self.cond:
+            self.chunks.append(piece)
+            self.cond.notify_all()
+
+    def all_cancelled(self):
+        with self.cond:
+            checks = list(self.cancel_checks)
+        return all(check is not None and check() for check in checks)
+
+    def finish(self, result=None, error=None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+class SingleFlight:
+    """Lets identical concurrent calls share one execution.
+
+    The first caller for a key starts ``fn(publish, all_cancelled)`` on a
+    separate thread; every caller, the first included, replays its published
+    chunks and receives the same result. A caller that cancels returns at once
+    with ``cancelled(chunks_seen)``, while the call itself is only cancelled
+    once every caller has cancelled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'shared': self.shared,
+                'in_flight': len(self._flights),
+            }
+
+    def run(self, key, fn, on_chunk=None, is_cancelled=None, cancelled=None):
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.executions += 1
+            else:
+                self.shared += 1
+            with flight.cond:
+                flight.cancel_checks.append(is_cancelled)
+
+        if leader:
+            threading.Thread(target=self._execute, args=(key, flight, fn), name='single-flight',
+                             daemon=True).start()
+        return self._follow(flight, on_chunk, is_cancelled, cancelled)
+
+    def _execute(self, key, flight, fn):
+        try:
+            result = fn(flight.publish, flight.all_cancelled)
+        except BaseException as e:
+            self._forget(key)
+            flight.finish(error=e)
+            return
+        self._forget(key)
+        flight.finish(result=result)
+
+    def _forget(self, key):
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def _follow(self, flight, on_chunk, is_cancelled, cancelled):
+        index = 0
+        while True:
+            with flight.cond:
+                if is_cancelled is not None and is_cancelled() and not flight.done:
+                    return cancelled(flight.chunks[:index]) if cancelled is not None else None
+                if index >= len(flight.chunks) and not flight.done:
+                    flight.cond.wait(0.25)
+                pending = flight.chunks[index:]
+                index = len(flight.chunks)
+                done = flight.done
+            if on_chunk is not None:
+                for piece in pending:
+                    on_chunk(piece)
+            if done:
+                break
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
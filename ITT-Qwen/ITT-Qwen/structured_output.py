@@ -0,0 +1,175 @@
+import json
+import os
+import re
+from datetime import datetime
+
+from config import STRUCTURED_SYSTEM_PROMPT
+
+BUILTIN_SCHEMAS = {
+    'Labels': {
+        'type': 'object',
+        'properties': {
+            'labels': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'text': {'type': 'string'},
+                        'category': {'type': ['string', 'null']},
+                    },
+                    'required': ['text'],
+                },
+            },
+        },
+        'required': ['labels'],
+    },
+    'Meter Reading': {
+        'type': 'object',
+        'properties': {
+            'value': {'type': ['number', 'null']},
+            'unit': {'type': ['string', 'null']},
+            'meter_id': {'type': ['string', 'null']},
+            'confidence': {'type': 'string', 'enum': ['low', 'medium', 'high']},
+        },
+        'required': ['value', 'unit', 'confidence'],
+    },
+    'Serial Numbers': {
+        'type': 'object',
+        'properties': {
+            'serial_numbers': {'type': 'array', 'items': {'type': 'string'}},
+        },
+        'required': ['serial_numbers'],
+    },
+}
+
+JSON_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'null': type(None),
+}
+
+def load_schema(path):
+    with open(path, encoding='utf-8') as f:
+        schema = json.load(f)
+    if not isinstance(schema, dict):
+        raise ValueError("A schema must be a JSON object")
+    return schema
+
+def resolve_schema(schema):
+    if isinstance(schema, str):
+        if schema in BUILTIN_SCHEMAS:
+            return schema, BUILTIN_SCHEMAS[schema]
+        try:
+            schema = json.loads(schema)
+        except ValueError:
+            raise ValueError(f"Unknown schema: {schema}")
+    if not isinstance(schema, dict):
+        raise ValueError("A schema must be a JSON object or a built-in schema name")
+    return schema.get('title', 'custom'), schema
+
+def structured_system_prompt(schema):
+    return STRUCTURED_SYSTEM_PROMPT.format(schema=json.dumps(schema, indent=2))
+
+def matches_type(value, expected):
+    if expected in ('integer', 'number') and isinstance(value, bool):
+        return False
+    return isinstance(value, JSON_TYPES.get(expected, object))
+
+def validate(value, schema, path='$'):
+    errors = []
+    expected = schema.get('type')
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(matches_type(value, name) for name in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(value).__name__}"]
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, dict):
+        properties = schema.get('properties', {})
+        for name in schema.get('required', []):
+            if name not in value:
+                errors.append(f"{path}: missing required property '{name}'")
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(validate(item, properties[name], f"{path}.{name}"))
+            elif schema.get('additionalProperties') is False:
+                errors.append(f"{path}: unexpected property '{name}'")
+    elif isinstance(value, list):
+        if 'minItems' in schema and len(value) < schema['minItems']:
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if 'items' in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], f"{path}[{index}]"))
+    elif isinstance(value, str):
+        if 'pattern' in schema and not re.search(schema['pattern'], value):
+            errors.append(f"{path}: {value!r} does not match {schema['pattern']}")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f"{path}: {value} is below {schema['minimum']}")
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f"{path}: {value} is above {schema['maximum']}")
+    return errors
+
+def parse_structured(text, schema):
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        return None, [f"Response is not valid JSON: {e}"]
+    return data, validate(data, schema)
+
+class StructuredRecord:
+    def __init__(self, schema_name, data, errors, image=None, question=None, model=None, output_tokens=None):
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.schema_name = schema_name
+        self.data = data
+        self.errors = errors
+        self.image = image
+        self.question = question
+        self.model = model
+        self.output_tokens = output_tokens
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            'event': 'structured_record',
+            'created_at': self.created_at,
+            'schema': self.schema_name,
+            'image': self.image,
+            'question': self.question,
+            'model': self.model,
+            'valid': self.valid,
+            'errors': self.errors,
+            'output_tokens': self.output_tokens,
+            'data': self.data,
+        }
+
+class StructuredRecordLog:
+    def __init__(self, log_path=None):
+        self.log_path = log_path or os.environ.get('ITT_QWEN_RECORDS_LOG')
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+        if self.log_path:
+            try:
+                self._write(self.log_path, [record], 'a')
+            except OSError as e:
+                print(f"Error writing records log {self.log_path}: {e}")
+
+    def export_jsonl(self, path):
+        self._write(path, self.records, 'w')
+        return len(self.records)
+
+    def _write(self, path, records, mode):
+        with open(path, mode, encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record.to_dict()) + '\n')
@@ -0,0 +1,328 @@
+from config import COLORS
+
+CLOSE_HOVER_COLOR = '#FF4444'
+MESSAGE_FONT_FAMILY = '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif'
+
+def build_stylesheet(colors=COLORS):
+    # Rules run from the outer containers inwards: a widget's own rule has to come after (and be at least as
+    # specific as) the container rules it overrides, just as a widget-level stylesheet beat its parent's.
+    return f"""
+        QToolTip {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+            padding: 5px;
+            border-radius: 4px;
+        }}
+
+        QWidget#windowFrame, #windowFrame QWidget {{
+            background-color: {colors['background']};
+            border: 1px solid {colors['border']};
+            border-radius: 8px;
+        }}
+        QWidget#dialogContent, #dialogContent QWidget {{
+            border: none;
+        }}
+        QWidget#content, #content QWidget {{
+            background-color: {colors['background']};
+            border: none;
+        }}
+
+        QWidget#titleBar {{
+            background-color: {colors['background']};
+            border-bottom: 1px solid {colors['border']};
+        }}
+        QLabel#windowTitle {{
+            color: {colors['text']};
+            font-size: 13px;
+            font-weight: bold;
+            border: none;
+            background-color: transparent;
+        }}
+        QPushButton#titleButton, QPushButton#closeButton {{
+            border: none;
+            border-radius: 0px;
+            background-color: transparent;
+            padding: 5px;
+        }}
+        QPushButton#titleButton:hover {{
+            background-color: {colors['secondary_bg']};
+        }}
+        QPushButton#closeButton:hover {{
+            background-color: {CLOSE_HOVER_COLOR};
+        }}
+
+        QMenuBar#menuBar {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: none;
+            padding: 2px;
+        }}
+        QMenuBar#menuBar::item:selected {{
+            background-color: {colors['accent']};
+        }}
+        #menuBar QMenu {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+        }}
+        #menuBar QMenu::item:selected {{
+            background-color: {colors['accent']};
+        }}
+
+        QScrollArea#chatScrollArea {{
+            border: none;
+            border-radius: 8px;
+            background-color: {colors['secondary_bg']};
+        }}
+        #chatScrollArea QScrollBar:vertical {{
+            border: none;
+            background-color: {colors['secondary_bg']};
+            width: 14px;
+            margin: 0px 0px 0px 0px;
+        }}
+        #chatScrollArea QScrollBar::handle:vertical {{
+            background-color: {colors['accent']};
+            border-radius: 7px;
+            min-height: 30px;
+        }}
+        #chatScrollArea QScrollBar::handle:vertical:hover {{
+            background-color: {colors['accent_hover']};
+        }}
+        #chatScrollArea QScrollBar::handle:vertical:pressed {{
+            background-color: {colors['border']};
+        }}
+        #chatScrollArea QScrollBar::add-page:vertical, #chatScrollArea QScrollBar::sub-page:vertical {{
+            background: none;
+        }}
+        #chatScrollArea QScrollBar::add-line:vertical, #chatScrollArea QScrollBar::sub-line:vertical {{
+            height: 0px;
+            width: 0px;
+        }}
+        QWidget#chatWidget, #chatWidget QWidget {{
+            background-color: {colors['secondary_bg']};
+        }}
+
+        QTextBrowser#messageBody {{
+            background-color: transparent;
+            border: none;
+            color: {colors['text']};
+            font-size: 14px;
+            font-family: {MESSAGE_FONT_FAMILY};
+        }}
+        QLabel#messageTime {{
+            color: {colors['text_secondary']};
+            font-size: 9px;
+            margin-top: 2px;
+        }}
+        QPushButton#messageAction {{
+            background-color: transparent;
+            border: none;
+            color: {colors['text_secondary']};
+            font-size: 10px;
+            padding: 0px;
+        }}
+        QPushButton#messageAction:hover {{
+            color: {colors['text']};
+            text-decoration: underline;
+        }}
+
+        QComboBox#optionCombo {{
+            border: 1px solid {colors['border']};
+            border-radius: 8px;
+            padding: 10px 12px;
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            font-size: 13px;
+        }}
+        #optionCombo QAbstractItemView {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            selection-background-color: {colors['accent']};
+        }}
+        QLineEdit#messageInput {{
+            border: 1px solid {colors['border']};
+            border-radius: 8px;
+            padding: 12px 15px;
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            font-size: 14px;
+        }}
+        QLineEdit#messageInput:focus {{
+            border-color: {colors['accent']};
+        }}
+
+        QPushButton#primaryButton {{
+            background-color: {colors['accent']};
+            color: {colors['text']};
+            border: none;
+            border-radius: 8px;
+            padding: 12px 20px;
+            font-size: 13px;
+            font-weight: bold;
+            min-width: 80px;
+        }}
+        QPushButton#primaryButton:hover {{
+            background-color: {colors['accent_hover']};
+        }}
+        QPushButton#primaryButton:pressed {{
+            background-color: {colors['accent']};
+        }}
+        QPushButton#primaryButton:disabled {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text_secondary']};
+        }}
+        QPushButton#primaryButton:checked {{
+            background-color: {colors['accent_hover']};
+            border: 1px solid {colors['border']};
+        }}
+
+        QLabel#imageDropArea {{
+            border: 2px dashed {colors['accent']};
+            border-radius: 8px;
+            background-color: {colors['secondary_bg']};
+            padding: 20px;
+            font-size: 14px;
+            color: {colors['text_secondary']};
+        }}
+        QSlider#frameSlider::groove:horizontal {{
+            background-color: {colors['secondary_bg']};
+            height: 4px;
+            border-radius: 2px;
+        }}
+        QSlider#frameSlider::handle:horizontal {{
+            background-color: {colors['accent_hover']};
+            width: 12px;
+            margin: -4px 0;
+            border-radius: 6px;
+        }}
+        QLabel#frameLabel {{
+            color: {colors['text_secondary']};
+            font-size: 11px;
+        }}
+        QCheckBox#sendKeyframes {{
+            color: {colors['text']};
+            font-size: 11px;
+        }}
+
+        QLabel#galleryCount {{
+            color: {colors['text_secondary']};
+            font-size: 12px;
+        }}
+        QPushButton#navButton {{
+            background-color: {colors['accent']};
+            color: {colors['text']};
+            border: none;
+            border-radius: 6px;
+            padding: 4px 10px;
+            font-size: 12px;
+        }}
+        QPushButton#navButton:hover {{
+            background-color: {colors['accent_hover']};
+        }}
+        QPushButton#navButton:disabled {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text_secondary']};
+        }}
+        QListWidget#galleryList {{
+            background-color: {colors['secondary_bg']};
+            border: 1px solid {colors['border']};
+            border-radius: 8px;
+        }}
+        QListWidget#galleryList::item:selected {{
+            background-color: {colors['accent']};
+            border-radius: 4px;
+        }}
+
+        QFrame#notificationBar, #notificationBar QFrame {{
+            background-color: {colors['background']};
+            border: none;
+        }}
+        QLabel#notificationMessage {{
+            font-size: 11px;
+        }}
+        QProgressBar#notificationProgress {{
+            background-color: {colors['secondary_bg']};
+            border: none;
+            border-radius: 2px;
+        }}
+        QProgressBar#notificationProgress::chunk {{
+            background-color: {colors['accent']};
+            border-radius: 2px;
+        }}
+        QLabel#statusDetail {{
+            color: {colors['text_secondary']};
+            font-size: 10px;
+            margin-right: 12px;
+        }}
+        QLabel#disclaimer {{
+            color: {colors['border']};
+            font-size: 10px;
+        }}
+
+        QTextBrowser#aboutText {{
+            background-color: transparent;
+            border: none;
+            color: {colors['text']};
+            font-size: 14px;
+        }}
+        QPushButton#dialogButton {{
+            background-color: {colors['accent']};
+            color: {colors['text']};
+            border: none;
+            border-radius: 8px;
+            padding: 10px;
+            font-size: 13px;
+            font-weight: bold;
+        }}
+        QPushButton#dialogButton:hover {{
+            background-color: {colors['accent_hover']};
+        }}
+
+        QDialog#settingsDialog {{
+            background-color: {colors['background']};
+            color: {colors['text']};
+        }}
+        #settingsDialog QTextEdit {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+            border-radius: 4px;
+            padding: 8px;
+        }}
+        #settingsDialog QCheckBox, #settingsDialog QLabel {{
+            color: {colors['text']};
+        }}
+        #settingsDialog QComboBox, #settingsDialog QSpinBox, #settingsDialog QLineEdit {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+            border-radius: 4px;
+            padding: 4px;
+        }}
+
+        QDialog#searchDialog {{
+            background-color: {colors['background']};
+            color: {colors['text']};
+        }}
+        #searchDialog QLabel {{
+            color: {colors['text_secondary']};
+        }}
+        #searchDialog QLineEdit, #searchDialog QListWidget, #searchDialog QTextBrowser {{
+            background-color: {colors['secondary_bg']};
+            color: {colors['text']};
+            border: 1px solid {colors['border']};
+            border-radius: 4px;
+            padding: 4px;
+        }}
+        #searchDialog QListWidget::item {{
+            padding: 6px;
+            border-bottom: 1px solid {colors['border']};
+        }}
+        #searchDialog QListWidget::item:selected {{
+            background-color: {colors['accent']};
+        }}
+    """
+
+def apply_theme(app, colors=COLORS):
+    app.setStyleSheet(build_stylesheet(colors))
@@ -1,18 +1,31 @@
-import tempfile
 import os
-import textwrap
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QLabel, 
-                             QFileDialog, QMessageBox, QDialog, QCheckBox, QFrame, QSizePolicy,
-                             QTextBrowser, QGraphicsDropShadowEffect)
-from PySide6.QtCore import Qt, Signal, QSettings, QSize, QRect, QPoint, QRectF
-from PySide6.QtGui import QPixmap, QDragEnterEvent, QDropEvent, QPainter, QColor, QPainterPath, QPen
-import markdown
-
-from config import COLORS, DEFAULT_TUTORIAL_MESSAGE
-from custom_window import CustomTitleBar
+import html
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
+                             QFileDialog, QMessageBox, QFrame, QSizePolicy,
+                             QTextBrowser, QGraphicsDropShadowEffect, QGraphicsColorizeEffect, QProgressBar,
+                             QSlider, QCheckBox)
+from PySide6.QtCore import Qt, Signal, QSettings, QSize, QRect, QPoint, QRectF, QTimer, QRegularExpression
+from PySide6.QtGui import (QPixmap, QDragEnterEvent, QDropEvent, QPainter, QColor, QPainterPath, QPen,
+                           QTextCursor, QPalette, QGuiApplication, QRegion, QTextCharFormat, QDesktopServices)
+
+from config import COLORS
+from markdown_renderer import render_markdown, document_stylesheet, IncrementalMarkdown
+from region_proposals import RegionProposalThread, proposals_available
+from image_ops import load_image
+from gallery import GalleryPanel, IMAGE_EXTENSIONS
+from profiling import TurnProfiler
+from frames import KeyframeThread, frame_count, read_frame
+
+SELECTION_PEN_MARGIN = 2
+FRAME_SEEK_DELAY_MS = 30
+DOCUMENT_BYTES_PER_CHAR = 40
+QWIDGETSIZE_MAX = 16777215
 
 class SelectionImageLabel(QLabel):
     dropped = Signal(str)
+    dropped_many = Signal(list)
+    proposal_clicked = Signal(QRect)
+    selection_changed = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -20,7 +33,13 @@ class SelectionImageLabel(QLabel):
         self.selection_mode = False
         self.start_point = QPoint()
         self.end_point = QPoint()
-        self.original_pixmap = None
+        self.source_image = None
+        self.proposals = []
+        self.pending_end_point = None
+        self.drag_timer = QTimer(self)
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.setInterval(refresh_interval_ms())
+        self.drag_timer.timeout.connect(self.flush_drag)
 
     def set_selection_mode(self, active):
         self.selection_mode = active
@@ -32,6 +51,7 @@ class SelectionImageLabel(QLabel):
         self.start_point = QPoint()
         self.end_point = QPoint()
         self.update()
+        self.selection_changed.emit()
 
     def has_selection(self):
         return not self.start_point.isNull() and not self.end_point.isNull()
@@ -39,38 +59,153 @@ class SelectionImageLabel(QLabel):
     def get_selection_rect(self):
         return QRect(self.start_point, self.end_point).normalized()
 
+    def selection_bounds(self):
+        if not (self.selection_mode and self.has_selection()):
+            return QRect()
+        margin = SELECTION_PEN_MARGIN
+        return self.get_selection_rect().adjusted(-margin, -margin, margin, margin)
+
+    def move_selection_end(self, point):
+        old_bounds = self.selection_bounds()
+        self.end_point = point
+        self.update(QRegion(old_bounds).united(QRegion(self.selection_bounds())))
+
+    def flush_drag(self):
+        if self.pending_end_point is None:
+            return
+        point, self.pending_end_point = self.pending_end_point, None
+        self.move_selection_end(point)
+        self.drag_timer.start()
+
+    def set_selection_rect(self, rect):
+        self.start_point = rect.topLeft()
+        self.end_point = rect.bottomRight()
+        self.update()
+        self.selection_changed.emit()
+
+    def set_proposals(self, image_rects):
+        self.proposals = list(image_rects)
+        self.update()
+
+    def clear_proposals(self):
+        self.proposals = []
+        self.update()
+
+    def display_rect(self):
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return QRect()
+        rect = QRect(QPoint(0, 0), pixmap.size())
+        rect.moveCenter(self.rect().center())
+        return rect
+
+    def widget_to_image_rect(self, rect):
+        display = self.display_rect()
+        if display.isEmpty() or self.source_image is None:
+            return QRect()
+        scale_x = self.source_image.width() / display.width()
+        scale_y = self.source_image.height() / display.height()
+        image_rect = QRect(int((rect.x() - display.x()) * scale_x),
+                           int((rect.y() - display.y()) * scale_y),
+                           int(rect.width() * scale_x),
+                           int(rect.height() * scale_y))
+        return image_rect.intersected(self.source_image.rect())
+
+    def image_to_widget_rect(self, rect):
+        display = self.display_rect()
+        if display.isEmpty() or self.source_image is None:
+            return QRect()
+        scale_x = display.width() / self.source_image.width()
+        scale_y = display.height() / self.source_image.height()
+        return QRect(int(display.x() + rect.x() * scale_x),
+                     int(display.y() + rect.y() * scale_y),
+                     int(rect.width() * scale_x),
+                     int(rect.height() * scale_y))
+
+    def proposal_at(self, point):
+        for rect in self.proposals:
+            widget_rect = self.image_to_widget_rect(rect)
+            if widget_rect.contains(point):
+                return widget_rect
+        return None
+
+    def set_source_image(self, image, preview=None, keep_selection=False):
+        selection = self.get_selection_rect() if keep_selection and self.has_selection() else None
+        self.source_image = image
+        display = (preview if preview is not None else image).scaled(
+            self.width() - 40,
+            self.height() - 40,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+        self.setPixmap(QPixmap.fromImage(display))
+        if selection is not None:
+            self.set_selection_rect(selection)
+
     def setPixmap(self, pixmap):
-        self.original_pixmap = pixmap.copy() if pixmap and not pixmap.isNull() else None
+        if pixmap is None or pixmap.isNull():
+            self.source_image = None
         super().setPixmap(pixmap)
+        self.proposals = []
         self.clear_selection()
 
     def dragEnterEvent(self, event: QDragEnterEvent):
-        if event.mimeData().hasUrls() and event.mimeData().urls()[0].path().lower().endswith(
-            ('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+        if event.mimeData().hasUrls() and any(
+                url.path().lower().endswith(IMAGE_EXTENSIONS) or os.path.isdir(url.toLocalFile())
+                for url in event.mimeData().urls()):
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
-        file_path = event.mimeData().urls()[0].toLocalFile()
-        self.dropped.emit(file_path)
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        if len(paths) == 1 and not os.path.isdir(paths[0]):
+            self.dropped.emit(paths[0])
+        else:
+            self.dropped_many.emit(paths)
 
     def mousePressEvent(self, event):
         if self.selection_mode and event.button() == Qt.MouseButton.LeftButton:
+            self.drag_timer.stop()
+            self.pending_end_point = None
+            old_bounds = self.selection_bounds()
             self.start_point = event.position().toPoint()
             self.end_point = self.start_point
-            self.update()
+            if self.proposals:
+                self.update()
+            else:
+                self.update(QRegion(old_bounds).united(QRegion(self.selection_bounds())))
 
     def mouseMoveEvent(self, event):
         if self.selection_mode and event.buttons() & Qt.MouseButton.LeftButton:
-            self.end_point = event.position().toPoint()
-            self.update()
+            self.pending_end_point = event.position().toPoint()
+            if not self.drag_timer.isActive():
+                self.flush_drag()
 
     def mouseReleaseEvent(self, event):
-        if self.selection_mode and event.button() == Qt.MouseButton.LeftButton:
-            self.end_point = event.position().toPoint()
-            self.update()
+        if event.button() != Qt.MouseButton.LeftButton:
+            return
+        point = event.position().toPoint()
+        is_click = not self.selection_mode or (point - self.start_point).manhattanLength() < 4
+        proposal = self.proposal_at(point) if self.proposals and is_click else None
+        if proposal is not None:
+            self.proposal_clicked.emit(proposal)
+        elif self.selection_mode:
+            self.drag_timer.stop()
+            self.pending_end_point = None
+            self.move_selection_end(point)
+            self.selection_changed.emit()
 
     def paintEvent(self, event):
         super().paintEvent(event)
+        if self.proposals and not (self.selection_mode and self.has_selection()):
+            painter = QPainter(self)
+            painter.setPen(QPen(QColor(COLORS['notification_info']), 2, Qt.PenStyle.DashLine))
+            painter.setBrush(QColor(33, 150, 243, 25))
+            for index, rect in enumerate(self.proposals, start=1):
+                widget_rect = self.image_to_widget_rect(rect)
+                painter.drawRect(widget_rect)
+                painter.drawText(widget_rect.adjusted(4, 2, 0, 0),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, str(index))
+            painter.end()
         if self.selection_mode and self.has_selection():
             painter = QPainter(self)
             rect_to_draw = QRect(self.start_point, self.end_point).normalized()
@@ -119,6 +254,65 @@ class MarkdownTextBrowser(QTextBrowser):
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        self.document().setDefaultStyleSheet(document_stylesheet())
+        self.stream_renderer = None
+        self.streaming = False
+        self.stream_tail_start = 0
+
+    def append_markdown(self, delta):
+        if self.stream_renderer is None:
+            self.stream_renderer = IncrementalMarkdown()
+        finished, tail = self.stream_renderer.feed(delta)
+        self.append_rendered(finished, tail)
+
+    def finish_markdown(self):
+        final_block = self.stream_renderer.flush() if self.stream_renderer is not None else ''
+        self.stream_renderer = None
+        self.finish_rendered(final_block)
+
+    def append_rendered(self, finished, tail):
+        if not self.streaming:
+            self.streaming = True
+            self.document().setUndoRedoEnabled(False)
+            self.stream_tail_start = 0
+        if finished or tail is not None:
+            self._replace_stream_tail(finished, tail)
+
+    def finish_rendered(self, final_block):
+        if not self.streaming:
+            return
+        self._replace_stream_tail([final_block] if final_block else [], '')
+        self.streaming = False
+
+    def replace_rendered(self, html):
+        self.streaming = False
+        self.setHtml(html)
+        self.document().setTextWidth(self.viewport().width())
+        self.updateGeometry()
+
+    def _replace_stream_tail(self, finished, tail):
+        document = self.document()
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        cursor.setPosition(self.stream_tail_start)
+        # setPosition instead of movePosition(End): the latter lays out the whole document.
+        cursor.setPosition(document.characterCount() - 1, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        for html in finished:
+            self._insert_html_block(cursor, html)
+        self.stream_tail_start = cursor.position()
+        if tail:
+            self._insert_html_block(cursor, tail)
+        cursor.endEditBlock()
+        if document.textWidth() != self.viewport().width():
+            document.setTextWidth(self.viewport().width())
+        self.updateGeometry()
+
+    def _insert_html_block(self, cursor, html):
+        # Lists already start a new block when inserted; an explicit one would leave a blank line.
+        if cursor.position() > 0 and not html.lstrip().startswith(('<ul', '<ol')):
+            cursor.insertBlock()
+        cursor.insertHtml(html)
 
     def sizeHint(self) -> QSize:
         doc_height = self.document().size().height()
@@ -129,163 +323,37 @@ class MarkdownTextBrowser(QTextBrowser):
         self.document().setTextWidth(self.viewport().width())
         self.updateGeometry()
 
-class AboutDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Dialog)
-        self.setModal(True)
-        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
-        self.init_ui()
-
-    def init_ui(self):
-        self.setFixedSize(450, 320)
-        
-        dialog_layout = QVBoxLayout(self)
-        dialog_layout.setContentsMargins(0, 0, 0, 0)
-
-        container_widget = QWidget()
-        dialog_layout.addWidget(container_widget)
-        
-        container_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-                border: 1px solid {COLORS['border']};
-                border-radius: 8px;
-            }}
-        """)
-        
-        container_layout = QVBoxLayout(container_widget)
-        container_layout.setContentsMargins(0, 0, 0, 0)
-        container_layout.setSpacing(0)
-
-        self.title_bar = CustomTitleBar(self, title="About ITT-Qwen", show_minimize=False, show_maximize=False)
-        container_layout.addWidget(self.title_bar)
-
-        content_widget = QWidget()
-        content_widget.setStyleSheet("border: none;")
-        content_layout = QVBoxLayout(content_widget)
-        content_layout.setContentsMargins(20, 20, 20, 20)
-        container_layout.addWidget(content_widget)
-
-        about_text = """
-            ### ITT-Qwen (Image To Text)
-            **Version 1.0**
-
-            Built by: **Matt Wesney**
-
-            This application leverages the power of the Qwen Vision Language Model (`qwen2.5vl:7b`) via Ollama to provide detailed analysis and answers based on the images you provide.
-        """
-
-        about_browser = MarkdownTextBrowser()
-        about_browser.setStyleSheet(f"""
-            QTextBrowser {{
-                background-color: transparent;
-                border: none;
-                color: {COLORS['text']};
-                font-size: 14px;
-            }}
-        """)
-        
-        cleaned_text = textwrap.dedent(about_text).strip()
-        html = markdown.markdown(cleaned_text, extensions=['fenced_code', 'codehilite', 'extra'])
-        doc_style = f"""
-        <style>
-            h3 {{ color: {COLORS['text_secondary']}; }}
-            a {{ color: #81A2BE; text-decoration: none; }}
-            a:hover {{ text-decoration: underline; }}
-        </style>
-        """
-        about_browser.setHtml(doc_style + html)
-        
-        content_layout.addWidget(about_browser)
-        content_layout.addStretch()
+NOTIFICATION_COLORS = {
+    'success': '#4CAF5066',
+    'error': '#F4433666',
+    'info': COLORS['text_secondary']
+}
 
-        button_layout = QHBoxLayout()
-        button_layout.addStretch()
-
-        ok_button = QPushButton("OK")
-        ok_button.setFixedWidth(100)
-        ok_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['accent']};
-                color: {COLORS['text']};
-                border: none;
-                border-radius: 8px;
-                padding: 10px;
-                font-size: 13px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['accent_hover']};
-            }}
-        """)
-        ok_button.clicked.connect(self.accept)
-        button_layout.addWidget(ok_button)
-
-        content_layout.addLayout(button_layout)
-
-class SettingsDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.settings = QSettings('ImageChat', 'Settings')
-        self.init_ui()
-        
-    def init_ui(self):
-        self.setWindowTitle('Settings')
-        self.setMinimumWidth(400)
-        layout = QVBoxLayout(self)
-        
-        tutorial_group = QWidget()
-        tutorial_layout = QVBoxLayout(tutorial_group)
-        
-        self.show_tutorial = QCheckBox('Show Tutorial Message on Startup')
-        self.show_tutorial.setChecked(self.settings.value('show_tutorial', True, type=bool))
-        tutorial_layout.addWidget(self.show_tutorial)
-        
-        self.tutorial_text = QTextEdit()
-        self.tutorial_text.setPlaceholderText('Custom tutorial message...')
-        self.tutorial_text.setText(self.settings.value('tutorial_message', DEFAULT_TUTORIAL_MESSAGE))
-        tutorial_layout.addWidget(self.tutorial_text)
-        
-        layout.addWidget(tutorial_group)
-        
-        button_layout = QHBoxLayout()
-        save_btn = QPushButton('Save')
-        save_btn.clicked.connect(self.save_settings)
-        cancel_btn = QPushButton('Cancel')
-        cancel_btn.clicked.connect(self.reject)
-        button_layout.addWidget(save_btn)
-        button_layout.addWidget(cancel_btn)
-        layout.addLayout(button_layout)
-        
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {COLORS['background']};
-                color: {COLORS['text']};
-            }}
-            QTextEdit {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text']};
-                border: 1px solid {COLORS['border']};
-                border-radius: 4px;
-                padding: 8px;
-            }}
-            QCheckBox {{
-                color: {COLORS['text']};
-            }}
-        """)
-    
-    def save_settings(self):
-        self.settings.setValue('show_tutorial', self.show_tutorial.isChecked())
-        self.settings.setValue('tutorial_message', self.tutorial_text.toPlainText())
-        self.accept()
+def refresh_interval_ms():
+    screen = QGuiApplication.primaryScreen()
+    rate = screen.refreshRate() if screen is not None else 0
+    return max(1, int(1000 / (rate if rate > 0 else 60)))
 
 class NotificationWidget(QFrame):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.pending = {}
+        self.message_type = None
+        self.applied_updates = 0
+        self.requested_updates = 0
         self.setup_ui()
+        self.palettes = {}
+        for message_type, color in NOTIFICATION_COLORS.items():
+            palette = QPalette(self.message_label.palette())
+            palette.setColor(QPalette.ColorRole.WindowText, QColor(color))
+            self.palettes[message_type] = palette
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(refresh_interval_ms())
+        self.flush_timer.timeout.connect(self.flush)
         
     def setup_ui(self):
+        self.setObjectName('notificationBar')
         self.setFixedHeight(24)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         
@@ -293,51 +361,112 @@ class NotificationWidget(QFrame):
         layout.setContentsMargins(10, 2, 10, 2)
         
         self.message_label = QLabel()
-        self.message_label.setStyleSheet(f"""
-            color: {COLORS['text_secondary']};
-            font-size: 11px;
-        """)
+        self.message_label.setObjectName('notificationMessage')
         layout.addWidget(self.message_label)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFixedSize(120, 4)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setObjectName('notificationProgress')
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
         layout.addStretch()
 
+        self.memory_label = QLabel()
+        self.memory_label.setObjectName('statusDetail')
+        layout.addWidget(self.memory_label)
+
+        self.metrics_label = QLabel()
+        self.metrics_label.setObjectName('statusDetail')
+        self.metrics_label.hide()
+        layout.addWidget(self.metrics_label)
+
         self.disclaimer_label = QLabel("Always check vital details; though we strive for accuracy, no system is perfect.")
-        self.disclaimer_label.setStyleSheet(f"""
-            color: {COLORS['border']};
-            font-size: 10px;
-        """)
+        self.disclaimer_label.setObjectName('disclaimer')
         layout.addWidget(self.disclaimer_label)
         
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLORS['background']};
-                border: none;
-            }}
-        """)
-        
+    def schedule(self, **update):
+        self.pending.update(update)
+        self.requested_updates += 1
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
     def show_message(self, message, message_type='info'):
-        colors = {
-            'success': '#4CAF5066',
-            'error': '#F4433666',
-            'info': COLORS['text_secondary']
-        }
-        
-        self.message_label.setStyleSheet(f"""
-            color: {colors.get(message_type, COLORS['text_secondary'])};
-            font-size: 11px;
-        """)
-        
-        self.message_label.setText(message)
+        self.schedule(message=message, message_type=message_type)
+
+    def set_progress(self, value):
+        self.schedule(progress=value)
+
+    def show_metrics(self, summary):
+        self.schedule(metrics=summary)
+
+    def show_memory(self, text, tooltip=''):
+        self.schedule(memory=text, memory_tooltip=tooltip)
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        self.applied_updates += 1
+        message_type = pending.get('message_type')
+        if message_type is not None and message_type != self.message_type:
+            self.message_type = message_type
+            self.message_label.setPalette(self.palettes.get(message_type, self.palettes['info']))
+        if 'message' in pending and pending['message'] != self.message_label.text():
+            self.message_label.setText(pending['message'])
+        if 'metrics' in pending and pending['metrics'] != self.metrics_label.text():
+            self.metrics_label.setText(pending['metrics'])
+        if 'memory' in pending and pending['memory'] != self.memory_label.text():
+            self.memory_label.setText(pending['memory'])
+        if 'memory_tooltip' in pending and pending['memory_tooltip'] != self.memory_label.toolTip():
+            self.memory_label.setToolTip(pending['memory_tooltip'])
+        if 'progress' in pending:
+            self.apply_progress(pending['progress'])
+
+    def apply_progress(self, value):
+        if value is None:
+            self.progress_bar.hide()
+            return
+        if value < 0:
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(min(value, 100))
+        self.progress_bar.show()
+
+    def set_metrics_visible(self, visible):
+        self.metrics_label.setVisible(visible)
+
+def message_content(text, plain_text=False):
+    if plain_text:
+        return f"<pre>{html.escape(text)}</pre>"
+    try:
+        return render_markdown(text)
+    except ImportError:
+        return f"<p>Please install 'markdown' and 'pygments' libraries to see formatted text.</p><pre><code>pip install markdown pygments</code></pre>"
+    except Exception as e:
+        return f"<p>Error rendering Markdown: {e}</p>"
 
 class ChatMessage(QWidget):
-    def __init__(self, text, is_user=True, timestamp="", parent=None):
+    frame_requested = Signal(int)
+
+    def __init__(self, text, is_user=True, timestamp="", parent=None, plain_text=False, html_content=None):
         super().__init__(parent)
+        self.timestamp = timestamp
+        self.source_text = text
+        self.plain_text = plain_text
+        self.document_evicted = False
+        self.frame_indices = set()
         layout = QHBoxLayout(self)
         layout.setContentsMargins(10, 5, 10, 5)
         layout.setSpacing(0)
 
+        self.is_user = is_user
+        self.time_label = None
         main_container = QWidget()
         main_container_layout = QVBoxLayout(main_container)
+        self.main_container_layout = main_container_layout
         main_container_layout.setContentsMargins(0,0,0,0)
         main_container_layout.setSpacing(3)
         main_container.setMaximumWidth(800)
@@ -354,159 +483,25 @@ class ChatMessage(QWidget):
         bubble.setGraphicsEffect(shadow)
 
         message_browser = MarkdownTextBrowser()
-        message_browser.setOpenExternalLinks(True)
+        message_browser.setObjectName('messageBody')
+        self.message_browser = message_browser
+        message_browser.setOpenLinks(False)
+        message_browser.anchorClicked.connect(self.open_link)
         message_browser.setReadOnly(True)
         message_browser.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         message_browser.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         message_browser.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
 
-        try:
-            cleaned_text = textwrap.dedent(text).strip()
-            html = markdown.markdown(cleaned_text, extensions=['fenced_code', 'codehilite', 'extra'])
-        except ImportError:
-            html = f"<p>Please install 'markdown' and 'pygments' libraries to see formatted text.</p><pre><code>pip install markdown pygments</code></pre>"
-        except Exception as e:
-            html = f"<p>Error rendering Markdown: {e}</p>"
-
-        doc_style = f"""
-        <style>
-            body {{
-                color: {COLORS['text']};
-                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-                font-size: 14px;
-                line-height: 1.6;
-            }}
-            p {{ 
-                margin-bottom: 10px; 
-            }}
-            h1, h2, h3, h4, h5, h6 {{
-                color: {COLORS['text']};
-                margin: 10px 0;
-            }}
-            h3 {{
-                font-size: 16px;
-            }}
-            strong, b {{
-                font-weight: bold;
-            }}
-            em, i {{
-                font-style: italic;
-            }}
-            ul, ol {{
-                margin: 10px 0;
-                padding-left: 20px;
-            }}
-            li {{
-                margin: 3px 0;
-            }}
-            a {{ 
-                color: #81A2BE; 
-                text-decoration: none; 
-            }}
-            a:hover {{ 
-                text-decoration: underline; 
-            }}
-            pre {{ 
-                background-color: {COLORS['background']}; 
-                padding: 10px; 
-                border-radius: 5px; 
-                border: 1px solid {COLORS['border']};
-                font-family: Consolas, "Courier New", monospace;
-                margin: 10px 0;
-            }}
-            code {{
-                font-family: Consolas, "Courier New", monospace;
-            }}
-            blockquote {{
-                border-left: 3px solid {COLORS['accent']};
-                margin: 10px 0;
-                padding-left: 10px;
-                color: {COLORS['text_secondary']};
-            }}
-            /* Pygments syntax highlighting */
-            .highlight .c  {{ color: #586e75; }}
-            .highlight .err {{ color: #93a1a1; }}
-            .highlight .k  {{ color: #859900; }}
-            .highlight .l  {{ color: #2aa198; }}
-            .highlight .n  {{ color: #268bd2; }}
-            .highlight .o  {{ color: #859900; }}
-            .highlight .p  {{ color: #cb4b16; }}
-            .highlight .cm {{ color: #586e75; }}
-            .highlight .cp {{ color: #859900; }}
-            .highlight .c1 {{ color: #586e75; }}
-            .highlight .cs {{ color: #859900; }}
-            .highlight .gd {{ color: #2aa198; }}
-            .highlight .ge {{ font-style: italic; }}
-            .highlight .gh {{ color: #cb4b16; }}
-            .highlight .gs {{ font-weight: bold; }}
-            .highlight .gu {{ color: #cb4b16; }}
-            .highlight .kc {{ color: #cb4b16; }}
-            .highlight .kd {{ color: #268bd2; }}
-            .highlight .kn {{ color: #859900; }}
-            .highlight .kp {{ color: #859900; }}
-            .highlight .kr {{ color: #268bd2; }}
-            .highlight .kt {{ color: #dc322f; }}
-            .highlight .ld {{ color: #93a1a1; }}
-            .highlight .m  {{ color: #2aa198; }}
-            .highlight .s  {{ color: #2aa198; }}
-            .highlight .na {{ color: #93a1a1; }}
-            .highlight .nb {{ color: #B58900; }}
-            .highlight .nc {{ color: #268bd2; }}
-            .highlight .no {{ color: #cb4b16; }}
-            .highlight .nd {{ color: #268bd2; }}
-            .highlight .ni {{ color: #cb4b16; }}
-            .highlight .ne {{ color: #cb4b16; }}
-            .highlight .nf {{ color: #268bd2; }}
-            .highlight .nl {{ color: #93a1a1; }}
-            .highlight .nn {{ color: #93a1a1; }}
-            .highlight .nx {{ color: #93a1a1; }}
-            .highlight .py {{ color: #93a1a1; }}
-            .highlight .nt {{ color: #268bd2; }}
-            .highlight .nv {{ color: #268bd2; }}
-            .highlight .ow {{ color: #859900; }}
-            .highlight .w  {{ color: #93a1a1; }}
-            .highlight .mf {{ color: #2aa198; }}
-            .highlight .mh {{ color: #2aa198; }}
-            .highlight .mi {{ color: #2aa198; }}
-            .highlight .mo {{ color: #2aa198; }}
-            .highlight .sb {{ color: #586e75; }}
-            .highlight .sc {{ color: #2aa198; }}
-            .highlight .sd {{ color: #93a1a1; }}
-            .highlight .s2 {{ color: #2aa198; }}
-            .highlight .se {{ color: #cb4b16; }}
-            .highlight .sh {{ color: #2aa198; }}
-            .highlight .si {{ color: #2aa198; }}
-            .highlight .sx {{ color: #2aa198; }}
-            .highlight .sr {{ color: #dc322f; }}
-            .highlight .s1 {{ color: #2aa198; }}
-            .highlight .ss {{ color: #2aa198; }}
-            .highlight .bp {{ color: #268bd2; }}
-            .highlight .vc {{ color: #268bd2; }}
-            .highlight .vg {{ color: #268bd2; }}
-            .highlight .vi {{ color: #268bd2; }}
-            .highlight .il {{ color: #2aa198; }}
-        </style>
-        """
-        
-        message_browser.setHtml(doc_style + html)
+        message_browser.setHtml(html_content if html_content is not None else message_content(text, plain_text))
         
         bubble_layout.addWidget(message_browser)
         
-        message_browser.setStyleSheet(f"""
-            QTextBrowser {{
-                background-color: transparent;
-                border: none;
-                color: {COLORS['text']};
-                font-size: 14px;
-                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-            }}
-        """)
-        
         main_container_layout.addWidget(bubble)
         
         if timestamp:
             time_label = QLabel(timestamp)
-            time_label.setStyleSheet(f"color: {COLORS['text_secondary']}; font-size: 9px; margin-top: 2px;")
+            time_label.setObjectName('messageTime')
+            self.time_label = time_label
             
             time_alignment = Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft
             main_container_layout.addWidget(time_label, alignment=time_alignment)
@@ -517,12 +512,113 @@ class ChatMessage(QWidget):
         if not is_user:
             layout.addStretch()
 
+    def set_caption(self, caption):
+        if self.time_label is not None:
+            self.time_label.setText(f"{self.timestamp} · {caption}")
+
+    def add_action(self, text, callback):
+        button = QPushButton(text)
+        button.setCursor(Qt.CursorShape.PointingHandCursor)
+        button.setObjectName('messageAction')
+        button.clicked.connect(callback)
+        alignment = Qt.AlignmentFlag.AlignRight if self.is_user else Qt.AlignmentFlag.AlignLeft
+        self.main_container_layout.addWidget(button, alignment=alignment)
+        return button
+
+    def append_text(self, delta):
+        self.message_browser.append_markdown(delta)
+
+    def finish_text(self):
+        self.message_browser.finish_markdown()
+
+    def append_rendered(self, finished, tail):
+        self.message_browser.append_rendered(finished, tail)
+
+    def flash(self):
+        effect = QGraphicsColorizeEffect(self)
+        effect.setColor(QColor(COLORS['accent']))
+        effect.setStrength(0.4)
+        self.setGraphicsEffect(effect)
+        QTimer.singleShot(900, lambda: self.setGraphicsEffect(None))
+
+    def finish_rendered(self, final_block):
+        self.message_browser.finish_rendered(final_block)
+
+    def replace_rendered(self, html):
+        self.message_browser.replace_rendered(html)
+
+    def open_link(self, url):
+        if url.scheme() == 'frame':
+            self.frame_requested.emit(int(url.path()))
+        else:
+            QDesktopServices.openUrl(url)
+
+    def link_frames(self, indices):
+        self.frame_indices = set(indices)
+        document = self.message_browser.document()
+        pattern = QRegularExpression(r'\bFrame (\d+)\b', QRegularExpression.PatternOption.CaseInsensitiveOption)
+        cursor = document.find(pattern)
+        while not cursor.isNull():
+            index = int(cursor.selectedText().split()[-1]) - 1
+            if index in self.frame_indices:
+                link = QTextCharFormat()
+                link.setAnchor(True)
+                link.setAnchorHref(f"frame:{index}")
+                link.setForeground(QColor(COLORS['accent_hover']))
+                link.setFontUnderline(True)
+                cursor.mergeCharFormat(link)
+            cursor = document.find(pattern, cursor)
+
+    def document_bytes(self):
+        if self.document_evicted:
+            return 0
+        return self.message_browser.document().characterCount() * DOCUMENT_BYTES_PER_CHAR
+
+    def evict_document(self):
+        if self.document_evicted or self.message_browser.streaming or not self.source_text:
+            return 0
+        freed = self.document_bytes()
+        self.message_browser.setFixedHeight(self.message_browser.height())
+        self.message_browser.document().clear()
+        self.document_evicted = True
+        return freed
+
+    def restore_document(self):
+        if not self.document_evicted:
+            return
+        self.document_evicted = False
+        self.message_browser.setHtml(message_content(self.source_text, self.plain_text))
+        if self.frame_indices:
+            self.link_frames(self.frame_indices)
+        self.message_browser.setMinimumHeight(0)
+        self.message_browser.setMaximumHeight(QWIDGETSIZE_MAX)
+
+    def paintEvent(self, event):
+        if self.document_evicted:
+            QTimer.singleShot(0, self.restore_document)
+        super().paintEvent(event)
+
 class ImagePreviewWidget(QWidget):
     image_selected = Signal(str)
+    selection_changed = Signal()
+    proposals_ready = Signal(int)
+    keyframes_ready = Signal(int, int)
+    keyframes_failed = Signal(str)
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_image_path = None
+        self.current_payload = None
+        self.proposal_thread = None
+        self.keyframe_thread = None
+        self.keyframes = []
+        self.frame_index = 0
+        self.frame_total = 1
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(FRAME_SEEK_DELAY_MS)
+        self.frame_timer.timeout.connect(lambda: self.show_frame(self.frame_slider.value()))
+        self.profiler = TurnProfiler()
         self.setup_ui()
         
     def setup_ui(self):
@@ -532,143 +628,212 @@ class ImagePreviewWidget(QWidget):
         self.image_preview = SelectionImageLabel('Drag and drop or click to select an image')
         self.image_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_preview.setMinimumHeight(200)
-        self.image_preview.setStyleSheet(f"""
-            QLabel {{
-                border: 2px dashed {COLORS['accent']};
-                border-radius: 8px;
-                background-color: {COLORS['secondary_bg']};
-                padding: 20px;
-                font-size: 14px;
-                color: {COLORS['text_secondary']};
-            }}
-        """)
+        self.image_preview.setObjectName('imageDropArea')
         self.image_preview.dropped.connect(self.handle_image_selection)
+        self.image_preview.dropped_many.connect(self.add_to_gallery)
+        self.image_preview.proposal_clicked.connect(self.select_proposal)
+        self.image_preview.selection_changed.connect(self.selection_changed)
         layout.addWidget(self.image_preview)
     
         button_layout = QHBoxLayout()
         button_layout.setSpacing(10)
     
-        button_style = f"""
-            QPushButton {{
-                background-color: {COLORS['accent']};
-                color: {COLORS['text']};
-                border: none;
-                border-radius: 8px;
-                padding: 12px 20px;
-                font-size: 13px;
-                font-weight: bold;
-                min-width: 80px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['accent_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {COLORS['accent']};
-            }}
-            QPushButton:disabled {{
-                background-color: {COLORS['secondary_bg']};
-                color: {COLORS['text_secondary']};
-            }}
-        """
-        checkable_button_style = button_style + f"""
-            QPushButton:checked {{
-                background-color: {COLORS['accent_hover']};
-                border: 1px solid {COLORS['border']};
-            }}
-        """
-    
         self.select_btn = QPushButton('Select Image')
-        self.select_btn.setStyleSheet(button_style)
+        self.select_btn.setObjectName('primaryButton')
         self.select_btn.clicked.connect(self.select_image)
         button_layout.addWidget(self.select_btn)
     
         self.select_area_btn = QPushButton('Select Area')
-        self.select_area_btn.setStyleSheet(checkable_button_style)
+        self.select_area_btn.setObjectName('primaryButton')
         self.select_area_btn.setCheckable(True)
         self.select_area_btn.toggled.connect(self.toggle_selection_mode)
         button_layout.addWidget(self.select_area_btn)
 
+        self.suggest_btn = QPushButton('Suggest Areas')
+        self.suggest_btn.setObjectName('primaryButton')
+        self.suggest_btn.clicked.connect(self.suggest_regions)
+        if not proposals_available():
+            self.suggest_btn.setEnabled(False)
+            self.suggest_btn.setToolTip("Install numpy to enable area suggestions")
+        button_layout.addWidget(self.suggest_btn)
+
         self.clear_btn = QPushButton('Clear Image')
-        self.clear_btn.setStyleSheet(button_style)
+        self.clear_btn.setObjectName('primaryButton')
         self.clear_btn.clicked.connect(self.clear_image)
         button_layout.addWidget(self.clear_btn)
     
         layout.addLayout(button_layout)
 
-    def get_image_for_model(self):
-        if self.image_preview.has_selection() and self.image_preview.original_pixmap:
-            selection_rect_widget = self.image_preview.get_selection_rect()
-            
-            original_pixmap = self.image_preview.original_pixmap
-            widget_size = self.image_preview.size()
-            pixmap_size = original_pixmap.size()
-            
-            scaled_pixmap = original_pixmap.scaled(widget_size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            scaled_size = scaled_pixmap.size()
-
-            offset_x = (widget_size.width() - scaled_size.width()) / 2
-            offset_y = (widget_size.height() - scaled_size.height()) / 2
-
-            scale_x = pixmap_size.width() / scaled_size.width()
-            scale_y = pixmap_size.height() / scaled_size.height()
-
-            crop_x = (selection_rect_widget.x() - offset_x) * scale_x
-            crop_y = (selection_rect_widget.y() - offset_y) * scale_y
-            crop_width = selection_rect_widget.width() * scale_x
-            crop_height = selection_rect_widget.height() * scale_y
-            
-            crop_x = max(0, crop_x)
-            crop_y = max(0, crop_y)
-            crop_width = min(crop_width, pixmap_size.width() - crop_x)
-            crop_height = min(crop_height, pixmap_size.height() - crop_y)
-
-            crop_rect_original = QRect(int(crop_x), int(crop_y), int(crop_width), int(crop_height))
+        self.frame_bar = QWidget()
+        frame_layout = QHBoxLayout(self.frame_bar)
+        frame_layout.setContentsMargins(0, 0, 0, 0)
+        self.frame_slider = QSlider(Qt.Orientation.Horizontal)
+        self.frame_slider.setObjectName('frameSlider')
+        self.frame_slider.valueChanged.connect(lambda value: self.frame_timer.start())
+        frame_layout.addWidget(self.frame_slider, stretch=1)
+        self.frame_label = QLabel()
+        self.frame_label.setObjectName('frameLabel')
+        frame_layout.addWidget(self.frame_label)
+        self.send_keyframes = QCheckBox('Send Keyframes')
+        self.send_keyframes.setChecked(True)
+        self.send_keyframes.setToolTip("Send the distinct frames together instead of only the frame shown")
+        self.send_keyframes.setObjectName('sendKeyframes')
+        frame_layout.addWidget(self.send_keyframes)
+        self.frame_bar.hide()
+        layout.addWidget(self.frame_bar)
+
+        self.gallery = GalleryPanel()
+        self.gallery.image_activated.connect(self.handle_image_selection)
+        layout.addWidget(self.gallery)
 
+    def get_image_for_model(self):
+        if self.image_preview.has_selection() and self.image_preview.source_image is not None:
+            crop_rect_original = self.image_preview.widget_to_image_rect(self.image_preview.get_selection_rect())
             if not crop_rect_original.isEmpty():
-                cropped_pixmap = original_pixmap.copy(crop_rect_original)
-                fd, temp_path = tempfile.mkstemp(suffix=".png")
-                os.close(fd)
-                cropped_pixmap.save(temp_path, "PNG")
-                return temp_path, True
-        
-        return self.current_image_path, False
+                return self.current_image_path, crop_rect_original
+        return self.current_image_path, None
+
+    def suggest_regions(self):
+        image = self.image_preview.source_image
+        if image is None or not proposals_available():
+            return
+        if self.proposal_thread and self.proposal_thread.isRunning():
+            return
+        self.suggest_btn.setEnabled(False)
+        self.proposal_thread = RegionProposalThread(image)
+        self.proposal_thread.source_key = image.cacheKey()
+        self.proposal_thread.finished.connect(self.handle_proposals)
+        self.proposal_thread.error.connect(lambda message: self.handle_proposals([]))
+        self.proposal_thread.start()
+
+    def handle_proposals(self, regions):
+        self.suggest_btn.setEnabled(True)
+        image = self.image_preview.source_image
+        if image is None or image.cacheKey() != self.proposal_thread.source_key:
+            return
+        self.image_preview.set_proposals(regions)
+        self.proposals_ready.emit(len(regions))
+
+    def select_proposal(self, widget_rect):
+        if not self.select_area_btn.isChecked():
+            self.select_area_btn.setChecked(True)
+        self.image_preview.clear_proposals()
+        self.image_preview.set_selection_rect(widget_rect)
 
     def toggle_selection_mode(self, checked):
         self.image_preview.set_selection_mode(checked)
     
     def handle_image_selection(self, file_path):
         try:
-            self.current_image_path = file_path
-            pixmap = QPixmap(file_path)
-            if pixmap.isNull():
-                raise Exception("Invalid image file")
-            
-            self.image_preview.original_pixmap = pixmap.copy()
-                
-            scaled_pixmap = pixmap.scaled(
-                self.image_preview.width() - 40,
-                self.image_preview.height() - 40,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            self.image_preview.setPixmap(scaled_pixmap)
-            self.image_selected.emit(file_path)
+            with self.profiler.capture('image'):
+                self.current_image_path = file_path
+                self.current_payload = None
+                cached = self.gallery.cached(file_path)
+                if cached is not None:
+                    image, preview, self.current_payload = cached
+                else:
+                    image, preview = load_image(file_path), None
+                self.image_preview.set_source_image(image, preview)
+                self.reset_frames(file_path)
+                self.image_selected.emit(file_path)
+                if QSettings('ImageChat', 'Settings').value('auto_suggest_areas', False, type=bool):
+                    self.suggest_regions()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load image: {str(e)}")
     
+    def reset_frames(self, file_path):
+        if self.keyframe_thread is not None and self.keyframe_thread.isRunning():
+            self.keyframe_thread.cancel()
+            self.keyframe_thread.wait()
+        self.keyframes = []
+        self.frame_index = 0
+        self.frame_total = frame_count(file_path)
+        self.set_frame_range()
+        self.frame_bar.setVisible(self.frame_total > 1)
+        if self.frame_total > 1:
+            self.current_payload = None
+            self.keyframe_thread = KeyframeThread(file_path)
+            self.keyframe_thread.finished.connect(self.handle_keyframes)
+            self.keyframe_thread.error.connect(self.keyframes_failed.emit)
+            self.keyframe_thread.start()
+
+    def set_frame_range(self):
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setRange(0, self.frame_total - 1)
+        self.frame_slider.setValue(self.frame_index)
+        self.frame_slider.blockSignals(False)
+        self.update_frame_label()
+
+    def handle_keyframes(self, path, keyframes, total):
+        if path != self.current_image_path:
+            return
+        self.keyframes = keyframes
+        self.frame_total = max(total, 1)
+        self.set_frame_range()
+        self.keyframes_ready.emit(len(keyframes), self.frame_total)
+
+    def update_frame_label(self):
+        text = f"Frame {self.frame_index + 1} / {self.frame_total}"
+        indices = [index for index, _ in self.keyframes]
+        if self.frame_index in indices:
+            text += f" · keyframe {indices.index(self.frame_index) + 1} of {len(indices)}"
+        elif not indices:
+            text += " · finding keyframes..."
+        self.frame_label.setText(text)
+
+    def show_frame(self, index):
+        if index == self.frame_index or self.current_image_path is None:
+            return
+        image = dict(self.keyframes).get(index)
+        try:
+            if image is None:
+                image = read_frame(self.current_image_path, index)
+        except Exception as e:
+            print(f"Error reading frame {index + 1}: {e}")
+            return
+        self.frame_index = index
+        self.image_preview.set_source_image(image, keep_selection=True)
+        self.set_frame_range()
+
+    def seek_frame(self, path, index):
+        if path != self.current_image_path:
+            self.handle_image_selection(path)
+        self.show_frame(index)
+
+    def frames_for_model(self):
+        if self.frame_total <= 1 or self.image_preview.source_image is None:
+            return None
+        if self.send_keyframes.isChecked() and self.keyframes:
+            return list(self.keyframes)
+        return [(self.frame_index, self.image_preview.source_image)]
+
+    def keyframe_bytes(self):
+        current = self.image_preview.source_image
+        shown = current.cacheKey() if current is not None else None
+        return sum(image.sizeInBytes() for _, image in self.keyframes if image.cacheKey() != shown)
+
     def select_image(self):
-        file_name, _ = QFileDialog.getOpenFileName(
+        file_names, _ = QFileDialog.getOpenFileNames(
             self,
-            "Select Image",
+            "Select Images",
             "",
-            "Image Files (*.png *.jpg *.jpeg *.bmp *.gif);;All Files (*)"
+            "Image Files (*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff *.webp);;All Files (*)"
         )
         
-        if file_name:
-            self.handle_image_selection(file_name)
+        if len(file_names) == 1:
+            self.handle_image_selection(file_names[0])
+        elif file_names:
+            self.add_to_gallery(file_names)
+
+    def add_to_gallery(self, paths):
+        added = self.gallery.add_paths(paths)
+        if not added:
+            QMessageBox.information(self, "Gallery", "No new images found.")
     
     def clear_image(self):
         self.current_image_path = None
+        self.current_payload = None
+        self.reset_frames(None)
         self.image_preview.setPixmap(QPixmap())
         self.image_preview.setText('Drag and drop or click to select an image')
         self.image_selected.emit("")
@@ -0,0 +1,208 @@
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+from image_ops import load_numpy
+
+POLL_INTERVAL_S = 0.05
+STOP_TIMEOUT_S = 2.0
+
+def rect_tuple(rect):
+    if rect is None:
+        return None
+    return (rect.x(), rect.y(), rect.width(), rect.height())
+
+def copy_pixels(buffer, offset, image):
+    size = image.sizeInBytes()
+    np = load_numpy()
+    if np is not None:
+        # numpy drops the GIL for the copy; a memoryview slice assignment holds it throughout.
+        np.copyto(np.frombuffer(buffer, np.uint8, size, offset), np.frombuffer(image.constBits(), np.uint8, size))
+    else:
+        buffer[offset:offset + size] = image.constBits()
+    return size
+
+def attach_image(spec):
+    from PySide6.QtGui import QImage
+
+    # Spawned children share the parent's resource tracker, so the parent's unlink() settles the block.
+    block = shared_memory.SharedMemory(name=spec['shm'])
+    try:
+        pixels = block.buf[spec['offset']:spec['offset'] + spec['stride'] * spec['height']]
+        view = QImage(pixels, spec['width'], spec['height'], spec['stride'], QImage.Format(spec['format']))
+        image = view.copy()
+        del view
+        pixels.release()
+    finally:
+        block.close()
+    return image
+
+def encode_source(source):
+    from PySide6.QtCore import QRect
+    from image_ops import encode_image_payload
+    from frames import read_frame
+
+    crop = QRect(*source['crop']) if source.get('crop') else None
+    max_side = source.get('max_side')
+    if 'shm' in source:
+        return encode_image_payload(attach_image(source), crop, max_side=max_side)
+    if 'frame' in source:
+        return encode_image_payload(read_frame(source['path'], source['frame']), crop, max_side=max_side)
+    return encode_image_payload(None, crop, source['path'], max_side)
+
+def run_job(connection, job_id, request):
+    from inference import stream_chat
+    from markdown_renderer import IncrementalMarkdown, render_markdown
+
+    state = {'cancelled': False, 'stop': False}
+
+    def is_cancelled():
+        while connection.poll():
+            message = connection.recv()
+            if message[0] == 'cancel' and message[1] == job_id:
+                state['cancelled'] = True
+            elif message[0] == 'stop':
+                state['cancelled'] = state['stop'] = True
+        return state['cancelled']
+
+    renderer = IncrementalMarkdown() if request['render'] else None
+
+    def on_chunk(piece):
+        finished, tail = renderer.feed(piece) if renderer is not None else ([], '')
+        connection.send(('chunk', job_id, piece, finished, tail))
+
+    try:
+        start = time.perf_counter()
+        images = [encode_source(source) for source in request['images']]
+        connection.send(('encoded', job_id, (time.perf_counter() - start) * 1000.0))
+        messages = request['messages']
+        if images and messages and messages[-1]['role'] == 'user':
+            messages[-1]['images'] = images
+        content, stats = stream_chat(request['model'], messages, on_chunk, is_cancelled, request['options'],
+                                     request['response_format'])
+        final_html = None
+        if renderer is not None and not state['cancelled']:
+            try:
+                final_html = render_markdown(content)
+            except ImportError:
+                final_html = None
+        connection.send(('done', job_id, content, stats, final_html))
+    except Exception as e:
+        connection.send(('error', job_id, str(e)))
+    return not state['stop']
+
+def worker_main(connection):
+    import inference, markdown_renderer, image_ops, frames  # Paid once here rather than by the first request.
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message[0] == 'stop':
+            return
+        if message[0] == 'chat' and not run_job(connection, message[1], message[2]):
+            return
+
+class InferenceWorker:
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.jobs = 0
+        self.shared_bytes = 0
+        self.block = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.is_alive():
+            return self
+        context = multiprocessing.get_context('spawn')
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), name='itt-qwen-worker', daemon=True)
+        self.process.start()
+        child.close()
+        return self
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.connection.send(('stop',))
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT_S)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+        self.process = None
+        self.connection = None
+        self.release_block()
+
+    def share(self, images):
+        # One block reused across requests: fresh shared pages cost a page fault each on first write.
+        total = sum(image.sizeInBytes() for image in images)
+        if self.block is None or self.block.size < total:
+            self.release_block()
+            self.block = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        specs = []
+        offset = 0
+        for image in images:
+            specs.append({'shm': self.block.name, 'offset': offset, 'width': image.width(),
+                          'height': image.height(), 'stride': image.bytesPerLine(),
+                          'format': image.format().value})
+            offset += copy_pixels(self.block.buf, offset, image)
+        self.shared_bytes += total
+        return specs
+
+    def release_block(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def chat(self, model, messages, sources, on_chunk=None, is_cancelled=None, options=None, response_format=None,
+             render=True, on_encoded=None):
+        with self._lock:
+            self.start()
+            self.jobs += 1
+            job_id = self.jobs
+            images = [source['image'] for source in sources if source.get('image') is not None]
+            specs = iter(self.share(images)) if images else iter(())
+            request_sources = []
+            for source in sources:
+                source = dict(source)
+                if source.pop('image', None) is not None:
+                    source.update(next(specs))
+                source['crop'] = rect_tuple(source.get('crop'))
+                request_sources.append(source)
+            self.connection.send(('chat', job_id, {
+                'model': model, 'messages': messages, 'images': request_sources, 'options': options,
+                'response_format': response_format, 'render': render,
+            }))
+            cancel_sent = False
+            while True:
+                if not cancel_sent and is_cancelled is not None and is_cancelled():
+                    self.connection.send(('cancel', job_id))
+                    cancel_sent = True
+                if not self.connection.poll(POLL_INTERVAL_S):
+                    if not self.process.is_alive():
+                        raise RuntimeError("Worker process exited unexpectedly")
+                    continue
+                message = self.connection.recv()
+                if message[1] != job_id:
+                    continue
+                if message[0] == 'chunk':
+                    if on_chunk is not None:
+                        on_chunk(*message[2:])
+                elif message[0] == 'encoded':
+                    if on_encoded is not None:
+                        on_encoded(message[2])
+                elif message[0] == 'done':
+                    return message[2], message[3], message[4]
+                elif message[0] == 'error':
+                    raise RuntimeError(message[2])